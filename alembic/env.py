@@ -0,0 +1,54 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import MetaData, engine_from_config, pool
+
+from app.core.config import settings
+from app.models.billing import Base as BillingBase
+from app.models.mikrotik import Base as MikroTikBase
+from app.models.radius import Base as RadiusBase
+from app.models.user import Base as UserBase
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+
+# Each models module has its own declarative base; one MetaData lets
+# foreign keys across modules resolve
+target_metadata = MetaData()
+for base in (UserBase, MikroTikBase, BillingBase, RadiusBase):
+    for table in base.metadata.tables.values():
+        if table.name not in target_metadata.tables:
+            table.to_metadata(target_metadata)
+
+
+def run_migrations_offline():
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        # Batch mode lets SQLite alter tables by copying them
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
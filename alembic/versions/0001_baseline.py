@@ -0,0 +1,24 @@
+"""Baseline: the schema created by create_all before migrations were introduced
+
+Databases created that way are stamped with this revision
+(``alembic stamp 0001``) and then upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    pass
+
+
+def downgrade() -> None:
+    pass
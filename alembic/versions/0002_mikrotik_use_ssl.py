@@ -0,0 +1,26 @@
+"""API-SSL per device: mikrotik_devices.use_ssl
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("mikrotik_devices") as batch:
+        batch.add_column(sa.Column("use_ssl", sa.Boolean(), nullable=True, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("mikrotik_devices") as batch:
+        batch.drop_column("use_ssl")
@@ -0,0 +1,24 @@
+"""Overdue scan index: billing_accounts (status, due_date)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_billing_accounts_status_due_date", "billing_accounts", ["status", "due_date"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_billing_accounts_status_due_date", table_name="billing_accounts")
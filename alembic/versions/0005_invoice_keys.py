@@ -0,0 +1,34 @@
+"""Idempotent invoices and proration: invoice_key, previous_package_price, package_changed_at
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.add_column(sa.Column("previous_package_price", sa.Float(), nullable=True))
+        batch.add_column(sa.Column("package_changed_at", sa.DateTime(), nullable=True))
+    with op.batch_alter_table("payments") as batch:
+        batch.add_column(sa.Column("invoice_key", sa.String(64), nullable=True))
+        batch.create_unique_constraint("uq_payments_invoice_key", ["invoice_key"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("payments") as batch:
+        batch.drop_constraint("uq_payments_invoice_key", type_="unique")
+        batch.drop_column("invoice_key")
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.drop_column("package_changed_at")
+        batch.drop_column("previous_package_price")
@@ -0,0 +1,24 @@
+"""Quota engine startup index: traffic_data.recorded_at
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_traffic_data_recorded_at", "traffic_data", ["recorded_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_traffic_data_recorded_at", table_name="traffic_data")
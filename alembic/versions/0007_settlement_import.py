@@ -0,0 +1,34 @@
+"""Settlement import: virtual accounts and payment references
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.add_column(sa.Column("virtual_account", sa.String(32), nullable=True))
+        batch.create_unique_constraint("uq_billing_accounts_virtual_account", ["virtual_account"])
+    with op.batch_alter_table("payments") as batch:
+        batch.add_column(sa.Column("reference", sa.String(100), nullable=True))
+        batch.create_unique_constraint("uq_payments_method_reference", ["payment_method", "reference"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("payments") as batch:
+        batch.drop_constraint("uq_payments_method_reference", type_="unique")
+        batch.drop_column("reference")
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.drop_constraint("uq_billing_accounts_virtual_account", type_="unique")
+        batch.drop_column("virtual_account")
@@ -0,0 +1,37 @@
+"""Revenue rollup: revenue_daily, payments.package_name and the (status, due_date) index
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "revenue_daily",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("payment_method", sa.String(50), primary_key=True),
+        sa.Column("package_name", sa.String(100), primary_key=True),
+        sa.Column("payments", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+    )
+    with op.batch_alter_table("payments") as batch:
+        batch.add_column(sa.Column("package_name", sa.String(100), nullable=True))
+    op.create_index("ix_payments_status_due_date", "payments", ["status", "due_date"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_payments_status_due_date", table_name="payments")
+    with op.batch_alter_table("payments") as batch:
+        batch.drop_column("package_name")
+    op.drop_table("revenue_daily")
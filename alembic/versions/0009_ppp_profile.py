@@ -0,0 +1,26 @@
+"""Reactivation profile: billing_accounts.ppp_profile
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.add_column(sa.Column("ppp_profile", sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.drop_column("ppp_profile")
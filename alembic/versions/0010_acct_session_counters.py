@@ -0,0 +1,32 @@
+"""Accounting baselines: acct_session_counters
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "acct_session_counters",
+        sa.Column("nas_ip", sa.String(45), primary_key=True),
+        sa.Column("session_id", sa.String(64), primary_key=True),
+        sa.Column("input_octets", sa.BigInteger(), nullable=False),
+        sa.Column("output_octets", sa.BigInteger(), nullable=False),
+        sa.Column("session_time", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("acct_session_counters")
@@ -0,0 +1,28 @@
+"""Part payments: payments.paid_amount
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("payments") as batch:
+        batch.add_column(sa.Column("paid_amount", sa.Float(), nullable=False, server_default="0"))
+    # Invoices settled before part payments were tracked were paid in full
+    op.execute("UPDATE payments SET paid_amount = amount WHERE payment_method = 'invoice' AND status = 'PAID'")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("payments") as batch:
+        batch.drop_column("paid_amount")
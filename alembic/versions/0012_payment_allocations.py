@@ -0,0 +1,29 @@
+"""Voidable settlements: payment_allocations
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "payment_allocations",
+        sa.Column("payment_id", sa.Integer(), sa.ForeignKey("payments.id"), primary_key=True),
+        sa.Column("invoice_id", sa.Integer(), sa.ForeignKey("payments.id"), primary_key=True),
+        sa.Column("amount", sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("payment_allocations")
@@ -0,0 +1,56 @@
+"""Package proration per cycle: billing_accounts.proration_amount, proration_cycle
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 00:00:00
+"""
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.add_column(sa.Column("proration_amount", sa.Float(), nullable=True))
+        batch.add_column(sa.Column("proration_cycle", sa.DateTime(), nullable=True))
+    # A change recorded against the previous price still owes its difference for the rest of that cycle
+    accounts = sa.table(
+        "billing_accounts",
+        sa.column("id", sa.Integer()),
+        sa.column("package_price", sa.Float()),
+        sa.column("previous_package_price", sa.Float()),
+        sa.column("package_changed_at", sa.DateTime()),
+        sa.column("proration_amount", sa.Float()),
+        sa.column("proration_cycle", sa.DateTime()),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(accounts.c.id, accounts.c.package_price, accounts.c.previous_package_price,
+                  accounts.c.package_changed_at)
+        .where(accounts.c.previous_package_price.isnot(None), accounts.c.package_changed_at.isnot(None))
+    ).all()
+    for account_id, price, previous_price, changed_at in rows:
+        cycle = changed_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_cycle = (cycle + timedelta(days=32)).replace(day=1)
+        amount = (price - previous_price) * ((next_cycle - changed_at) / (next_cycle - cycle))
+        bind.execute(
+            accounts.update().where(accounts.c.id == account_id)
+            .values(proration_amount=round(amount, 2), proration_cycle=cycle)
+        )
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.drop_column("previous_package_price")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("billing_accounts") as batch:
+        batch.add_column(sa.Column("previous_package_price", sa.Float(), nullable=True))
+        batch.drop_column("proration_cycle")
+        batch.drop_column("proration_amount")
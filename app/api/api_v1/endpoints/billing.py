@@ -1,6 +1,22 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
-from app.schemas.billing import BillingAccount, BillingAccountCreate, Payment, PaymentCreate, BillingStats
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, File, Form, UploadFile
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.database import get_db
+from app.models.billing import PaymentStatus
+from app.schemas.billing import (
+    BillingAccount, BillingAccountCreate, PackageChange, Payment, PaymentCreate, BillingStats
+)
+from app.services.billing_jobs import apply_isolations, apply_reactivations
+from app.services.billing_service import BillingService
+from app.services.billing_stats import billing_stats, load_billing_rows
+from app.services.mikrotik_bulk import push_account_changes
+from app.services.quota_engine import quota_engine
+from app.services.radius_coa import coa_dispatcher
+from app.services.scheduler import job_scheduler
+from app.services.subscriber_index import subscriber_index
+from app.api.api_v1.endpoints.mikrotik import active_devices
 
 router = APIRouter()
 
@@ -71,6 +87,7 @@ async def create_billing_account(account: BillingAccountCreate):
         "full_name": account.full_name,
         "email": account.email,
         "phone": account.phone,
+        "virtual_account": account.virtual_account,
         "package_name": account.package_name,
         "package_price": account.package_price,
         "bandwidth_profile": account.bandwidth_profile,
@@ -79,46 +96,127 @@ async def create_billing_account(account: BillingAccountCreate):
         "created_at": "2024-01-01T00:00:00"
     }
     mock_accounts.append(new_account)
+    subscriber_index.update_account(new_account)
     return new_account
 
+@router.patch("/accounts/{account_id}/package")
+async def change_account_package(account_id: int, change: PackageChange, db: Session = Depends(get_db)):
+    """Switch an account's package; the next invoice prorates the price difference for this cycle"""
+    def apply():
+        account = BillingService(db).change_package(
+            account_id, change.package_name, change.package_price, change.bandwidth_profile
+        )
+        return {
+            "account_id": account.id,
+            "username": account.username,
+            "status": account.status.value,
+            "package_name": account.package_name,
+            "package_price": account.package_price,
+            "bandwidth_profile": account.bandwidth_profile,
+            "package_changed_at": account.package_changed_at,
+            "proration_amount": account.proration_amount
+        }
+    
+    try:
+        result = await run_in_threadpool(apply)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    subscriber_index.update_account({"id": account_id, **result})
+    # Online sessions pick up the new rate limit
+    result["coa_queued"] = coa_dispatcher.account_changed(result["username"]) if change.bandwidth_profile else 0
+    return result
+
 @router.get("/payments", response_model=List[Payment])
 async def get_payments():
     """Get all payments"""
     return mock_payments
 
 @router.post("/payments", response_model=Payment)
-async def create_payment(payment: PaymentCreate):
-    """Record new payment"""
-    new_payment = {
-        "id": len(mock_payments) + 1,
-        "billing_account_id": payment.billing_account_id,
-        "amount": payment.amount,
-        "payment_method": payment.payment_method,
-        "status": "paid",
-        "payment_date": "2024-01-01T00:00:00",
-        "due_date": payment.due_date,
-        "notes": payment.notes
+async def create_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
+    """Record new payment, settling the account's open invoices"""
+    try:
+        new_payment, report, allocated = await run_in_threadpool(
+            BillingService(db).process_payment, payment.billing_account_id, payment.amount,
+            payment.payment_method, None, payment.notes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404 if "not found" in str(e) else 400, detail=str(e))
+    billing_stats.record_payments(new_payment.payment_method, 1, new_payment.amount, allocated)
+    await apply_reactivations(report["reactivated"], active_devices())
+    return {
+        "id": new_payment.id,
+        "billing_account_id": new_payment.billing_account_id,
+        "amount": new_payment.amount,
+        "payment_method": new_payment.payment_method,
+        "status": new_payment.status.value,
+        "payment_date": new_payment.payment_date,
+        "due_date": new_payment.due_date,
+        "notes": new_payment.notes,
+        "created_at": new_payment.created_at
+    }
+
+@router.post("/payments/import")
+async def import_payments(file: UploadFile = File(...), source: str = Form("bank_transfer"),
+                          format: Optional[str] = Form(None), db: Session = Depends(get_db)):
+    """Import a bank or e-wallet settlement file (CSV or JSON lines) and reconcile it"""
+    if format is None:
+        format = "jsonl" if (file.filename or "").lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+    report, allocated = await run_in_threadpool(BillingService(db).import_payments, file.file, format, source)
+    billing_stats.record_payments(source, report["payments_created"], report["amount"], allocated)
+    pushed = await apply_reactivations(report["reactivated"], active_devices())
+    return {**report, **pushed}
+
+@router.post("/payments/{payment_id}/void")
+async def void_payment(payment_id: int, db: Session = Depends(get_db)):
+    """Void a payment, take it out of the revenue rollup and reopen the invoices it paid"""
+    try:
+        payment, invoices = await run_in_threadpool(BillingService(db).void_payment, payment_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404 if "not found" in str(e) else 409, detail=str(e))
+    # Rows that were not open had been paid
+    billing_stats.update_payment(payment, previous_status=PaymentStatus.PAID)
+    for invoice in invoices:
+        billing_stats.update_payment(invoice, previous_status=PaymentStatus.PAID)
+    return {
+        "message": f"Payment {payment_id} has been voided",
+        "payment_id": payment.id,
+        "reopened_invoices": [invoice.id for invoice in invoices if invoice.status != PaymentStatus.PAID]
     }
-    mock_payments.append(new_payment)
-    return new_payment
+
+@router.get("/revenue")
+async def get_revenue_report(start_date: str, end_date: str, db: Session = Depends(get_db)):
+    """Get revenue per day, payment method and package for a date range (YYYY-MM-DD)"""
+    try:
+        start, end = datetime.fromisoformat(start_date), datetime.fromisoformat(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+    return await run_in_threadpool(BillingService(db).get_revenue_report, start, end)
+
+@router.post("/revenue/rebuild")
+async def rebuild_revenue_ledger(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                 db: Session = Depends(get_db)):
+    """Recompute the daily revenue rollup from the payments table, e.g. to backfill it"""
+    try:
+        start = datetime.fromisoformat(start_date).date() if start_date else None
+        end = datetime.fromisoformat(end_date).date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+    return await run_in_threadpool(BillingService(db).rebuild_revenue_ledger, start, end)
 
 @router.get("/stats", response_model=BillingStats)
 async def get_billing_stats():
     """Get billing statistics"""
-    total_accounts = len(mock_accounts)
-    paid_accounts = len([p for p in mock_payments if p["status"] == "paid"])
-    overdue_accounts = len([p for p in mock_payments if p["status"] == "overdue"])
-    total_revenue = sum([p["amount"] for p in mock_payments if p["status"] == "paid"])
-    
-    return {
-        "total_accounts": total_accounts,
-        "active_accounts": len([a for a in mock_accounts if a["status"] == "active"]),
-        "suspended_accounts": len([a for a in mock_accounts if a["status"] == "suspended"]),
-        "paid_accounts": paid_accounts,
-        "overdue_accounts": overdue_accounts,
-        "total_revenue": total_revenue,
-        "pending_revenue": sum([p["amount"] for p in mock_payments if p["status"] == "overdue"])
-    }
+    return billing_stats.stats()
+
+@router.get("/stats/check")
+async def check_billing_stats(repair: bool = False):
+    """Recompute billing statistics from scratch and report drift from the running totals"""
+    if repair:
+        return await billing_stats.refresh()
+    accounts, payments = await run_in_threadpool(load_billing_rows)
+    return billing_stats.check(accounts, payments)
 
 @router.post("/accounts/{account_id}/isolate")
 async def isolate_account(account_id: int):
@@ -128,7 +226,17 @@ async def isolate_account(account_id: int):
         raise HTTPException(status_code=404, detail="Account not found")
     
     account["status"] = "suspended"
-    return {"message": f"Account {account['username']} has been isolated"}
+    subscriber_index.update_account(account)
+    coa_queued = coa_dispatcher.account_changed(account["username"])
+    router_changes = await push_account_changes(
+        [{"username": account["username"], "action": "isolate"}], active_devices()
+    )
+    account["ppp_profile"] = router_changes[0]["previous_profile"] or account.get("ppp_profile")
+    return {
+        "message": f"Account {account['username']} has been isolated",
+        "router_changes": router_changes,
+        "coa_queued": coa_queued
+    }
 
 @router.post("/accounts/{account_id}/reactivate")
 async def reactivate_account(account_id: int):
@@ -138,4 +246,50 @@ async def reactivate_account(account_id: int):
         raise HTTPException(status_code=404, detail="Account not found")
     
     account["status"] = "active"
-    return {"message": f"Account {account['username']} has been reactivated"}
\ No newline at end of file
+    subscriber_index.update_account(account)
+    coa_queued = coa_dispatcher.account_changed(account["username"])
+    router_changes = await push_account_changes(
+        [{
+            "username": account["username"],
+            "action": "reactivate",
+            "profile": account.get("ppp_profile"),
+            "max_limit": account["bandwidth_profile"]
+        }],
+        active_devices()
+    )
+    return {
+        "message": f"Account {account['username']} has been reactivated",
+        "router_changes": router_changes,
+        "coa_queued": coa_queued
+    }
+
+@router.post("/overdue/process")
+async def process_overdue_accounts(db: Session = Depends(get_db)):
+    """Isolate overdue accounts and push the changes to the routers in bulk"""
+    isolated = await run_in_threadpool(BillingService(db).process_overdue_accounts)
+    pushed = await apply_isolations(isolated, active_devices())
+    return {"isolated_accounts": isolated, **pushed}
+
+@router.post("/invoices/generate")
+async def generate_invoices(cycle: Optional[str] = None, db: Session = Depends(get_db)):
+    """Generate the monthly invoices (cycle as YYYY-MM, default current); safe to rerun"""
+    try:
+        cycle_date = datetime.strptime(cycle, "%Y-%m") if cycle else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cycle must be YYYY-MM")
+    return await run_in_threadpool(BillingService(db).generate_monthly_invoices, cycle_date)
+
+@router.get("/jobs")
+async def get_billing_jobs():
+    """Get scheduled billing jobs, their next runs and run history"""
+    return job_scheduler.stats()
+
+@router.get("/quota/status")
+async def get_quota_status():
+    """Get fair-usage cycle, throttled subscribers and enforcement counters"""
+    return quota_engine.stats()
+
+@router.get("/quota/{username}")
+async def get_quota_usage(username: str):
+    """Get a subscriber's usage this cycle against their fair-usage quota"""
+    return quota_engine.usage(username)
\ No newline at end of file
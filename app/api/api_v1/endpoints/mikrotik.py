@@ -1,7 +1,17 @@
+import asyncio
+import json
+import time
+from datetime import datetime
 from typing import List, Any
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from app.schemas.mikrotik import MikroTikDevice, MikroTikDeviceCreate, MikroTikStats, InterfaceStats, PPPoEUser
 from app.services.mikrotik_api import MikroTikAPI
+from app.services.mikrotik_async import MikroTikError
+from app.services.mikrotik_pool import mikrotik_pool
+from app.services.mikrotik_poller import fleet_poller
+from app.services.mikrotik_live import live_hub
+from app.services.response_cache import device_cache
 
 router = APIRouter()
 
@@ -12,7 +22,9 @@ mock_devices = [
         "name": "MikroTik Main",
         "ip_address": "192.168.1.1",
         "port": 8728,
+        "use_ssl": False,
         "username": "admin",
+        "password": "",
         "description": "Main router for office",
         "is_active": True,
         "last_connected": None
@@ -22,13 +34,45 @@ mock_devices = [
         "name": "MikroTik Branch",
         "ip_address": "192.168.2.1",
         "port": 8728,
+        "use_ssl": False,
         "username": "admin",
+        "password": "",
         "description": "Branch office router",
         "is_active": True,
         "last_connected": None
     }
 ]
 
+def _get_device(device_id: int) -> dict:
+    device = next((d for d in mock_devices if d["id"] == device_id), None)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return device
+
+def active_devices() -> List[dict]:
+    """Devices walked by the background poller"""
+    return [d for d in mock_devices if d["is_active"]]
+
+def _fresh_snapshot(device_id: int, command: str):
+    snapshot = fleet_poller.snapshot(device_id)
+    if snapshot is None or snapshot.age() > 2 * fleet_poller.interval:
+        return None
+    # A poll that started before a write to the router shows the old state
+    if snapshot.updated - snapshot.duration <= device_cache.invalidated_at(device_id, command):
+        return None
+    return snapshot
+
+async def _fetch_live(device: dict, command: str, fetch):
+    async def load():
+        async with mikrotik_pool.session(device) as api:
+            return await fetch(api)
+
+    # Concurrent dashboards share one router round trip per command
+    try:
+        return await device_cache.get(device["id"], command, load)
+    except MikroTikError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
 @router.get("/devices", response_model=List[MikroTikDevice])
 async def get_mikrotik_devices():
     """Get all MikroTik devices"""
@@ -42,7 +86,9 @@ async def create_mikrotik_device(device: MikroTikDeviceCreate):
         "name": device.name,
         "ip_address": device.ip_address,
         "port": device.port,
+        "use_ssl": device.use_ssl,
         "username": device.username,
+        "password": device.password,
         "description": device.description,
         "is_active": True,
         "last_connected": None
@@ -53,72 +99,76 @@ async def create_mikrotik_device(device: MikroTikDeviceCreate):
 @router.get("/devices/{device_id}/stats", response_model=MikroTikStats)
 async def get_device_stats(device_id: int):
     """Get device statistics (CPU, memory, etc.)"""
-    # Mock stats data
-    return {
-        "device_id": device_id,
-        "cpu_load": 15.5,
-        "memory_usage": 35.2,
-        "uptime": "7d 14h 32m",
-        "version": "6.49.6",
-        "board_name": "RB4011iGS+",
-        "architecture": "arm64"
-    }
+    device = _get_device(device_id)
+    snapshot = _fresh_snapshot(device_id, "stats")
+    if snapshot:
+        return {"device_id": device_id, **snapshot.stats}
+    
+    stats = await _fetch_live(device, "stats", lambda api: api.get_system_stats())
+    return {"device_id": device_id, **stats}
 
 @router.get("/devices/{device_id}/interfaces", response_model=List[InterfaceStats])
 async def get_interface_stats(device_id: int):
     """Get interface traffic statistics"""
-    # Mock interface data
-    return [
-        {
-            "name": "ether1",
-            "rx_bytes": 1024000000,
-            "tx_bytes": 512000000,
-            "rx_packets": 1500000,
-            "tx_packets": 1200000,
-            "status": "running"
-        },
-        {
-            "name": "ether2",
-            "rx_bytes": 2048000000,
-            "tx_bytes": 1024000000,
-            "rx_packets": 2000000,
-            "tx_packets": 1800000,
-            "status": "running"
-        }
-    ]
+    device = _get_device(device_id)
+    snapshot = _fresh_snapshot(device_id, "interfaces")
+    if snapshot:
+        return snapshot.interfaces
+    
+    return await _fetch_live(device, "interfaces", lambda api: api.get_interfaces())
 
 @router.get("/devices/{device_id}/pppoe", response_model=List[PPPoEUser])
 async def get_pppoe_users(device_id: int):
     """Get active PPPoE users"""
-    # Mock PPPoE users
-    return [
-        {
-            "name": "user001",
-            "caller_id": "192.168.100.10",
-            "address": "10.0.0.10",
-            "uptime": "2d 5h 30m",
-            "bytes_in": 1073741824,
-            "bytes_out": 536870912,
-            "service": "pppoe-service1"
-        },
-        {
-            "name": "user002", 
-            "caller_id": "192.168.100.11",
-            "address": "10.0.0.11",
-            "uptime": "1d 12h 15m",
-            "bytes_in": 2147483648,
-            "bytes_out": 1073741824,
-            "service": "pppoe-service1"
-        }
-    ]
+    device = _get_device(device_id)
+    snapshot = _fresh_snapshot(device_id, "pppoe")
+    if snapshot:
+        return snapshot.pppoe_sessions
+    
+    return await _fetch_live(device, "pppoe", lambda api: api.get_pppoe_sessions())
+
+@router.get("/devices/{device_id}/live")
+async def stream_live(
+    device_id: int,
+    topic: str = Query("traffic", pattern="^(traffic|pppoe|log)$"),
+    interface: str = "ether1"
+):
+    """Stream live traffic, PPPoE session or log events (Server-Sent Events)"""
+    device = _get_device(device_id)
+    if topic != "traffic":
+        interface = ""
+    
+    async def events():
+        async with live_hub.subscribe(device, topic, interface) as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/devices/{device_id}/pppoe/{username}/traffic")
 async def get_user_traffic(device_id: int, username: str):
     """Get specific user traffic data"""
-    # Mock user traffic data
+    device = _get_device(device_id)
+    # Only the subscriber's row (and only the used columns) crosses the wire
+    sessions = await _fetch_live(
+        device, f"pppoe:{username}", lambda api: api.get_pppoe_sessions(name=username)
+    )
+    
+    # Mock user traffic history
     return {
         "username": username,
         "device_id": device_id,
+        "current_session": sessions[0] if sessions else None,
         "daily_traffic": [
             {"date": "2024-01-01", "rx_bytes": 1073741824, "tx_bytes": 536870912},
             {"date": "2024-01-02", "rx_bytes": 2147483648, "tx_bytes": 1073741824},
@@ -134,13 +184,44 @@ async def get_user_traffic(device_id: int, username: str):
 @router.post("/devices/{device_id}/test-connection")
 async def test_connection(device_id: int):
     """Test connection to MikroTik device"""
-    device = next((d for d in mock_devices if d["id"] == device_id), None)
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    device = _get_device(device_id)
     
-    # Mock connection test
+    started = time.perf_counter()
+    try:
+        async with mikrotik_pool.session(device) as api:
+            await api.command(["/system/identity/print"])
+    except MikroTikError as e:
+        return {
+            "success": False,
+            "message": f"Failed to connect to {device['name']}: {e}",
+            "response_time": None
+        }
+    
+    device["last_connected"] = datetime.utcnow()
     return {
         "success": True,
         "message": f"Successfully connected to {device['name']}",
-        "response_time": "25ms"
-    }
\ No newline at end of file
+        "response_time": f"{(time.perf_counter() - started) * 1000:.0f}ms"
+    }
+
+@router.get("/poller/status")
+async def get_poller_status():
+    """Get background device poller status"""
+    return {
+        "interval": fleet_poller.interval,
+        "last_cycle": fleet_poller.last_cycle,
+        "devices": [
+            {
+                "device_id": snapshot.device_id,
+                "polled_at": snapshot.polled_at,
+                "duration": round(snapshot.duration, 3),
+                "error": snapshot.error
+            }
+            for snapshot in fleet_poller.snapshots()
+        ]
+    }
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get device response cache counters"""
+    return device_cache.stats()
\ No newline at end of file
@@ -1,6 +1,11 @@
-from typing import List
-from fastapi import APIRouter
-from app.schemas.radius import RadiusUser, RadiusUserCreate
+from typing import List, Optional
+from fastapi import APIRouter, Query
+from app.schemas.radius import RadiusSessionList, RadiusUser, RadiusUserCreate
+from app.services.radius_acct_server import accounting_server
+from app.services.radius_auth_server import auth_server
+from app.services.radius_coa import coa_dispatcher
+from app.services.session_table import session_table
+from app.services.subscriber_index import subscriber_index
 
 router = APIRouter()
 
@@ -39,11 +44,13 @@ async def create_radius_user(user: RadiusUserCreate):
         "username": user.username,
         "billing_account_id": user.billing_account_id,
         "group_name": user.group_name,
+        "password": user.password,
         "is_active": True,
         "created_at": "2024-01-01T00:00:00",
         "last_activity": None
     }
     mock_radius_users.append(new_user)
+    subscriber_index.update_user(new_user)
     return new_user
 
 @router.post("/users/{user_id}/activate")
@@ -52,6 +59,7 @@ async def activate_radius_user(user_id: int):
     user = next((u for u in mock_radius_users if u["id"] == user_id), None)
     if user:
         user["is_active"] = True
+        subscriber_index.update_user(user)
         return {"message": f"User {user['username']} activated"}
     return {"error": "User not found"}
 
@@ -61,5 +69,42 @@ async def deactivate_radius_user(user_id: int):
     user = next((u for u in mock_radius_users if u["id"] == user_id), None)
     if user:
         user["is_active"] = False
+        subscriber_index.update_user(user)
+        coa_dispatcher.disconnect(user["username"])
         return {"message": f"User {user['username']} deactivated"}
-    return {"error": "User not found"}
\ No newline at end of file
+    return {"error": "User not found"}
+
+@router.get("/accounting/status")
+async def get_accounting_status():
+    """Get built-in accounting server counters"""
+    return accounting_server.stats()
+
+@router.get("/coa/status")
+async def get_coa_status():
+    """Get CoA/Disconnect dispatcher queue and acknowledgement counters"""
+    return coa_dispatcher.stats()
+
+@router.get("/auth/status")
+async def get_auth_status():
+    """Get built-in authentication server counters"""
+    return auth_server.stats()
+
+@router.get("/sessions", response_model=RadiusSessionList)
+async def get_active_sessions(
+    username: Optional[str] = None,
+    nas_ip: Optional[str] = None,
+    framed_ip: Optional[str] = None,
+    session_id: Optional[str] = None,
+    device_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10000)
+):
+    """Get online sessions from accounting and router polls"""
+    sessions = session_table.sessions(
+        username=username, nas_ip=nas_ip, framed_ip=framed_ip,
+        session_id=session_id, device_id=device_id
+    )
+    return {
+        "total": len(sessions),
+        "sessions": [session_table.session_dict(s) for s in sessions[skip:skip + limit]]
+    }
\ No newline at end of file
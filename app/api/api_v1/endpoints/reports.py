@@ -1,9 +1,14 @@
 from typing import List, Optional
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
 from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import json
 import os
+from app.database import get_db
+from app.services.billing_service import BillingService
+from app.services.revenue_ledger import report_range
 
 router = APIRouter()
 
@@ -51,24 +56,15 @@ async def get_traffic_report(
 async def get_billing_report(
     period: str = Query("monthly", regex="^(daily|weekly|monthly|yearly)$"),
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db)
 ):
-    """Get billing reports"""
-    # Mock billing report data
-    return {
-        "period": period,
-        "total_revenue": 15750000,
-        "paid_invoices": 45,
-        "overdue_invoices": 5,
-        "total_customers": 50,
-        "new_customers": 3,
-        "cancelled_customers": 1,
-        "details": [
-            {"date": "2024-01-01", "revenue": 5250000, "invoices_paid": 15},
-            {"date": "2024-01-02", "revenue": 3500000, "invoices_paid": 10},
-            {"date": "2024-01-03", "revenue": 7000000, "invoices_paid": 20},
-        ]
-    }
+    """Get billing reports (dates as YYYY-MM-DD), summed from the daily revenue rollup"""
+    try:
+        start, end = report_range(period, start_date, end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+    return await run_in_threadpool(BillingService(db).get_billing_report, start, end, period)
 
 @router.get("/download/{report_type}")
 async def download_report(
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, Optional
 import os
 
 class Settings(BaseSettings):
@@ -17,15 +17,79 @@ class Settings(BaseSettings):
     # MikroTik API Settings
     MIKROTIK_DEFAULT_PORT: int = 8728
     MIKROTIK_API_TIMEOUT: int = 10
+    MIKROTIK_API_SSL_PORT: int = 8729
+    MIKROTIK_SSL_VERIFY: bool = False
+    MIKROTIK_SSL_CA_FILE: Optional[str] = None
+    MIKROTIK_POOL_MAX_SESSIONS: int = 4
+    MIKROTIK_POOL_IDLE_TIMEOUT: int = 300
+    MIKROTIK_POOL_KEEPALIVE_INTERVAL: int = 30
+    MIKROTIK_POLL_ENABLED: bool = True
+    MIKROTIK_POLL_INTERVAL: int = 60
+    MIKROTIK_POLL_CONCURRENCY: int = 50
+    MIKROTIK_POLL_DEVICE_TIMEOUT: int = 15
+    MIKROTIK_POLL_CYCLE_TIMEOUT: int = 50
+    MIKROTIK_POLL_RECORD_TRAFFIC: bool = False
+    MIKROTIK_PIPELINE_WINDOW: int = 256
+    MIKROTIK_CACHE_TTL: int = 10
+    MIKROTIK_CACHE_STALE_TTL: int = 30
+    MIKROTIK_ISOLATION_PROFILE: str = "isolir"
+    MIKROTIK_ISOLATION_ADDRESS_LIST: str = "isolir"
+    MIKROTIK_ISOLATION_RATE_LIMIT: Optional[str] = None
     
     # RADIUS Settings
+    RADIUS_SERVER: str = "127.0.0.1"
     RADIUS_SECRET: str = "mars-radius-secret"
     RADIUS_AUTH_PORT: int = 1812
     RADIUS_ACCT_PORT: int = 1813
+    RADIUS_CLIENT_SOCKETS: int = 4
+    RADIUS_CLIENT_TIMEOUT: float = 2.0
+    RADIUS_CLIENT_RETRIES: int = 3
+    RADIUS_ACCT_SERVER_ENABLED: bool = False
+    RADIUS_ACCT_BIND: str = "0.0.0.0"
+    RADIUS_ACCT_BATCH_SIZE: int = 1000
+    RADIUS_ACCT_FLUSH_INTERVAL: float = 1.0
+    RADIUS_ACCT_QUEUE_SIZE: int = 100000
+    RADIUS_ACCT_CHECKPOINT_INTERVAL: float = 5.0
+    RADIUS_ACCT_COUNTER_MAX_AGE: int = 86400
+    RADIUS_AUTH_SERVER_ENABLED: bool = False
+    RADIUS_AUTH_BIND: str = "0.0.0.0"
+    RADIUS_REQUIRE_MESSAGE_AUTHENTICATOR: bool = True
+    RADIUS_GROUP_RATE_LIMITS: Dict[str, str] = {}
+    RADIUS_SESSION_TTL: int = 900
+    RADIUS_COA_ENABLED: bool = False
+    RADIUS_COA_PORT: int = 3799
+    RADIUS_COA_MODE: str = "disconnect"
+    RADIUS_COA_NAS_CONCURRENCY: int = 32
+    RADIUS_COA_TIMEOUT: float = 2.0
+    RADIUS_COA_RETRIES: int = 2
+    ACCOUNTING_SPOOL_ENABLED: bool = False
+    ACCOUNTING_SPOOL_DIR: str = "./spool/accounting"
+    ACCOUNTING_SPOOL_SEGMENT_RECORDS: int = 65536
+    ACCOUNTING_SPOOL_MAX_SEGMENTS: int = 64
+    ACCOUNTING_SPOOL_BATCH_SIZE: int = 5000
+    ACCOUNTING_SPOOL_SYNC_INTERVAL: float = 1.0
     
     # Billing Settings
     BILLING_CURRENCY: str = "IDR"
     BILLING_TIMEZONE: str = "Asia/Jakarta"
+    BILLING_OVERDUE_CHUNK_SIZE: int = 5000
+    BILLING_INVOICE_CHUNK_SIZE: int = 5000
+    BILLING_INVOICE_WORKERS: int = 1
+    # Days from the start of a cycle to its invoice's due date
+    BILLING_INVOICE_DUE_DAYS: int = 30
+    BILLING_OVERDUE_CRON: str = "0 2 * * *"
+    BILLING_INVOICE_CRON: str = "0 1 1 * *"
+    BILLING_JOB_JITTER: int = 60
+    BILLING_STATS_RECONCILE_CRON: str = "*/15 * * * *"
+    BILLING_IMPORT_BATCH_SIZE: int = 2000
+    # Fair usage: bandwidth profile -> {"quota_gb": 300, "rate_limit": "2M/2M"}
+    FUP_POLICIES: Dict[str, Dict[str, Any]] = {}
+    FUP_ROLLOVER_CRON: str = "0 0 1 * *"
+    
+    # Scheduler
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_LOCK_FILE: str = "./scheduler.lock"
+    SCHEDULER_PROCESS_WORKERS: int = 2
     
     # Report Settings
     REPORT_STORAGE_PATH: str = "./reports"
@@ -1,13 +1,61 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.api_v1.api import api_router
+from app.api.api_v1.endpoints.mikrotik import active_devices
+from app.services.accounting_spool import accounting_spool
+from app.services.billing_jobs import register_billing_jobs
+from app.services.billing_stats import billing_stats
+from app.services.mikrotik_pool import mikrotik_pool
+from app.services.mikrotik_poller import fleet_poller
+from app.services.quota_engine import quota_engine
+from app.services.radius_acct_server import accounting_server
+from app.services.radius_auth_server import auth_server
+from app.services.radius_coa import coa_dispatcher
+from app.services.scheduler import job_scheduler
+from app.services.subscriber_index import subscriber_index
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await mikrotik_pool.start()
+    await billing_stats.start()
+    if settings.RADIUS_AUTH_SERVER_ENABLED or settings.FUP_POLICIES:
+        await subscriber_index.start()
+    # Usage must be loaded before new deltas arrive
+    await quota_engine.start()
+    auth_server.throttle = quota_engine.throttle_rate
+    coa_dispatcher.throttle = quota_engine.throttle_rate
+    if settings.ACCOUNTING_SPOOL_ENABLED:
+        accounting_spool.device_source = active_devices
+        await accounting_spool.start()
+    if settings.MIKROTIK_POLL_ENABLED:
+        await fleet_poller.start(active_devices)
+    if settings.RADIUS_ACCT_SERVER_ENABLED:
+        accounting_server.device_source = active_devices
+        await accounting_server.start()
+    if settings.RADIUS_AUTH_SERVER_ENABLED:
+        await auth_server.start()
+    if settings.RADIUS_COA_ENABLED:
+        await coa_dispatcher.start()
+    if settings.SCHEDULER_ENABLED:
+        register_billing_jobs(job_scheduler, active_devices)
+        await job_scheduler.start()
+    yield
+    await job_scheduler.stop()
+    await coa_dispatcher.stop()
+    await auth_server.stop()
+    await accounting_server.stop()
+    await fleet_poller.stop()
+    await accounting_spool.stop()
+    await mikrotik_pool.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     description="PT MARS DATA TELEKOMUNIKASI - Network Management System with MikroTik API Integration, RADIUS Billing, and Traffic Monitoring",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -1,6 +1,9 @@
 from .user import User
 from .mikrotik import MikroTikDevice
-from .billing import BillingAccount, Payment, TrafficData
+from .billing import (
+    BillingAccount, Payment, PaymentAllocation, TrafficData, SpoolCursor, RevenueDaily, AcctSessionCounter
+)
 from .radius import RadiusUser
 
-__all__ = ["User", "MikroTikDevice", "BillingAccount", "Payment", "TrafficData", "RadiusUser"]
\ No newline at end of file
+__all__ = ["User", "MikroTikDevice", "BillingAccount", "Payment", "PaymentAllocation", "TrafficData", "SpoolCursor",
+           "RevenueDaily", "AcctSessionCounter", "RadiusUser"]
\ No newline at end of file
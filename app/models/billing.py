@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Text, Enum
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Date, DateTime, Boolean, Float, ForeignKey, Text, Enum, Index, UniqueConstraint
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -25,14 +27,25 @@ class BillingAccount(Base):
     full_name = Column(String(100), nullable=False)
     email = Column(String(100), nullable=False)
     phone = Column(String(20), nullable=True)
+    virtual_account = Column(String(32), unique=True, nullable=True)  # bank VA number for transfers
     address = Column(Text, nullable=True)
     package_name = Column(String(100), nullable=False)
     package_price = Column(Float, nullable=False)
     bandwidth_profile = Column(String(50), nullable=False)
+    ppp_profile = Column(String(64), nullable=True)  # secret profile before isolation, restored on reactivation
+    package_changed_at = Column(DateTime, nullable=True)
+    # Owed (+) or credited (-) for package changes after proration_cycle was invoiced, added to the next invoice
+    proration_amount = Column(Float, nullable=True)
+    proration_cycle = Column(DateTime, nullable=True)
     status = Column(Enum(BillingStatus), default=BillingStatus.ACTIVE)
     due_date = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Overdue scan: active accounts by due date
+        Index("ix_billing_accounts_status_due_date", "status", "due_date"),
+    )
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -45,7 +58,36 @@ class Payment(Base):
     payment_date = Column(DateTime, nullable=True)
     due_date = Column(DateTime, nullable=False)
     notes = Column(Text, nullable=True)
+    invoice_key = Column(String(64), unique=True, nullable=True)  # "<account id>:<YYYY-MM>" for invoices
+    paid_amount = Column(Float, nullable=False, default=0.0, server_default="0")  # applied to an invoice so far
+    reference = Column(String(100), nullable=True)  # bank/e-wallet transaction reference
+    package_name = Column(String(100), nullable=True)  # account package when paid, for the revenue rollup
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # A settlement row is imported once per source
+        UniqueConstraint("payment_method", "reference", name="uq_payments_method_reference"),
+        # Billing report: open and overdue invoice counts
+        Index("ix_payments_status_due_date", "status", "due_date"),
+    )
+
+class PaymentAllocation(Base):
+    __tablename__ = "payment_allocations"
+    
+    # What a payment put towards an invoice, so voiding it can reopen the invoice
+    payment_id = Column(Integer, ForeignKey("payments.id"), primary_key=True)
+    invoice_id = Column(Integer, ForeignKey("payments.id"), primary_key=True)
+    amount = Column(Float, nullable=False)
+
+class RevenueDaily(Base):
+    __tablename__ = "revenue_daily"
+    
+    # Paid payments per day, method and package, kept current on payment insert/void
+    day = Column(Date, primary_key=True)
+    payment_method = Column(String(50), primary_key=True)
+    package_name = Column(String(100), primary_key=True)  # "" if unknown
+    payments = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
 
 class TrafficData(Base):
     __tablename__ = "traffic_data"
@@ -59,4 +101,27 @@ class TrafficData(Base):
     total_bytes = Column(Integer, default=0)
     session_time = Column(Integer, default=0)
     recorded_at = Column(DateTime, default=datetime.utcnow)
-    date_only = Column(String(10), nullable=False)  # YYYY-MM-DD for easy grouping
\ No newline at end of file
+    date_only = Column(String(10), nullable=False)  # YYYY-MM-DD for easy grouping
+    
+    __table_args__ = (
+        # Quota engine startup: this cycle's rows only
+        Index("ix_traffic_data_recorded_at", "recorded_at"),
+    )
+
+class SpoolCursor(Base):
+    __tablename__ = "spool_cursors"
+    
+    name = Column(String(50), primary_key=True)
+    sequence = Column(BigInteger, nullable=False, default=0)  # last spool record stored
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AcctSessionCounter(Base):
+    __tablename__ = "acct_session_counters"
+    
+    # Last cumulative counters of each open accounting session: the delta baseline after a restart
+    nas_ip = Column(String(45), primary_key=True)
+    session_id = Column(String(64), primary_key=True)
+    input_octets = Column(BigInteger, nullable=False, default=0)
+    output_octets = Column(BigInteger, nullable=False, default=0)
+    session_time = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
\ No newline at end of file
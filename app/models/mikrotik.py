@@ -11,6 +11,7 @@ class MikroTikDevice(Base):
     name = Column(String(100), nullable=False)
     ip_address = Column(String(15), unique=True, nullable=False)
     port = Column(Integer, default=8728)
+    use_ssl = Column(Boolean(), default=False)
     username = Column(String(50), nullable=False)
     password = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
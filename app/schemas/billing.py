@@ -7,6 +7,7 @@ class BillingAccountBase(BaseModel):
     full_name: str
     email: EmailStr
     phone: Optional[str] = None
+    virtual_account: Optional[str] = None
     address: Optional[str] = None
     package_name: str
     package_price: float
@@ -17,6 +18,11 @@ class BillingAccountBase(BaseModel):
 class BillingAccountCreate(BillingAccountBase):
     pass
 
+class PackageChange(BaseModel):
+    package_name: str
+    package_price: float
+    bandwidth_profile: Optional[str] = None
+
 class BillingAccount(BillingAccountBase):
     id: int
     created_at: datetime
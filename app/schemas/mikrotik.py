@@ -6,6 +6,7 @@ class MikroTikDeviceBase(BaseModel):
     name: str
     ip_address: str
     port: int = 8728
+    use_ssl: bool = False
     username: str
     description: Optional[str] = None
     is_active: bool = True
@@ -24,7 +25,8 @@ class MikroTikDevice(MikroTikDeviceBase):
 class MikroTikStats(BaseModel):
     device_id: int
     cpu_load: float
-    memory_usage: float
+    memory_usage: float  # free bytes
+    memory_used_percent: Optional[float] = None
     uptime: str
     version: str
     board_name: str
@@ -37,6 +39,8 @@ class InterfaceStats(BaseModel):
     rx_packets: int
     tx_packets: int
     status: str
+    rx_bps: Optional[float] = None
+    tx_bps: Optional[float] = None
 
 class PPPoEUser(BaseModel):
     name: str
@@ -45,4 +49,6 @@ class PPPoEUser(BaseModel):
     uptime: str
     bytes_in: int
     bytes_out: int
-    service: str
\ No newline at end of file
+    service: str
+    in_bps: Optional[float] = None
+    out_bps: Optional[float] = None
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class RadiusUserBase(BaseModel):
@@ -17,4 +17,23 @@ class RadiusUser(RadiusUserBase):
     last_activity: Optional[datetime] = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class RadiusSession(BaseModel):
+    username: str
+    session_id: str
+    nas_ip: str
+    device_id: Optional[int] = None
+    framed_ip: Optional[str] = None
+    caller_id: Optional[str] = None
+    started_at: Optional[datetime] = None
+    input_octets: int = 0
+    output_octets: int = 0
+    in_bps: float = 0
+    out_bps: float = 0
+    source: str
+    idle: float
+
+class RadiusSessionList(BaseModel):
+    total: int
+    sessions: List[RadiusSession]
\ No newline at end of file
@@ -1,5 +1,7 @@
 from .mikrotik_api import MikroTikAPI
+from .mikrotik_async import AsyncMikroTikAPI
 from .radius_service import RadiusService
+from .radius_client import AsyncRadiusClient
 from .billing_service import BillingService
 
-__all__ = ["MikroTikAPI", "RadiusService", "BillingService"]
\ No newline at end of file
+__all__ = ["MikroTikAPI", "AsyncMikroTikAPI", "RadiusService", "AsyncRadiusClient", "BillingService"]
\ No newline at end of file
@@ -0,0 +1,391 @@
+import asyncio
+import mmap
+import os
+import socket
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models.billing import SpoolCursor, TrafficData
+from app.services.mikrotik_pool import device_field
+
+# sequence, crc32 of the body
+_HEAD = struct.Struct("<QI")
+# device id (-1: resolve from NAS address), NAS address, rx, tx, session time,
+# recorded_at in microseconds since the epoch, username
+_BODY = struct.Struct("<i4sqqIq64s")
+RECORD_SIZE = _HEAD.size + _BODY.size
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NO_ADDRESS = b"\x00" * 4
+
+
+def load_cursor(name: str) -> int:
+    """Last spool sequence stored in the database"""
+    db = SessionLocal()
+    try:
+        cursor = db.get(SpoolCursor, name)
+        return cursor.sequence if cursor else 0
+    finally:
+        db.close()
+
+
+def store_spooled_records(records: List[Dict], name: str, sequence: int):
+    """Insert TrafficData rows and move the cursor in one transaction
+
+    A replay after a crash then either sees the batch and the new cursor
+    or neither, so no record is stored twice.
+    """
+    db = SessionLocal()
+    try:
+        if records:
+            db.execute(insert(TrafficData), records)
+        db.merge(SpoolCursor(name=name, sequence=sequence))
+        db.commit()
+    finally:
+        db.close()
+
+
+class _Segment:
+    __slots__ = ("path", "first", "file", "map")
+
+    def __init__(self, path: str, first: int, size: int):
+        self.path = path
+        self.first = first
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if os.fstat(self.file.fileno()).st_size < size:
+            # Sparse: unwritten slots read back as zeros
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def sequence(self, slot: int) -> int:
+        return _HEAD.unpack_from(self.map, slot * RECORD_SIZE)[0]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class AccountingSpool:
+    """Durable append-only spool between traffic ingestion and the database
+
+    TrafficData rows are appended as fixed-size records to memory-mapped
+    segment files of ``segment_records`` slots each, so ``append`` is a
+    couple of memory copies and callers can acknowledge right after it.
+    A record is safe from a process crash once appended and from a host
+    crash after the next sync (every ``sync_interval`` seconds).
+
+    A replayer task stores the records in batches of ``batch_size``. The
+    position reached is kept in the spool_cursors table and written in the
+    same transaction as the rows, which makes the replay exactly-once.
+    Segments below the cursor are deleted; at ``max_segments`` the spool
+    is full and ``append`` refuses records until the database catches up.
+    On start the write position is recovered from the last segment.
+    """
+
+    def __init__(self, directory: str, name: str = "accounting", segment_records: int = 65536,
+                 max_segments: int = 64, batch_size: int = 5000, flush_interval: float = 1.0,
+                 sync_interval: float = 1.0,
+                 device_source: Callable[[], Iterable[Any]] = list,
+                 store: Callable[[List[Dict], str, int], None] = store_spooled_records,
+                 cursor_source: Callable[[str], int] = load_cursor):
+        self.directory = directory
+        self.name = name
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.device_source = device_source
+        self.store = store
+        self.cursor_source = cursor_source
+        self._segments: List[_Segment] = []
+        self._next = 0
+        self._slot = 0
+        self.cursor: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._synced = 0.0
+        self.appended = 0
+        self.rejected = 0
+        self.replayed = 0
+        self.batches = 0
+        self.corrupt = 0
+        self.write_errors = 0
+
+    @property
+    def head(self) -> int:
+        """Last sequence appended"""
+        return self._next - 1
+
+    @property
+    def pending(self) -> int:
+        return self._next - 1 - self.cursor if self.cursor is not None else self._next - self._first()
+
+    async def start(self):
+        """Recover the segments and start the replayer"""
+        self.open()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.ensure_future(self._replay())
+
+    async def stop(self):
+        """Store what the database accepts, then sync and close the segments"""
+        if self._task:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        self.close()
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(".seg"))
+        self._segments = [
+            _Segment(os.path.join(self.directory, name), int(name[:-4]), self._segment_size())
+            for name in names
+        ]
+        if not self._segments:
+            # Start above anything a previous spool in this directory stored
+            self._rotate(int(time.time() * 1e6))
+            return
+        active = self._segments[-1]
+        self._slot = self._recover(active)
+        self._next = active.first + self._slot
+
+    def close(self):
+        self.sync()
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+
+    def sync(self):
+        """Flush the active segment to disk"""
+        if self._segments:
+            self._segments[-1].map.flush()
+        self._synced = time.monotonic()
+
+    def full(self) -> bool:
+        return self._slot >= self.segment_records and len(self._segments) >= self.max_segments
+
+    def append(self, row: Dict[str, Any]) -> bool:
+        """Append one TrafficData row; False if the spool is full"""
+        if self._slot >= self.segment_records:
+            if len(self._segments) >= self.max_segments:
+                self.rejected += 1
+                return False
+            self._rotate(self._next)
+        nas_ip = row.get("nas_ip")
+        device_id = row.get("mikrotik_device_id")
+        body = _BODY.pack(
+            -1 if device_id is None else device_id,
+            socket.inet_aton(nas_ip) if nas_ip else _NO_ADDRESS,
+            row["rx_bytes"],
+            row["tx_bytes"],
+            row["session_time"],
+            (row["recorded_at"] - _EPOCH) // _MICROSECOND,
+            row["username"].encode()[:64],
+        )
+        offset = self._slot * RECORD_SIZE
+        segment_map = self._segments[-1].map
+        # Body first: a record only counts once its sequence is in place
+        segment_map[offset + _HEAD.size:offset + RECORD_SIZE] = body
+        segment_map[offset:offset + _HEAD.size] = _HEAD.pack(self._next, zlib.crc32(body))
+        self._next += 1
+        self._slot += 1
+        self.appended += 1
+        if self._wakeup is not None and self.cursor is not None and self.pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def append_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Append rows until the spool is full; number appended"""
+        count = 0
+        for row in rows:
+            if not self.append(row):
+                break
+            count += 1
+        return count
+
+    def read(self, start: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Up to ``limit`` rows from sequence ``start`` on, and the last sequence read"""
+        rows = []
+        last = start - 1
+        for segment in self._segments:
+            end = segment.first + self.segment_records
+            if end <= start:
+                continue
+            slot = max(start - segment.first, 0)
+            stop = min(self._next, end) - segment.first
+            segment_map = segment.map
+            while slot < stop and len(rows) < limit:
+                offset = slot * RECORD_SIZE
+                sequence, crc = _HEAD.unpack_from(segment_map, offset)
+                body = segment_map[offset + _HEAD.size:offset + RECORD_SIZE]
+                last = segment.first + slot
+                slot += 1
+                if sequence != last or zlib.crc32(body) != crc:
+                    self.corrupt += 1
+                    print(f"Accounting spool: skipping corrupt record {last} in {segment.path}")
+                    continue
+                rows.append(self._row(body))
+            if len(rows) >= limit:
+                break
+        return rows, last
+
+    def _row(self, body: bytes) -> Dict[str, Any]:
+        device_id, nas_ip, rx, tx, session_time, recorded, username = _BODY.unpack(body)
+        recorded_at = _EPOCH + timedelta(microseconds=recorded)
+        row = {
+            "mikrotik_device_id": None if device_id < 0 else device_id,
+            "username": username.rstrip(b"\x00").decode("utf-8", "replace"),
+            "rx_bytes": rx,
+            "tx_bytes": tx,
+            "total_bytes": rx + tx,
+            "session_time": session_time,
+            "recorded_at": recorded_at,
+            "date_only": recorded_at.strftime("%Y-%m-%d"),
+        }
+        if nas_ip != _NO_ADDRESS:
+            row["nas_ip"] = socket.inet_ntoa(nas_ip)
+        return row
+
+    def _segment_size(self) -> int:
+        return self.segment_records * RECORD_SIZE
+
+    def _first(self) -> int:
+        return self._segments[0].first if self._segments else self._next
+
+    def _rotate(self, first: int):
+        if self._segments:
+            self._segments[-1].map.flush()
+        path = os.path.join(self.directory, f"{first:020d}.seg")
+        self._segments.append(_Segment(path, first, self._segment_size()))
+        self._next = first
+        self._slot = 0
+
+    def _recover(self, segment: _Segment) -> int:
+        """Slot after the last intact record of the active segment"""
+        # Slots are written in order, so the used ones form a prefix
+        low, high = 0, self.segment_records
+        while low < high:
+            middle = (low + high) // 2
+            if segment.sequence(middle):
+                low = middle + 1
+            else:
+                high = middle
+        # Drop a record torn by a host crash
+        while low:
+            offset = (low - 1) * RECORD_SIZE
+            sequence, crc = _HEAD.unpack_from(segment.map, offset)
+            if sequence == segment.first + low - 1 and \
+                    zlib.crc32(segment.map[offset + _HEAD.size:offset + RECORD_SIZE]) == crc:
+                break
+            segment.map[offset:offset + RECORD_SIZE] = bytes(RECORD_SIZE)
+            low -= 1
+        return low
+
+    def _release(self):
+        """Delete segments the database has fully stored, never the active one"""
+        while len(self._segments) > 1 and \
+                self._segments[0].first + self.segment_records - 1 <= self.cursor:
+            segment = self._segments.pop(0)
+            segment.close()
+            os.remove(segment.path)
+
+    async def _replay(self):
+        loop = asyncio.get_event_loop()
+        delay = 1.0
+        while self.cursor is None:
+            try:
+                stored = await loop.run_in_executor(None, self.cursor_source, self.name)
+            except Exception as e:
+                print(f"Accounting spool: cannot read cursor: {e}")
+                if self._stopping:
+                    return
+                await self._sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            # Records before the oldest segment were released earlier
+            self.cursor = max(stored, self._first() - 1)
+
+        delay = 1.0
+        while True:
+            if self.pending < self.batch_size and not self._stopping:
+                await self._sleep(self.flush_interval)
+            if time.monotonic() - self._synced >= self.sync_interval:
+                self.sync()
+            rows, last = self.read(self.cursor + 1, self.batch_size)
+            if last <= self.cursor:
+                if self._stopping:
+                    return
+                continue
+            self._resolve_devices(rows)
+            try:
+                await loop.run_in_executor(None, self.store, rows, self.name, last)
+            except Exception as e:
+                # Still on disk: retry, or replay on the next start
+                self.write_errors += 1
+                print(f"Accounting spool write error: {e}")
+                if self._stopping:
+                    return
+                await self._sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 1.0
+            self.cursor = last
+            self.replayed += len(rows)
+            self.batches += 1
+            self._release()
+
+    async def _sleep(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _resolve_devices(self, rows: List[Dict[str, Any]]):
+        device_ids = None
+        for row in rows:
+            nas_ip = row.pop("nas_ip", None)
+            if nas_ip is not None and row["mikrotik_device_id"] is None:
+                if device_ids is None:
+                    device_ids = {
+                        device_field(device, "ip_address"): device_field(device, "id")
+                        for device in self.device_source()
+                    }
+                row["mikrotik_device_id"] = device_ids.get(nas_ip)
+
+    def stats(self) -> Dict[str, Any]:
+        """Spool position and replay counters"""
+        return {
+            "head": self.head,
+            "cursor": self.cursor,
+            "pending": self.pending,
+            "segments": len(self._segments),
+            "full": self.full(),
+            "appended": self.appended,
+            "rejected": self.rejected,
+            "replayed": self.replayed,
+            "batches": self.batches,
+            "corrupt": self.corrupt,
+            "write_errors": self.write_errors,
+        }
+
+
+accounting_spool = AccountingSpool(
+    settings.ACCOUNTING_SPOOL_DIR,
+    segment_records=settings.ACCOUNTING_SPOOL_SEGMENT_RECORDS,
+    max_segments=settings.ACCOUNTING_SPOOL_MAX_SEGMENTS,
+    batch_size=settings.ACCOUNTING_SPOOL_BATCH_SIZE,
+    sync_interval=settings.ACCOUNTING_SPOOL_SYNC_INTERVAL,
+)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List
+
+from app.core.config import settings
+from app.database import SessionLocal, engine
+from app.services.billing_service import BillingService
+from app.services.billing_stats import billing_stats
+from app.services.mikrotik_bulk import push_account_changes
+from app.services.quota_engine import quota_engine
+from app.services.radius_coa import coa_dispatcher
+from app.services.scheduler import JobScheduler
+from app.services.subscriber_index import subscriber_index
+
+
+def process_overdue_accounts() -> List[Dict]:
+    """Overdue isolation on its own connection (process pool entry point)"""
+    # Connections inherited from the parent process must not be reused
+    engine.dispose(close=False)
+    db = SessionLocal()
+    try:
+        return BillingService(db).process_overdue_accounts()
+    finally:
+        db.close()
+
+
+def save_ppp_profiles(profiles: Dict[int, str]) -> int:
+    """Pre-isolation PPP profiles on their own connection"""
+    db = SessionLocal()
+    try:
+        return BillingService(db).save_ppp_profiles(profiles)
+    finally:
+        db.close()
+
+
+def generate_monthly_invoices() -> Dict:
+    """This cycle's invoices on its own connection (process pool entry point)"""
+    engine.dispose(close=False)
+    db = SessionLocal()
+    try:
+        return BillingService(db).generate_monthly_invoices()
+    finally:
+        db.close()
+
+
+async def apply_isolations(isolated: List[Dict], devices: Iterable[Any]) -> Dict[str, Any]:
+    """Push isolations to the RADIUS index, online sessions and routers"""
+    coa_queued = 0
+    for account in isolated:
+        subscriber_index.set_account_status(account["username"], "suspended")
+        billing_stats.set_account_status(account["account_id"], "suspended")
+        coa_queued += coa_dispatcher.account_changed(account["username"])
+    router_changes = await push_account_changes(
+        [{"username": account["username"], "action": "isolate"} for account in isolated], devices
+    )
+    # Reactivation restores the profile the secret had before
+    profiles = {
+        account["account_id"]: change["previous_profile"]
+        for account, change in zip(isolated, router_changes) if change["previous_profile"]
+    }
+    if profiles:
+        await asyncio.get_running_loop().run_in_executor(None, save_ppp_profiles, profiles)
+    return {"router_changes": router_changes, "coa_queued": coa_queued}
+
+
+async def apply_reactivations(reactivated: List[Dict], devices: Iterable[Any]) -> Dict[str, Any]:
+    """Push reactivations to the RADIUS index, online sessions and routers"""
+    coa_queued = 0
+    for account in reactivated:
+        subscriber_index.set_account_status(account["username"], "active")
+        billing_stats.set_account_status(account["account_id"], "active")
+        coa_queued += coa_dispatcher.account_changed(account["username"])
+    router_changes = await push_account_changes(
+        [{
+            "username": account["username"],
+            "action": "reactivate",
+            "profile": account.get("ppp_profile"),
+            "max_limit": account["bandwidth_profile"]
+        } for account in reactivated],
+        devices
+    )
+    return {"router_changes": router_changes, "coa_queued": coa_queued}
+
+
+def register_billing_jobs(scheduler: JobScheduler, device_source: Callable[[], Iterable[Any]]):
+    """Nightly overdue isolation, monthly invoicing, stats reconciliation and FUP rollover"""
+
+    async def overdue_isolation() -> Dict[str, Any]:
+        isolated = await scheduler.run_in_process(process_overdue_accounts)
+        pushed = await apply_isolations(isolated, device_source())
+        return {"isolated": len(isolated), "coa_queued": pushed["coa_queued"]}
+
+    scheduler.add_job(
+        "overdue_isolation", settings.BILLING_OVERDUE_CRON, overdue_isolation,
+        jitter=settings.BILLING_JOB_JITTER
+    )
+    # A multi-worker invoice run starts its own process pool, which a pool
+    # worker cannot do, so it runs from a thread instead
+    scheduler.add_job(
+        "monthly_invoices", settings.BILLING_INVOICE_CRON, generate_monthly_invoices,
+        jitter=settings.BILLING_JOB_JITTER, process=settings.BILLING_INVOICE_WORKERS <= 1
+    )
+
+    async def stats_reconciliation() -> Dict[str, Any]:
+        # Compared and swapped on the loop: the running totals are only ever touched from there
+        return await billing_stats.refresh()
+
+    scheduler.add_job("billing_stats_reconcile", settings.BILLING_STATS_RECONCILE_CRON, stats_reconciliation)
+
+    async def quota_rollover() -> Dict[str, Any]:
+        # Traffic arriving after midnight rolls the cycle too; this covers quiet nights
+        return {"restored": quota_engine.roll()}
+
+    scheduler.add_job("fup_rollover", settings.FUP_ROLLOVER_CRON, quota_rollover)
\ No newline at end of file
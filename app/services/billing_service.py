@@ -1,140 +1,427 @@
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-import schedule
-import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import BinaryIO, List, Dict, Optional, Tuple
+import uuid
+from sqlalchemy import and_, bindparam, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.database import SessionLocal, engine
+from app.models.billing import BillingAccount, BillingStatus, Payment, PaymentAllocation, PaymentStatus
+from app.services.payment_import import AccountIndex, PaymentImporter, read_rows
+from app.services.quota_engine import quota_engine
+from app.services.revenue_ledger import (
+    INVOICE_METHOD, counts_as_revenue, rebuild_revenue, record_revenue, revenue_report
+)
+
+def cycle_start(day: datetime) -> datetime:
+    """First moment of the billing cycle (calendar month) containing ``day``"""
+    return day.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def proration(price: float, new_price: float, changed_at: datetime) -> float:
+    """Price difference for the rest of the cycle from ``changed_at`` on"""
+    cycle = cycle_start(changed_at)
+    next_cycle = cycle_start(cycle + timedelta(days=32))
+    return (new_price - price) * ((next_cycle - changed_at) / (next_cycle - cycle))
+
+def invoice_amount(price: float, proration_amount: Optional[float], proration_cycle: Optional[datetime],
+                   cycle: datetime) -> Tuple[float, float]:
+    """Invoice total for ``cycle`` and the proration adjustment it includes
+    
+    Invoices are billed in advance, so package changes made after the
+    previous cycle was invoiced were billed at the old price; what
+    ``change_package`` recorded for that cycle is added (or credited on
+    a downgrade).
+    """
+    if proration_amount is None or proration_cycle != cycle_start(cycle - timedelta(days=1)):
+        return round(price, 2), 0.0
+    adjustment = round(proration_amount, 2)
+    return round(price + adjustment, 2), adjustment
+
+def _invoice_summary(cycle: datetime) -> Dict:
+    return {"cycle": cycle.strftime("%Y-%m"), "accounts": 0, "created": 0, "skipped": 0,
+            "prorated": 0, "amount": 0.0}
+
+def _generate_invoice_range(cycle: datetime, first_id: int, last_id: int, chunk_size: int) -> Dict:
+    """Process pool entry point: one account-id range on its own connection"""
+    # Connections inherited from the parent process must not be reused
+    engine.dispose(close=False)
+    db = SessionLocal()
+    try:
+        return BillingService(db)._invoice_range(cycle, first_id, last_id, chunk_size)
+    finally:
+        db.close()
+
 class BillingService:
     """Billing and Payment Management Service"""
     
     def __init__(self, db_session: Session):
         self.db = db_session
     
-    def process_overdue_accounts(self) -> List[Dict]:
-        """Process overdue accounts and isolate them"""
-        overdue_accounts = []
-        current_date = datetime.now()
+    def process_overdue_accounts(self, now: Optional[datetime] = None,
+                                 chunk_size: int = settings.BILLING_OVERDUE_CHUNK_SIZE) -> List[Dict]:
+        """Isolate active accounts past their due date, one chunk per transaction
         
-        # Mock implementation - in production, query database
-        mock_accounts = [
-            {
-                "id": 1,
-                "username": "user001",
-                "due_date": "2024-01-15",
-                "status": "active",
-                "amount_due": 350000
-            },
-            {
-                "id": 2,
-                "username": "user002", 
-                "due_date": "2024-01-10",
-                "status": "active",
-                "amount_due": 200000
-            }
-        ]
+        Candidates come from the (status, due_date) index. Each chunk is
+        suspended with a single UPDATE and committed, so locks are held for
+        one chunk only; isolated accounts drop out of the next lookup.
+        """
+        current_date = now or datetime.now()
+        overdue = and_(
+            BillingAccount.status == BillingStatus.ACTIVE,
+            BillingAccount.due_date < current_date
+        )
+        candidates = (
+            select(BillingAccount.id, BillingAccount.username, BillingAccount.due_date,
+                   BillingAccount.package_price)
+            .where(overdue)
+            .order_by(BillingAccount.due_date)
+            .limit(chunk_size)
+        )
+        returning = self.db.get_bind().dialect.update_returning
         
-        for account in mock_accounts:
-            due_date = datetime.fromisoformat(account["due_date"])
-            if due_date < current_date and account["status"] == "active":
-                # Mark as overdue and isolate
-                account["status"] = "suspended"
+        overdue_accounts = []
+        while True:
+            rows = self.db.execute(candidates).all()
+            if not rows:
+                break
+            suspend = (
+                update(BillingAccount)
+                .where(BillingAccount.id.in_([row.id for row in rows]), overdue)
+                .values(status=BillingStatus.SUSPENDED, updated_at=current_date)
+                .execution_options(synchronize_session=False)
+            )
+            if returning:
+                # Only rows still overdue at UPDATE time, e.g. not paid meanwhile
+                updated = set(self.db.execute(suspend.returning(BillingAccount.id)).scalars())
+                rows = [row for row in rows if row.id in updated]
+            else:
+                self.db.execute(suspend)
+            self.db.commit()
+            
+            for row in rows:
                 overdue_accounts.append({
-                    "account_id": account["id"],
-                    "username": account["username"],
-                    "days_overdue": (current_date - due_date).days,
-                    "amount_due": account["amount_due"],
+                    "account_id": row.id,
+                    "username": row.username,
+                    "days_overdue": (current_date - row.due_date).days,
+                    "amount_due": row.package_price,
                     "action": "isolated"
                 })
         
         return overdue_accounts
     
-    def generate_monthly_invoices(self) -> List[Dict]:
-        """Generate monthly invoices for all active accounts"""
-        invoices = []
-        current_date = datetime.now()
-        next_month = current_date + timedelta(days=30)
+    def save_ppp_profiles(self, profiles: Dict[int, str]) -> int:
+        """Remember the PPP profile each account's secret had before isolation"""
+        if not profiles:
+            return 0
+        table = BillingAccount.__table__
+        self.db.execute(
+            update(table).where(table.c.id == bindparam("account_id")).values(ppp_profile=bindparam("profile")),
+            [{"account_id": account_id, "profile": profile} for account_id, profile in profiles.items()]
+        )
+        self.db.commit()
+        return len(profiles)
+    
+    def generate_monthly_invoices(self, cycle: Optional[datetime] = None,
+                                  chunk_size: int = settings.BILLING_INVOICE_CHUNK_SIZE,
+                                  workers: int = settings.BILLING_INVOICE_WORKERS) -> Dict:
+        """Create this cycle's pending invoice Payment for every active account
         
-        # Mock active accounts
-        active_accounts = [
-            {
-                "id": 1,
-                "username": "user001",
-                "package_price": 350000,
-                "package_name": "Premium 50Mbps"
-            },
-            {
-                "id": 2,
-                "username": "user002",
-                "package_price": 200000,
-                "package_name": "Basic 25Mbps"
-            }
-        ]
+        Accounts are read in id order, ``chunk_size`` at a time, and each
+        chunk's invoices are bulk inserted and committed together. Every
+        invoice carries the key "<account id>:<YYYY-MM>", so a rerun or a
+        restart after a crash only fills in the accounts still missing one.
+        With ``workers`` > 1 account-id ranges are split across processes.
+        """
+        cycle = cycle_start(cycle or datetime.now())
+        if workers > 1:
+            bounds = self.db.execute(
+                select(func.min(BillingAccount.id), func.max(BillingAccount.id))
+                .where(BillingAccount.status == BillingStatus.ACTIVE)
+            ).one()
+            if bounds[0] is not None:
+                return self._invoice_ranges(cycle, bounds[0], bounds[1], chunk_size, workers)
+        return self._invoice_range(cycle, None, None, chunk_size)
+    
+    def _invoice_ranges(self, cycle: datetime, first_id: int, last_id: int,
+                        chunk_size: int, workers: int) -> Dict:
+        step = (last_id - first_id) // workers + 1
+        ranges = [(start, min(start + step - 1, last_id)) for start in range(first_id, last_id + 1, step)]
+        summary = _invoice_summary(cycle)
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(_generate_invoice_range, cycle, start, end, chunk_size) for start, end in ranges
+            ]
+            for future in futures:
+                for name, value in future.result().items():
+                    if name != "cycle":
+                        summary[name] += value
+        return summary
+    
+    def _invoice_range(self, cycle: datetime, first_id: Optional[int], last_id: Optional[int],
+                       chunk_size: int) -> Dict:
+        """Invoice active accounts with ids in [first_id, last_id]"""
+        period = cycle.strftime("%Y-%m")
+        due_date = cycle + timedelta(days=settings.BILLING_INVOICE_DUE_DAYS)
+        summary = _invoice_summary(cycle)
+        accounts = (
+            select(BillingAccount.id, BillingAccount.package_name, BillingAccount.package_price,
+                   BillingAccount.proration_amount, BillingAccount.proration_cycle)
+            .where(BillingAccount.status == BillingStatus.ACTIVE)
+            .order_by(BillingAccount.id)
+            .limit(chunk_size)
+        )
+        if last_id is not None:
+            accounts = accounts.where(BillingAccount.id <= last_id)
+        after = first_id - 1 if first_id is not None else None
+        retried = False
         
-        for account in active_accounts:
-            invoice = {
-                "account_id": account["id"],
-                "username": account["username"],
-                "amount": account["package_price"],
-                "package": account["package_name"],
-                "invoice_date": current_date.isoformat(),
-                "due_date": next_month.isoformat(),
-                "status": "pending"
-            }
-            invoices.append(invoice)
+        while True:
+            chunk = accounts.where(BillingAccount.id > after) if after is not None else accounts
+            rows = self.db.execute(chunk).all()
+            if not rows:
+                break
+            keys = {f"{row.id}:{period}": row for row in rows}
+            existing = set(self.db.execute(
+                select(Payment.invoice_key).where(Payment.invoice_key.in_(list(keys)))
+            ).scalars())
+            invoices = []
+            prorated = 0
+            for key, row in keys.items():
+                if key in existing:
+                    continue
+                amount, adjustment = invoice_amount(
+                    row.package_price, row.proration_amount, row.proration_cycle, cycle
+                )
+                notes = f"Invoice {period}: {row.package_name}"
+                if adjustment:
+                    prorated += 1
+                    notes += f", prorated {adjustment:+.2f} for package changes in {row.proration_cycle:%Y-%m}"
+                invoices.append({
+                    "billing_account_id": row.id,
+                    "amount": amount,
+                    "payment_method": INVOICE_METHOD,
+                    "status": PaymentStatus.PENDING,
+                    "due_date": due_date,
+                    "notes": notes,
+                    "invoice_key": key,
+                    "created_at": cycle,
+                })
+            try:
+                if invoices:
+                    # Core insert: no per-row ORM bookkeeping for plain dicts
+                    self.db.execute(insert(Payment.__table__), invoices)
+                self.db.commit()
+            except IntegrityError:
+                # Another run invoiced some of this chunk first: redo it without those
+                self.db.rollback()
+                if retried:
+                    raise
+                retried = True
+                continue
+            
+            retried = False
+            after = rows[-1].id
+            summary["accounts"] += len(rows)
+            summary["created"] += len(invoices)
+            summary["skipped"] += len(rows) - len(invoices)
+            summary["prorated"] += prorated
+            summary["amount"] += sum(invoice["amount"] for invoice in invoices)
         
-        return invoices
+        return summary
     
-    def process_payment(self, account_id: int, amount: float, 
-                       payment_method: str, reference: str = None) -> Dict:
-        """Process payment for an account"""
-        # Mock payment processing
-        payment = {
-            "payment_id": f"PAY_{int(time.time())}",
-            "account_id": account_id,
-            "amount": amount,
-            "payment_method": payment_method,
+    def change_package(self, account_id: int, package_name: str, package_price: float,
+                       bandwidth_profile: Optional[str] = None, changed_at: Optional[datetime] = None):
+        """Switch an account's package, recording the proration the next invoice adds
+        
+        Once the cycle is invoiced, each change owes (or credits) the price
+        difference for the rest of it, so several changes in one cycle add
+        up to what each package cost for the days it was held. A change
+        before the cycle is invoiced needs none: that invoice bills the new
+        price.
+        """
+        account = self.db.get(BillingAccount, account_id)
+        if account is None:
+            raise ValueError(f"Billing account {account_id} not found")
+        changed_at = changed_at or datetime.now()
+        cycle = cycle_start(changed_at)
+        invoiced = self.db.execute(
+            select(Payment.id).where(Payment.invoice_key == f"{account.id}:{cycle:%Y-%m}")
+        ).first()
+        if invoiced is not None:
+            if account.proration_cycle != cycle:
+                # Anything recorded for an earlier cycle went on this cycle's invoice
+                account.proration_amount = 0.0
+                account.proration_cycle = cycle
+            account.proration_amount = round(
+                account.proration_amount + proration(account.package_price, package_price, changed_at), 2
+            )
+        account.package_changed_at = changed_at
+        account.package_name = package_name
+        account.package_price = package_price
+        if bandwidth_profile is not None:
+            account.bandwidth_profile = bandwidth_profile
+        self.db.commit()
+        return account
+    
+    def process_payment(self, account_id: int, amount: float, payment_method: str,
+                        reference: Optional[str] = None,
+                        notes: Optional[str] = None) -> Tuple[Payment, Dict, Dict[int, float]]:
+        """Record a payment taken for one account
+        
+        Returns the payment, the import report and what it paid towards
+        each open invoice (PaymentImporter.allocated).
+        The payment goes through PaymentImporter like a one-row settlement
+        file, so it settles the account's open invoices, enters the revenue
+        rollup and reactivates the account if that pays it up.
+        """
+        if amount <= 0:
+            raise ValueError(f"Invalid amount {amount}")
+        index = AccountIndex()
+        index.load(self.db, account_ids=[account_id])
+        if account_id not in index.accounts:
+            raise ValueError(f"Billing account {account_id} not found")
+        reference = reference or f"manual:{uuid.uuid4().hex}"
+        row = {
+            "amount": round(amount, 2),
             "reference": reference,
-            "status": "completed",
-            "processed_at": datetime.now().isoformat()
+            "payment_date": None,
+            "virtual_account": None,
+            "username": index.accounts[account_id][0],
+            "phone": None,
+            "notes": notes,
         }
+        importer = PaymentImporter(self.db, payment_method, index=index)
+        report = importer.run([(1, row, None)])
+        if report["duplicates"]:
+            raise ValueError(f"Payment {reference} was already recorded")
+        payment = self.db.execute(
+            select(Payment).where(Payment.payment_method == payment_method, Payment.reference == reference)
+        ).scalar_one()
+        return payment, report, importer.allocated
+    
+    def import_payments(self, stream: BinaryIO, fmt: str, source: str,
+                        batch_size: int = settings.BILLING_IMPORT_BATCH_SIZE) -> Tuple[Dict, Dict[int, float]]:
+        """Import a bank/e-wallet settlement file
         
-        # In production: update database, send receipt, reactivate account if needed
+        Returns the reconciliation report and what the file paid towards
+        each open invoice. The file is read row by row, so its size does
+        not matter; see PaymentImporter for matching, settlement and
+        reactivation.
+        """
+        importer = PaymentImporter(self.db, source, batch_size)
+        return importer.run(read_rows(stream, fmt)), importer.allocated
+    
+    def void_payment(self, payment_id: int, now: Optional[datetime] = None) -> Tuple[Payment, List[Payment]]:
+        """Cancel a payment and return it with the invoices it had paid towards
         
-        return payment
+        The payment leaves the revenue rollup and its allocations are taken
+        back: invoices it settled are open again (overdue if past due) and
+        the account's due date goes back to the earliest of them, so the
+        next overdue run isolates an account the payment had reactivated.
+        """
+        payment = self.db.get(Payment, payment_id)
+        if payment is None:
+            raise ValueError(f"Payment {payment_id} not found")
+        if payment.status == PaymentStatus.CANCELLED:
+            raise ValueError(f"Payment {payment_id} is already void")
+        row = {
+            "status": payment.status,
+            "payment_method": payment.payment_method,
+            "payment_date": payment.payment_date,
+            "created_at": payment.created_at,
+            "package_name": payment.package_name,
+            "amount": payment.amount,
+        }
+        if counts_as_revenue(row) and row["package_name"] is None:
+            # Paid before packages were recorded: the rollup used the account's
+            account = self.db.get(BillingAccount, payment.billing_account_id)
+            row["package_name"] = account.package_name if account else None
+        record_revenue(self.db, [row], sign=-1)
+        payment.status = PaymentStatus.CANCELLED
+        reopened = self._reverse_allocations(payment, now or datetime.now())
+        self.db.commit()
+        return payment, reopened
+    
+    def _reverse_allocations(self, payment: Payment, now: datetime) -> List[Payment]:
+        allocations = self.db.execute(
+            select(PaymentAllocation.invoice_id, PaymentAllocation.amount)
+            .where(PaymentAllocation.payment_id == payment.id)
+        ).all()
+        if not allocations:
+            return []
+        invoices = []
+        for invoice_id, amount in allocations:
+            invoice = self.db.get(Payment, invoice_id)
+            invoice.paid_amount = max(round((invoice.paid_amount or 0.0) - amount, 2), 0.0)
+            if invoice.status == PaymentStatus.PAID:
+                invoice.status = PaymentStatus.OVERDUE if invoice.due_date < now else PaymentStatus.PENDING
+                invoice.payment_date = None
+            invoices.append(invoice)
+        self.db.execute(delete(PaymentAllocation).where(PaymentAllocation.payment_id == payment.id))
+        account = self.db.get(BillingAccount, payment.billing_account_id)
+        due_date = min(invoice.due_date for invoice in invoices)
+        if account is not None and account.due_date > due_date:
+            account.due_date = due_date
+            account.updated_at = now
+        return invoices
+    
+    def rebuild_revenue_ledger(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+        """Recompute the daily revenue rollup from the payments table"""
+        return rebuild_revenue(self.db, start, end)
     
     def get_revenue_report(self, start_date: datetime, end_date: datetime) -> Dict:
-        """Generate revenue report for date range"""
-        # Mock revenue data
-        total_revenue = 15750000
-        total_payments = 45
-        average_payment = total_revenue / total_payments if total_payments > 0 else 0
-        
+        """Revenue for a date range from the daily rollup"""
+        report = revenue_report(self.db, start_date.date(), end_date.date(), "daily")
         return {
             "period": {
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat()
             },
-            "total_revenue": total_revenue,
-            "total_payments": total_payments,
-            "average_payment": average_payment,
-            "payment_methods": {
-                "bank_transfer": {"count": 25, "amount": 8750000},
-                "cash": {"count": 15, "amount": 5250000},
-                "e_wallet": {"count": 5, "amount": 1750000}
-            },
-            "daily_breakdown": [
-                {"date": "2024-01-01", "revenue": 3500000, "payments": 10},
-                {"date": "2024-01-02", "revenue": 2800000, "payments": 8},
-                {"date": "2024-01-03", "revenue": 4200000, "payments": 12},
-                {"date": "2024-01-04", "revenue": 2450000, "payments": 7},
-                {"date": "2024-01-05", "revenue": 2800000, "payments": 8}
-            ]
+            "total_revenue": report["total_revenue"],
+            "total_payments": report["total_payments"],
+            "average_payment": report["average_payment"],
+            "payment_methods": report["payment_methods"],
+            "packages": report["packages"],
+            "daily_breakdown": report["breakdown"]
         }
     
-    def schedule_auto_isolation(self):
-        """Schedule automatic isolation of overdue accounts"""
-        schedule.every().day.at("02:00").do(self.process_overdue_accounts)
-        schedule.every().month.at("01:00").do(self.generate_monthly_invoices)
+    def get_billing_report(self, start: date, end: date, period: str = "monthly") -> Dict:
+        """Billing report per ``period`` (daily/weekly/monthly/yearly) for [start, end]"""
+        report = revenue_report(self.db, start, end, period)
+        invoices = dict(self.db.execute(
+            select(Payment.status, func.count())
+            .where(Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.OVERDUE]))
+            .group_by(Payment.status)
+        ).all())
+        accounts = dict(self.db.execute(
+            select(BillingAccount.status, func.count()).group_by(BillingAccount.status)
+        ).all())
+        new_customers = self.db.execute(
+            select(func.count()).select_from(BillingAccount).where(
+                BillingAccount.created_at >= datetime.combine(start, datetime.min.time()),
+                BillingAccount.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time())
+            )
+        ).scalar()
+        return {
+            "period": period,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "total_revenue": report["total_revenue"],
+            "paid_invoices": report["total_payments"],
+            "pending_invoices": invoices.get(PaymentStatus.PENDING, 0),
+            "overdue_invoices": invoices.get(PaymentStatus.OVERDUE, 0),
+            "total_customers": sum(accounts.values()),
+            "new_customers": new_customers,
+            "cancelled_customers": accounts.get(BillingStatus.TERMINATED, 0),
+            "payment_methods": report["payment_methods"],
+            "packages": report["packages"],
+            "details": [
+                {"date": entry["date"], "revenue": entry["revenue"], "invoices_paid": entry["payments"]}
+                for entry in report["breakdown"]
+            ]
+        }
     
     def get_account_status(self, username: str) -> Dict:
         """Get account status and payment history"""
@@ -148,7 +435,6 @@ class BillingService:
             "package": "Premium 50Mbps",
             "traffic_usage": {
                 "daily_limit": 0,  # unlimited
-                "monthly_usage": 25600000000,  # 25GB
-                "remaining_days": 15
+                **quota_engine.usage(username)
             }
         }
\ No newline at end of file
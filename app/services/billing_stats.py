@@ -0,0 +1,233 @@
+import asyncio
+import enum
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.billing import BillingAccount, Payment
+from app.services.mikrotik_pool import device_field
+from app.services.revenue_ledger import INVOICE_METHOD
+
+# Figures compared by the checker with a tolerance for float summation order
+_AMOUNT_FIELDS = ("total_revenue", "pending_revenue")
+_OPEN_STATUSES = ("pending", "overdue")
+
+
+def _status(value: Any) -> Optional[str]:
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def _counted(payment: Any, status: Optional[str]) -> Optional[float]:
+    """What a payment adds to its status' amount: the amount still owed on an open row
+
+    None for a settled invoice, which is revenue through the payments
+    that settled it.
+    """
+    amount = float(device_field(payment, "amount", 0) or 0)
+    if status in _OPEN_STATUSES:
+        return round(amount - float(device_field(payment, "paid_amount", 0) or 0), 2)
+    if status == "paid" and device_field(payment, "payment_method") == INVOICE_METHOD:
+        return None
+    return amount
+
+
+def load_billing_rows() -> Tuple[List[Any], List[Any]]:
+    """Id and status of every account, and what ``BillingStatsAggregate`` reads of every payment"""
+    db = SessionLocal()
+    try:
+        accounts = db.execute(select(BillingAccount.id, BillingAccount.status)).all()
+        payments = db.execute(
+            select(Payment.id, Payment.status, Payment.amount, Payment.paid_amount, Payment.payment_method)
+        ).all()
+        return accounts, payments
+    finally:
+        db.close()
+
+
+class BillingStatsAggregate:
+    """Running totals behind /billing/stats
+
+    Every account and payment change is applied as a delta, so ``stats``
+    is O(1). Accounts are kept by id with their status; payments only
+    while open (pending or overdue), with what is still owed on them.
+    Paid and cancelled payments are only counted, so a change away from
+    those statuses must say what the row was counted as (see
+    ``update_payment``). Settled invoices are not counted: the payments
+    settling them are the revenue. ``check`` recomputes the figures from
+    full row lists and reports any drift; ``reconcile`` does that
+    against ``source`` and reloads when they disagree. Rows may be
+    dicts, ORM objects or result rows.
+
+    ``source`` (the database, see ``load_billing_rows``) is the only
+    origin of rows: deltas must carry ids from the same tables.
+    """
+
+    def __init__(self):
+        self.source: Optional[Callable[[], Tuple[Iterable[Any], Iterable[Any]]]] = None
+        self._account_status: Dict[Any, Optional[str]] = {}
+        # Open payment id -> (status, amount still owed)
+        self._open: Dict[Any, Tuple[Optional[str], float]] = {}
+        self._accounts_by_status: Counter = Counter()
+        self._payments_by_status: Counter = Counter()
+        self._amount_by_status: Dict[Optional[str], float] = {}
+        self.reconciliations = 0
+        self.drifts = 0
+
+    def load(self, accounts: Iterable[Any], payments: Iterable[Any]):
+        """Rebuild the totals from full account and payment lists"""
+        self._account_status = {}
+        self._open = {}
+        self._accounts_by_status = Counter()
+        self._payments_by_status = Counter()
+        self._amount_by_status = {}
+        for account in accounts:
+            self.update_account(account)
+        for payment in payments:
+            self.update_payment(payment)
+
+    async def start(self):
+        """Load the totals from ``source`` in a worker thread"""
+        if self.source is None:
+            return
+        try:
+            loaded = await asyncio.get_event_loop().run_in_executor(None, self._build)
+        except Exception as e:
+            print(f"Billing stats: cannot load from source: {e}")
+            return
+        self._adopt(loaded)
+
+    def update_account(self, account: Any):
+        """Add or refresh one BillingAccount"""
+        account_id = device_field(account, "id")
+        self.remove_account(account_id)
+        status = _status(device_field(account, "status"))
+        self._account_status[account_id] = status
+        self._accounts_by_status[status] += 1
+
+    def set_account_status(self, account_id: Any, status: Any):
+        """Record a status change for a known account"""
+        if account_id in self._account_status:
+            self.update_account({"id": account_id, "status": status})
+
+    def remove_account(self, account_id: Any):
+        if account_id in self._account_status:
+            self._accounts_by_status[self._account_status.pop(account_id)] -= 1
+
+    def update_payment(self, payment: Any, previous_status: Any = None):
+        """Add or refresh one Payment
+
+        An open row replaces what was kept for it. Any other row is new,
+        or was counted as ``previous_status`` with its method and amount
+        (e.g. a paid payment being voided).
+        """
+        self.remove_payment(payment, previous_status)
+        status = _status(device_field(payment, "status"))
+        counted = _counted(payment, status)
+        if counted is None:
+            return
+        if status in _OPEN_STATUSES:
+            self._open[device_field(payment, "id")] = (status, counted)
+        self._add(status, 1, counted)
+
+    def remove_payment(self, payment: Any, status: Any = None):
+        """Take one Payment out of the totals: an open row by id, any other as ``status``"""
+        previous = self._open.pop(device_field(payment, "id"), None)
+        if previous is None and status is not None:
+            status = _status(status)
+            amount = _counted(payment, status)
+            previous = None if amount is None else (status, amount)
+        if previous is not None:
+            self._add(previous[0], -1, -previous[1])
+
+    def record_payments(self, payment_method: str, count: int, amount: float, allocated: Dict[Any, float]):
+        """Count ``count`` new paid payments of ``amount`` in total and what they paid towards open rows
+
+        ``allocated`` maps open payment ids to the amount put towards them;
+        rows left owing nothing are settled.
+        """
+        if payment_method != INVOICE_METHOD:
+            self._add("paid", count, amount)
+        for payment_id, paid in allocated.items():
+            previous = self._open.pop(payment_id, None)
+            if previous is None:
+                continue
+            status, owed = previous
+            self._add(status, -1, -owed)
+            if owed - paid > 0.005:
+                self._open[payment_id] = (status, owed - paid)
+                self._add(status, 1, owed - paid)
+
+    def _add(self, status: Optional[str], count: int, amount: float):
+        self._payments_by_status[status] += count
+        self._amount_by_status[status] = self._amount_by_status.get(status, 0.0) + amount
+
+    def stats(self) -> Dict[str, Any]:
+        """BillingStats figures"""
+        return {
+            "total_accounts": len(self._account_status),
+            "active_accounts": self._accounts_by_status["active"],
+            "suspended_accounts": self._accounts_by_status["suspended"],
+            "paid_accounts": self._payments_by_status["paid"],
+            "overdue_accounts": self._payments_by_status["overdue"],
+            "total_revenue": self._amount_by_status.get("paid", 0.0),
+            "pending_revenue": self._amount_by_status.get("overdue", 0.0),
+        }
+
+    def check(self, accounts: Iterable[Any], payments: Iterable[Any]) -> Dict[str, Any]:
+        """Recompute the figures from scratch and report drift from the running totals"""
+        expected = BillingStatsAggregate()
+        expected.load(accounts, payments)
+        return self._compare(expected)
+
+    def _compare(self, expected: "BillingStatsAggregate") -> Dict[str, Any]:
+        actual = self.stats()
+        drift = {}
+        for name, value in expected.stats().items():
+            if name in _AMOUNT_FIELDS:
+                consistent = abs(value - actual[name]) < 0.005
+            else:
+                consistent = value == actual[name]
+            if not consistent:
+                drift[name] = {"expected": value, "actual": actual[name]}
+        return {"consistent": not drift, "drift": drift}
+
+    def reconcile(self, expected: Optional["BillingStatsAggregate"] = None) -> Dict[str, Any]:
+        """Check against ``source`` (or totals already built from it) and reload on drift"""
+        if expected is None:
+            if self.source is None:
+                return {"consistent": True, "drift": {}, "repaired": False}
+            expected = self._build()
+        report = self._compare(expected)
+        self.reconciliations += 1
+        report["repaired"] = False
+        if not report["consistent"]:
+            self.drifts += 1
+            print(f"Billing stats drift, reloading: {report['drift']}")
+            self._adopt(expected)
+            report["repaired"] = True
+        return report
+
+    async def refresh(self) -> Dict[str, Any]:
+        """``reconcile`` with ``source`` read and totalled in a worker thread"""
+        if self.source is None:
+            return {"consistent": True, "drift": {}, "repaired": False}
+        expected = await asyncio.get_event_loop().run_in_executor(None, self._build)
+        return self.reconcile(expected)
+
+    def _build(self) -> "BillingStatsAggregate":
+        built = BillingStatsAggregate()
+        built.load(*self.source())
+        return built
+
+    def _adopt(self, other: "BillingStatsAggregate"):
+        self._account_status = other._account_status
+        self._open = other._open
+        self._accounts_by_status = other._accounts_by_status
+        self._payments_by_status = other._payments_by_status
+        self._amount_by_status = other._amount_by_status
+
+
+billing_stats = BillingStatsAggregate()
+billing_stats.source = load_billing_rows
\ No newline at end of file
@@ -1,7 +1,243 @@
+import re
 import socket
 import hashlib
 import binascii
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterator, List, Optional, Any
+
+
+def encode_word(word: bytes) -> bytes:
+    """Encode API word with its length prefix"""
+    length = len(word)
+    if length < 0x80:
+        return bytes([length]) + word
+    elif length < 0x4000:
+        return bytes([0x80 | (length >> 8), length & 0xFF]) + word
+    elif length < 0x200000:
+        return bytes([0xC0 | (length >> 16), (length >> 8) & 0xFF, length & 0xFF]) + word
+    elif length < 0x10000000:
+        return bytes([0xE0 | (length >> 24), (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF]) + word
+    else:
+        return bytes([0xF0, (length >> 24) & 0xFF, (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF]) + word
+
+
+def encode_sentence(words: List[str]) -> bytes:
+    """Encode API sentence terminated by a zero-length word"""
+    return b"".join([encode_word(word.encode('utf-8')) for word in words]) + b"\x00"
+
+
+# Columns actually used by parse_interface / parse_pppoe_session
+INTERFACE_PROPLIST = ["name", "rx-byte", "tx-byte", "rx-packet", "tx-packet", "running"]
+PPPOE_PROPLIST = ["name", "caller-id", "address", "uptime", "bytes-in", "bytes-out", "service"]
+
+
+def build_query(path: str, where: Optional[Dict[str, str]] = None,
+                proplist: Optional[List[str]] = None,
+                query: Optional[List[str]] = None,
+                args: Optional[List[str]] = None) -> List[str]:
+    """Build a print command filtered and projected on the router
+
+    ``where`` becomes ANDed ``?key=value`` words, ``query`` is appended
+    verbatim for operators and combinators (``?>bytes-in=0``, ``?#|``),
+    and ``proplist`` limits the reply to the listed properties.
+    """
+    words = [path if path.endswith("/print") else f"{path}/print"]
+    words.extend(args or [])
+    if proplist:
+        words.append("=.proplist=" + ",".join(proplist))
+    for key, value in (where or {}).items():
+        words.append(f"?{key}={value}")
+    words.extend(query or [])
+    return words
+
+
+_UPTIME_PART = re.compile(r"(\d+)([wdhms])")
+_UPTIME_CLOCK = re.compile(r"(\d+):(\d+):(\d+)$")
+_UPTIME_SECONDS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
+
+
+def parse_uptime(uptime: str) -> int:
+    """Convert RouterOS uptime ("1w2d3h4m5s" or "2d03:04:05") to seconds"""
+    seconds = 0
+    clock = _UPTIME_CLOCK.search(uptime)
+    if clock:
+        hours, minutes, secs = clock.groups()
+        seconds = int(hours) * 3600 + int(minutes) * 60 + int(secs)
+        uptime = uptime[:clock.start()]
+    for value, unit in _UPTIME_PART.findall(uptime):
+        seconds += int(value) * _UPTIME_SECONDS[unit]
+    return seconds
+
+
+def parse_system_stats(row: Dict[str, str]) -> Dict[str, Any]:
+    """Map a /system/resource row to MikroTikStats fields"""
+    total_memory = float(row.get("total-memory", "0"))
+    free_memory = float(row.get("free-memory", "0"))
+    return {
+        "cpu_load": float(row.get("cpu-load", "0")),
+        # Free bytes, as the API has always reported it
+        "memory_usage": free_memory,
+        "memory_used_percent": (
+            round((total_memory - free_memory) / total_memory * 100, 1) if total_memory > 0 else None
+        ),
+        "uptime": row.get("uptime", "0"),
+        "version": row.get("version", "unknown"),
+        "board_name": row.get("board-name", "unknown"),
+        "architecture": row.get("architecture-name", "unknown")
+    }
+
+
+def parse_interface(row: Dict[str, str]) -> Dict[str, Any]:
+    """Map an /interface row to InterfaceStats fields"""
+    return {
+        "name": row.get("name", ""),
+        "rx_bytes": int(row.get("rx-byte", "0")),
+        "tx_bytes": int(row.get("tx-byte", "0")),
+        "rx_packets": int(row.get("rx-packet", "0")),
+        "tx_packets": int(row.get("tx-packet", "0")),
+        "status": row.get("running", "false") == "true" and "running" or "stopped"
+    }
+
+
+def parse_pppoe_session(row: Dict[str, str]) -> Dict[str, Any]:
+    """Map a /ppp/active row to PPPoEUser fields"""
+    return {
+        "name": row.get("name", ""),
+        "caller_id": row.get("caller-id", ""),
+        "address": row.get("address", ""),
+        "uptime": row.get("uptime", ""),
+        "bytes_in": int(row.get("bytes-in", "0")),
+        "bytes_out": int(row.get("bytes-out", "0")),
+        "service": row.get("service", "")
+    }
+
+
+def parse_traffic(row: Dict[str, str]) -> Dict[str, Any]:
+    """Map an /interface/monitor-traffic row to rate fields"""
+    return {
+        "name": row.get("name", ""),
+        "rx_bps": int(row.get("rx-bits-per-second", "0")),
+        "tx_bps": int(row.get("tx-bits-per-second", "0")),
+        "rx_pps": int(row.get("rx-packets-per-second", "0")),
+        "tx_pps": int(row.get("tx-packets-per-second", "0"))
+    }
+
+
+class MikroTikError(Exception):
+    """RouterOS connection or command failure"""
+
+
+class MikroTikTrap(MikroTikError):
+    """Command rejected by the router with !trap"""
+
+    def __init__(self, message: str, category: Optional[str] = None):
+        super().__init__(message)
+        self.category = category
+
+
+class SentenceDecoder:
+    """Incremental API reply decoder over a reusable receive buffer
+
+    Socket reads land directly in one ``bytearray``; complete sentences
+    are cut out of it in place and words are decoded straight from a
+    ``memoryview`` slice. Partial sentences stay buffered until the rest
+    arrives, and the buffer only grows for sentences larger than itself.
+    """
+
+    def __init__(self, size: int = 65536):
+        self._buffer = bytearray(size)
+        self._start = 0
+        self._end = 0
+
+    def fill(self, recv_into: Callable[[memoryview], int], min_free: int = 4096) -> int:
+        """Read from a socket-like ``recv_into`` into the buffer"""
+        self._reserve(min_free)
+        with memoryview(self._buffer) as view:
+            with view[self._end:] as free:
+                count = recv_into(free)
+        self._end += count
+        return count
+
+    def feed(self, data: bytes):
+        """Append already received bytes to the buffer"""
+        self._reserve(len(data))
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def _reserve(self, size: int):
+        """Make room for at least ``size`` more bytes"""
+        if self._start == self._end:
+            self._start = self._end = 0
+        if len(self._buffer) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if self._start:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start, self._end = 0, pending
+        if len(self._buffer) - pending < size:
+            self._buffer.extend(bytes(max(size, len(self._buffer))))
+
+    def next_sentence(self) -> Optional[List[str]]:
+        """Pop the next complete sentence, or None if more data is needed"""
+        buffer = self._buffer
+        end = self._end
+        pos = self._start
+        words = []
+        with memoryview(buffer) as view:
+            while pos < end:
+                first = buffer[pos]
+                if first < 0x80:
+                    length = first
+                    pos += 1
+                elif first < 0xC0:
+                    if pos + 2 > end:
+                        return None
+                    length = ((first & 0x3F) << 8) | buffer[pos + 1]
+                    pos += 2
+                elif first < 0xE0:
+                    if pos + 3 > end:
+                        return None
+                    length = ((first & 0x1F) << 16) | (buffer[pos + 1] << 8) | buffer[pos + 2]
+                    pos += 3
+                elif first < 0xF0:
+                    if pos + 4 > end:
+                        return None
+                    length = (((first & 0x0F) << 24) | (buffer[pos + 1] << 16)
+                              | (buffer[pos + 2] << 8) | buffer[pos + 3])
+                    pos += 4
+                else:
+                    if pos + 5 > end:
+                        return None
+                    length = ((buffer[pos + 1] << 24) | (buffer[pos + 2] << 16)
+                              | (buffer[pos + 3] << 8) | buffer[pos + 4])
+                    pos += 5
+
+                if length == 0:
+                    self._start = pos
+                    return words
+                if pos + length > end:
+                    return None
+                words.append(str(view[pos:pos + length], 'utf-8', 'replace'))
+                pos += length
+        return None
+
+    def sentences(self) -> Iterator[List[str]]:
+        """Yield every complete sentence currently buffered"""
+        while True:
+            sentence = self.next_sentence()
+            if sentence is None:
+                return
+            yield sentence
+
+
+def reply_attributes(sentence: List[str]) -> Dict[str, str]:
+    """Collect the =key=value words of a reply sentence"""
+    attributes = {}
+    for word in sentence[1:]:
+        if word.startswith("="):
+            key, _, value = word[1:].partition("=")
+            attributes[key] = value
+    return attributes
+
 
 class MikroTikAPI:
     """MikroTik RouterOS API client"""
@@ -12,6 +248,7 @@ class MikroTikAPI:
         self.timeout = timeout
         self.socket = None
         self.current_tag = 0
+        self._decoder = SentenceDecoder()
         
     def connect(self, username: str, password: str) -> bool:
         """Connect to MikroTik device"""
@@ -19,6 +256,7 @@ class MikroTikAPI:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(self.timeout)
             self.socket.connect((self.host, self.port))
+            self._decoder = SentenceDecoder()
             
             # Login process
             login_result = self._login(username, password)
@@ -41,7 +279,7 @@ class MikroTikAPI:
         """Perform login authentication"""
         try:
             # Get challenge
-            self.socket.send(self._encode_sentence(["/login"]))
+            self.socket.sendall(self._encode_sentence(["/login"]))
             response = self._read_sentence()
             
             if len(response) < 2 or response[0] != "!done":
@@ -62,7 +300,7 @@ class MikroTikAPI:
             md5.update(password.encode('utf-8'))
             md5.update(challenge)
             
-            self.socket.send(self._encode_sentence([
+            self.socket.sendall(self._encode_sentence([
                 "/login",
                 f"=name={username}",
                 f"=response=00{md5.hexdigest()}"
@@ -75,143 +313,72 @@ class MikroTikAPI:
             print(f"Login error: {e}")
             return False
     
+    def command(self, words: List[str]) -> List[Dict[str, str]]:
+        """Run a command and return its !re rows"""
+        return list(self.iter_command(words))
+    
+    def iter_command(self, words: List[str]) -> Iterator[Dict[str, str]]:
+        """Run a command and yield each !re row as it is decoded"""
+        self.socket.sendall(self._encode_sentence(words))
+        trap = None
+        while True:
+            sentence = self._read_sentence()
+            reply = sentence[0] if sentence else ""
+            if reply == "!re":
+                yield reply_attributes(sentence)
+            elif reply == "!trap":
+                attributes = reply_attributes(sentence)
+                trap = MikroTikTrap(attributes.get("message", "command failed"), attributes.get("category"))
+            elif reply == "!done":
+                break
+            elif reply == "!fatal":
+                raise MikroTikError(f"Fatal error from {self.host}: {' '.join(sentence[1:])}")
+        if trap:
+            raise trap
+    
+    def query(self, path: str, where: Optional[Dict[str, str]] = None,
+              proplist: Optional[List[str]] = None,
+              query: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """Print rows matching a router-side query"""
+        return self.command(build_query(path, where, proplist, query))
+    
     def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics"""
         try:
-            self.socket.send(self._encode_sentence(["/system/resource/print"]))
-            response = self._read_sentence()
-            
-            stats = {}
-            for item in response:
-                if item.startswith("="):
-                    key, value = item[1:].split("=", 1)
-                    stats[key] = value
-            
-            return {
-                "cpu_load": float(stats.get("cpu-load", "0")),
-                "memory_usage": float(stats.get("free-memory", "0")),
-                "uptime": stats.get("uptime", "0"),
-                "version": stats.get("version", "unknown"),
-                "board_name": stats.get("board-name", "unknown"),
-                "architecture": stats.get("architecture-name", "unknown")
-            }
-        except:
+            rows = self.command(["/system/resource/print"])
+            return parse_system_stats(rows[0] if rows else {})
+        except (OSError, MikroTikError, ValueError):
             return {}
     
     def get_interfaces(self) -> List[Dict[str, Any]]:
         """Get interface statistics"""
         try:
-            self.socket.send(self._encode_sentence(["/interface/print", "=stats"]))
-            response = self._read_sentence()
-            
-            interfaces = []
-            current_interface = {}
-            
-            for item in response:
-                if item.startswith("="):
-                    key, value = item[1:].split("=", 1)
-                    current_interface[key] = value
-                elif item == "!re":
-                    if current_interface:
-                        interfaces.append({
-                            "name": current_interface.get("name", ""),
-                            "rx_bytes": int(current_interface.get("rx-byte", "0")),
-                            "tx_bytes": int(current_interface.get("tx-byte", "0")),
-                            "rx_packets": int(current_interface.get("rx-packet", "0")),
-                            "tx_packets": int(current_interface.get("tx-packet", "0")),
-                            "status": current_interface.get("running", "false") == "true" and "running" or "stopped"
-                        })
-                    current_interface = {}
-            
-            return interfaces
-        except:
+            words = build_query("/interface", proplist=INTERFACE_PROPLIST, args=["=stats="])
+            return [parse_interface(row) for row in self.iter_command(words)]
+        except (OSError, MikroTikError, ValueError):
             return []
     
-    def get_pppoe_sessions(self) -> List[Dict[str, Any]]:
-        """Get active PPPoE sessions"""
+    def get_pppoe_sessions(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get active PPPoE sessions, optionally only the one for ``name``"""
         try:
-            self.socket.send(self._encode_sentence(["/ppp/active/print"]))
-            response = self._read_sentence()
-            
-            sessions = []
-            current_session = {}
-            
-            for item in response:
-                if item.startswith("="):
-                    key, value = item[1:].split("=", 1)
-                    current_session[key] = value
-                elif item == "!re":
-                    if current_session:
-                        sessions.append({
-                            "name": current_session.get("name", ""),
-                            "caller_id": current_session.get("caller-id", ""),
-                            "address": current_session.get("address", ""),
-                            "uptime": current_session.get("uptime", ""),
-                            "bytes_in": int(current_session.get("bytes-in", "0")),
-                            "bytes_out": int(current_session.get("bytes-out", "0")),
-                            "service": current_session.get("service", "")
-                        })
-                    current_session = {}
-            
-            return sessions
-        except:
+            words = build_query("/ppp/active", {"name": name} if name else None, PPPOE_PROPLIST)
+            return [parse_pppoe_session(row) for row in self.iter_command(words)]
+        except (OSError, MikroTikError, ValueError):
             return []
     
     def _encode_sentence(self, words: List[str]) -> bytes:
         """Encode API sentence"""
-        sentence = b""
-        for word in words:
-            sentence += self._encode_word(word.encode('utf-8'))
-        sentence += b"\x00"
-        return sentence
+        return encode_sentence(words)
     
     def _encode_word(self, word: bytes) -> bytes:
         """Encode API word"""
-        length = len(word)
-        if length < 0x80:
-            return bytes([length]) + word
-        elif length < 0x4000:
-            return bytes([0x80 | (length >> 8), length & 0xFF]) + word
-        elif length < 0x200000:
-            return bytes([0xC0 | (length >> 16), (length >> 8) & 0xFF, length & 0xFF]) + word
-        elif length < 0x10000000:
-            return bytes([0xE0 | (length >> 24), (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF]) + word
-        else:
-            return bytes([0xF0, (length >> 24) & 0xFF, (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF]) + word
+        return encode_word(word)
     
     def _read_sentence(self) -> List[str]:
         """Read API sentence"""
-        sentence = []
         while True:
-            word = self._read_word()
-            if not word:
-                break
-            sentence.append(word.decode('utf-8'))
-        return sentence
-    
-    def _read_word(self) -> bytes:
-        """Read API word"""
-        length_bytes = self.socket.recv(1)
-        if not length_bytes:
-            return b""
-        
-        length = length_bytes[0]
-        if length == 0:
-            return b""
-        
-        if length < 0x80:
-            word_length = length
-        elif length < 0xC0:
-            length_bytes += self.socket.recv(1)
-            word_length = ((length & 0x7F) << 8) + length_bytes[1]
-        elif length < 0xE0:
-            length_bytes += self.socket.recv(2)
-            word_length = ((length & 0x1F) << 16) + (length_bytes[1] << 8) + length_bytes[2]
-        elif length < 0xF0:
-            length_bytes += self.socket.recv(3)
-            word_length = ((length & 0x0F) << 24) + (length_bytes[1] << 16) + (length_bytes[2] << 8) + length_bytes[3]
-        else:
-            length_bytes += self.socket.recv(4)
-            word_length = (length_bytes[1] << 24) + (length_bytes[2] << 16) + (length_bytes[3] << 8) + length_bytes[4]
-        
-        return self.socket.recv(word_length)
\ No newline at end of file
+            sentence = self._decoder.next_sentence()
+            if sentence is not None:
+                return sentence
+            if not self._decoder.fill(self.socket.recv_into):
+                raise MikroTikError(f"Connection closed by {self.host}")
\ No newline at end of file
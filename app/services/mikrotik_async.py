@@ -0,0 +1,383 @@
+import asyncio
+import binascii
+import hashlib
+import ssl
+from typing import AsyncIterator, Dict, List, Optional, Any
+
+from app.services.mikrotik_api import (
+    MikroTikError, MikroTikTrap, SentenceDecoder, INTERFACE_PROPLIST, PPPOE_PROPLIST,
+    build_query, encode_sentence, parse_system_stats, parse_interface, parse_pppoe_session, parse_traffic
+)
+
+# !trap category RouterOS sends when a command is stopped with /cancel
+TRAP_INTERRUPTED = "2"
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client SSLContext that resumes the last TLS session per router
+
+    asyncio has no way to pass ``session=`` when it wraps a connection,
+    so the context injects the stored session itself in ``wrap_bio``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.sessions: Dict[str, ssl.SSLSession] = {}
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+
+def create_ssl_context(verify: bool = False, ca_file: Optional[str] = None) -> ResumingSSLContext:
+    """TLS context for RouterOS API-SSL connections"""
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if verify and ca_file:
+        context.load_verify_locations(cafile=ca_file)
+    elif verify:
+        context.load_default_certs()
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class _PendingCommand:
+    """Reply state for one tagged command"""
+
+    __slots__ = ("future", "rows", "done", "trap", "queue")
+
+    def __init__(self, future: asyncio.Future, queue: Optional[asyncio.Queue] = None):
+        self.future = future
+        # Follow-mode commands stream rows through the queue instead
+        self.queue = queue
+        self.rows: List[Dict[str, str]] = []
+        self.done: Dict[str, str] = {}
+        self.trap: Optional[MikroTikTrap] = None
+
+
+class AsyncMikroTikAPI:
+    """Asyncio MikroTik RouterOS API client with tagged command multiplexing
+
+    Every command is sent with a unique ``.tag`` word so any number of
+    commands can be in flight on one connection; a single reader task
+    routes each reply sentence back to the coroutine awaiting that tag.
+    """
+
+    read_size = 65536
+
+    def __init__(self, host: str, port: int = 8728, timeout: int = 10,
+                 ssl_context: Optional[ResumingSSLContext] = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.tls_resumed = False
+        self.current_tag = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._decoder: Optional[SentenceDecoder] = None
+        self._pending: Dict[str, _PendingCommand] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def connect(self, username: str, password: str) -> bool:
+        """Connect to MikroTik device"""
+        try:
+            if self.ssl_context:
+                connection = asyncio.open_connection(
+                    self.host, self.port, ssl=self.ssl_context, server_hostname=self.host
+                )
+            else:
+                connection = asyncio.open_connection(self.host, self.port)
+            self._reader, self._writer = await asyncio.wait_for(connection, self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"Connection error: {e}")
+            return False
+
+        self._write_lock = asyncio.Lock()
+        self._decoder = SentenceDecoder(self.read_size)
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+        try:
+            if await self._login(username, password):
+                self._store_tls_session()
+                return True
+        except MikroTikError as e:
+            print(f"Login error: {e}")
+        await self.disconnect()
+        return False
+
+    async def disconnect(self):
+        """Disconnect from MikroTik device"""
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        if self._writer:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        self._fail_pending(MikroTikError(f"Connection to {self.host} closed"))
+
+    def _store_tls_session(self):
+        """Keep the TLS session so the next connection can resume it"""
+        ssl_object = self._writer.get_extra_info("ssl_object") if self._writer else None
+        if ssl_object is None:
+            return
+        self.tls_resumed = ssl_object.session_reused
+        # TLS 1.3 tickets arrive after the handshake; by the end of login they are in
+        if ssl_object.session is not None:
+            self.ssl_context.sessions[self.host] = ssl_object.session
+
+    async def _login(self, username: str, password: str) -> bool:
+        """Perform login authentication"""
+        # RouterOS 6.43+ accepts the password directly; older releases
+        # answer with a challenge that needs the MD5 response
+        pending = await self._execute([
+            "/login", f"=name={username}", f"=password={password}"
+        ])
+        challenge = pending.done.get("ret")
+        if not challenge:
+            return True
+
+        md5 = hashlib.md5()
+        md5.update(b"\x00")
+        md5.update(password.encode('utf-8'))
+        md5.update(binascii.unhexlify(challenge))
+        await self._execute([
+            "/login",
+            f"=name={username}",
+            f"=response=00{md5.hexdigest()}"
+        ])
+        return True
+
+    async def command(self, words: List[str]) -> List[Dict[str, str]]:
+        """Run a command and return its !re rows"""
+        pending = await self._execute(words)
+        return pending.rows
+
+    async def _execute(self, words: List[str]) -> _PendingCommand:
+        """Send a tagged command and wait for its !done"""
+        if not self.connected:
+            raise MikroTikError(f"Not connected to {self.host}")
+
+        tag = self._next_tag()
+        pending = _PendingCommand(asyncio.get_event_loop().create_future())
+        self._pending[tag] = pending
+
+        try:
+            await self._send(words + [f".tag={tag}"])
+            await asyncio.wait_for(asyncio.shield(pending.future), self.timeout)
+        except asyncio.TimeoutError:
+            await self._cancel(tag)
+            raise MikroTikError(f"Command {words[0]} timed out on {self.host}")
+        finally:
+            self._pending.pop(tag, None)
+
+        if pending.trap:
+            raise pending.trap
+        return pending
+
+    async def listen(self, words: List[str]) -> AsyncIterator[Dict[str, str]]:
+        """Run a follow-mode command and yield each !re row as it arrives
+
+        The command keeps running until the iterator is closed, which
+        sends ``/cancel`` for its tag; other commands can share the
+        connection meanwhile.
+        """
+        if not self.connected:
+            raise MikroTikError(f"Not connected to {self.host}")
+
+        tag = self._next_tag()
+        pending = _PendingCommand(asyncio.get_event_loop().create_future(), asyncio.Queue())
+        self._pending[tag] = pending
+        try:
+            await self._send(words + [f".tag={tag}"])
+            while True:
+                row = await pending.queue.get()
+                if row is None:
+                    break
+                yield row
+            if pending.future.exception():
+                raise pending.future.exception()
+            if pending.trap and pending.trap.category != TRAP_INTERRUPTED:
+                raise pending.trap
+        finally:
+            self._pending.pop(tag, None)
+            if not pending.future.done():
+                await self._cancel(tag)
+
+    async def monitor_traffic(self, interface: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream per-second traffic rates for an interface"""
+        async for row in self.listen(["/interface/monitor-traffic", f"=interface={interface}"]):
+            yield parse_traffic(row)
+
+    async def listen_pppoe(self) -> AsyncIterator[Dict[str, str]]:
+        """Stream PPPoE session changes; removed sessions carry ``.dead=yes``"""
+        async for row in self.listen(["/ppp/active/listen"]):
+            yield row
+
+    async def listen_log(self) -> AsyncIterator[Dict[str, str]]:
+        """Stream new log entries"""
+        async for row in self.listen(["/log/listen"]):
+            yield row
+
+    def _next_tag(self) -> str:
+        self.current_tag += 1
+        return str(self.current_tag)
+
+    async def pipeline(self, commands: List[List[str]], window: int = 256) -> List[Any]:
+        """Send many commands back to back without waiting for each reply
+
+        Up to ``window`` tagged commands are written in one go and then
+        awaited together. Returns, in order, each command's rows or the
+        MikroTikError it failed with.
+        """
+        if not self.connected:
+            raise MikroTikError(f"Not connected to {self.host}")
+
+        results: List[Any] = []
+        loop = asyncio.get_event_loop()
+        for start in range(0, len(commands), window):
+            batch = []
+            payload = bytearray()
+            for words in commands[start:start + window]:
+                tag = self._next_tag()
+                pending = _PendingCommand(loop.create_future())
+                self._pending[tag] = pending
+                batch.append((tag, pending))
+                payload += encode_sentence(words + [f".tag={tag}"])
+
+            try:
+                await self._write(bytes(payload))
+                await asyncio.wait([pending.future for _, pending in batch], timeout=self.timeout)
+            finally:
+                for tag, _ in batch:
+                    self._pending.pop(tag, None)
+
+            for (tag, pending), words in zip(batch, commands[start:start + window]):
+                if not pending.future.done():
+                    pending.future.cancel()
+                    results.append(MikroTikError(f"Command {words[0]} timed out on {self.host}"))
+                elif pending.future.exception():
+                    results.append(pending.future.exception())
+                elif pending.trap:
+                    results.append(pending.trap)
+                else:
+                    results.append(pending.rows)
+        return results
+
+    async def _send(self, words: List[str]):
+        """Write one sentence to the connection"""
+        await self._write(encode_sentence(words))
+
+    async def _write(self, data: bytes):
+        try:
+            async with self._write_lock:
+                self._writer.write(data)
+                await self._writer.drain()
+        except (OSError, AttributeError) as e:
+            raise MikroTikError(f"Write to {self.host} failed: {e}")
+
+    async def _cancel(self, tag: str):
+        """Ask the router to stop a running command"""
+        try:
+            await self._send(["/cancel", f"=tag={tag}"])
+        except MikroTikError:
+            pass
+
+    async def _read_loop(self):
+        """Route reply sentences to the commands waiting on their tag"""
+        error = MikroTikError(f"Connection to {self.host} lost")
+        try:
+            while True:
+                data = await self._reader.read(self.read_size)
+                if not data:
+                    raise ConnectionError("closed by peer")
+                self._decoder.feed(data)
+                for sentence in self._decoder.sentences():
+                    self._dispatch(sentence)
+        except (ConnectionError, OSError) as e:
+            error = MikroTikError(f"Connection to {self.host} lost: {e}")
+        except MikroTikError as e:
+            error = e
+        finally:
+            self._fail_pending(error)
+
+    def _dispatch(self, sentence: List[str]):
+        """Apply one reply sentence to its pending command"""
+        if not sentence:
+            return
+
+        reply = sentence[0]
+        tag = None
+        attributes = {}
+        for word in sentence[1:]:
+            if word.startswith(".tag="):
+                tag = word[5:]
+            elif word.startswith("="):
+                key, _, value = word[1:].partition("=")
+                attributes[key] = value
+
+        if reply == "!fatal":
+            raise MikroTikError(f"Fatal error from {self.host}: {' '.join(sentence[1:])}")
+
+        pending = self._pending.get(tag)
+        if pending is None or pending.future.done():
+            return
+
+        if reply == "!re":
+            if pending.queue is not None:
+                pending.queue.put_nowait(attributes)
+            else:
+                pending.rows.append(attributes)
+        elif reply == "!trap":
+            pending.trap = MikroTikTrap(
+                attributes.get("message", "command failed"), attributes.get("category")
+            )
+        elif reply == "!done":
+            pending.done = attributes
+            pending.future.set_result(None)
+            if pending.queue is not None:
+                pending.queue.put_nowait(None)
+
+    def _fail_pending(self, error: Exception):
+        """Fail every command still waiting for a reply"""
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.set_exception(error)
+                if pending.queue is not None:
+                    pending.queue.put_nowait(None)
+        self._pending.clear()
+
+    async def get_system_stats(self) -> Dict[str, Any]:
+        """Get system statistics"""
+        rows = await self.command(["/system/resource/print"])
+        return parse_system_stats(rows[0] if rows else {})
+
+    async def query(self, path: str, where: Optional[Dict[str, str]] = None,
+                    proplist: Optional[List[str]] = None,
+                    query: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """Print rows matching a router-side query"""
+        return await self.command(build_query(path, where, proplist, query))
+
+    async def get_interfaces(self) -> List[Dict[str, Any]]:
+        """Get interface statistics"""
+        rows = await self.command(build_query("/interface", proplist=INTERFACE_PROPLIST, args=["=stats="]))
+        return [parse_interface(row) for row in rows]
+
+    async def get_pppoe_sessions(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get active PPPoE sessions, optionally only the one for ``name``"""
+        rows = await self.query("/ppp/active", {"name": name} if name else None, PPPOE_PROPLIST)
+        return [parse_pppoe_session(row) for row in rows]
@@ -0,0 +1,183 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.mikrotik_api import MikroTikError
+from app.services.mikrotik_pool import MikroTikPool, device_field, mikrotik_pool
+from app.services.mikrotik_poller import FleetPoller, fleet_poller
+from app.services.response_cache import device_cache
+
+
+def locate_subscribers(usernames: Iterable[str], poller: FleetPoller = fleet_poller) -> Dict[str, Tuple[int, str]]:
+    """Find the device and address of each online subscriber from poll snapshots"""
+    wanted = set(usernames)
+    located = {}
+    for snapshot in poller.snapshots():
+        for session in snapshot.pppoe_sessions:
+            if session["name"] in wanted:
+                located[session["name"]] = (snapshot.device_id, session["address"])
+    return located
+
+
+def isolation_commands(username: str, address: Optional[str], secret: bool = True,
+                       online: bool = True) -> List[List[str]]:
+    """RouterOS commands that move a subscriber into isolation
+
+    ``secret``: the router holds the subscriber's /ppp/secret. ``online``:
+    the subscriber's session is up on it, so the address list and queue
+    apply there too.
+    """
+    commands = []
+    if secret:
+        commands.append(
+            ["/ppp/secret/set", f"=numbers={username}", f"=profile={settings.MIKROTIK_ISOLATION_PROFILE}"]
+        )
+    if online and address:
+        commands.append([
+            "/ip/firewall/address-list/add",
+            f"=list={settings.MIKROTIK_ISOLATION_ADDRESS_LIST}",
+            f"=address={address}",
+            f"=comment={username}"
+        ])
+    if online and settings.MIKROTIK_ISOLATION_RATE_LIMIT:
+        commands.append([
+            "/queue/simple/set", f"=numbers={username}", f"=max-limit={settings.MIKROTIK_ISOLATION_RATE_LIMIT}"
+        ])
+    return commands
+
+
+def reactivation_commands(username: str, profile: Optional[str], max_limit: Optional[str],
+                          address_list_ids: List[str], online: bool = True) -> List[List[str]]:
+    """RouterOS commands that restore an isolated subscriber
+
+    Without ``profile`` (the one the secret had before isolation) the
+    secret is left alone rather than guessed at.
+    """
+    commands = []
+    if profile:
+        commands.append(["/ppp/secret/set", f"=numbers={username}", f"=profile={profile}"])
+    for entry_id in address_list_ids:
+        commands.append(["/ip/firewall/address-list/remove", f"=.id={entry_id}"])
+    if online and settings.MIKROTIK_ISOLATION_RATE_LIMIT and max_limit:
+        commands.append(["/queue/simple/set", f"=numbers={username}", f"=max-limit={max_limit}"])
+    return commands
+
+
+async def push_account_changes(changes: List[Dict[str, Any]], devices: Iterable[Any],
+                               pool: MikroTikPool = mikrotik_pool,
+                               poller: FleetPoller = fleet_poller) -> List[Dict[str, Any]]:
+    """Apply isolate/reactivate changes, pipelined over one session per router
+
+    Each change is ``{"username", "action": "isolate" | "reactivate"}``;
+    reactivation also takes ``profile`` (the PPP profile to restore) and
+    ``max_limit`` (e.g. the account's bandwidth_profile). Every router is
+    asked for its PPP secrets once, so secrets of offline subscribers are
+    changed wherever they live. Isolation address-list entries are added
+    and the queue set only where the subscriber is online, but reactivation
+    removes the subscriber's entries (by comment) from every router, as an
+    entry outlives the session it was added for. All commands for a router are
+    sent back to back. Returns one outcome per change with status ``ok``,
+    ``failed`` or ``unlocated`` (no secret and no session anywhere);
+    isolations also report the ``previous_profile`` found on the secret.
+    """
+    device_by_id = {device_field(device, "id"): device for device in devices}
+    located = locate_subscribers((change["username"] for change in changes), poller)
+
+    report = []
+    by_device: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for change in changes:
+        online_device, address = located.get(change["username"], (None, None))
+        outcome = {
+            "username": change["username"],
+            "action": change["action"],
+            "device_id": online_device if online_device in device_by_id else None,
+            "status": "unlocated",
+            "errors": []
+        }
+        if change["action"] == "isolate":
+            outcome["previous_profile"] = None
+        report.append(outcome)
+        for device_id in device_by_id:
+            online = device_id == online_device
+            by_device[device_id].append(
+                {**change, "address": address if online else None, "online": online, "outcome": outcome}
+            )
+
+    await asyncio.gather(*[
+        _push_device(pool, device_by_id[device_id], items) for device_id, items in by_device.items()
+    ])
+    for outcome in report:
+        if outcome["status"] == "unlocated" and outcome["errors"]:
+            # A router that could hold the secret was unreachable
+            outcome["status"] = "failed"
+    return report
+
+
+async def _push_device(pool: MikroTikPool, device: Any, items: List[Dict[str, Any]]):
+    device_id = device_field(device, "id")
+    try:
+        async with pool.session(device) as api:
+            # One print of the secrets and of the isolation list instead of a lookup per subscriber
+            secrets = {
+                row.get("name"): row.get("profile", "")
+                for row in await api.query("/ppp/secret", proplist=["name", "profile"])
+            }
+            address_list_ids: Dict[str, List[str]] = defaultdict(list)
+            if any(item["action"] == "reactivate" for item in items):
+                # Offline subscribers too: their entry still blocks whoever gets the address next
+                entries = await api.query(
+                    "/ip/firewall/address-list",
+                    where={"list": settings.MIKROTIK_ISOLATION_ADDRESS_LIST},
+                    proplist=[".id", "comment"]
+                )
+                for entry in entries:
+                    address_list_ids[entry.get("comment", "")].append(entry[".id"])
+            items = [
+                item for item in items
+                if item["online"] or item["username"] in secrets
+                or (item["action"] == "reactivate" and item["username"] in address_list_ids)
+            ]
+
+            commands = []
+            owners = []
+            for item in items:
+                outcome = item["outcome"]
+                held = item["username"] in secrets
+                if held and outcome["device_id"] is None:
+                    outcome["device_id"] = device_id
+                if item["action"] == "isolate":
+                    previous = secrets.get(item["username"])
+                    if previous and previous != settings.MIKROTIK_ISOLATION_PROFILE:
+                        outcome["previous_profile"] = previous
+                    item_commands = isolation_commands(item["username"], item["address"], held, item["online"])
+                else:
+                    if held and not item.get("profile"):
+                        outcome["status"] = "failed"
+                        outcome["errors"].append("No PPP profile recorded to restore; secret left isolated")
+                    item_commands = reactivation_commands(
+                        item["username"], item.get("profile") if held else None, item.get("max_limit"),
+                        address_list_ids.get(item["username"], []), item["online"]
+                    )
+                commands.extend(item_commands)
+                owners.extend([outcome] * len(item_commands))
+
+            results = await api.pipeline(commands, settings.MIKROTIK_PIPELINE_WINDOW) if commands else []
+    except MikroTikError as e:
+        device_cache.invalidate(device_id, "pppoe")
+        for item in items:
+            if item["online"]:
+                item["outcome"]["status"] = "failed"
+            item["outcome"]["errors"].append(str(e))
+        return
+
+    # Cached session lists no longer reflect the subscribers' profiles
+    device_cache.invalidate(device_id, "pppoe")
+    for item in items:
+        outcome = item["outcome"]
+        if outcome["status"] != "failed":
+            outcome["status"] = "ok"
+    for outcome, result in zip(owners, results):
+        if isinstance(result, MikroTikError):
+            outcome["status"] = "failed"
+            outcome["errors"].append(str(result))
\ No newline at end of file
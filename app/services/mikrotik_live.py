@@ -0,0 +1,99 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from app.services.mikrotik_api import MikroTikError
+from app.services.mikrotik_pool import MikroTikPool, device_field, mikrotik_pool
+
+LIVE_TOPICS = ("traffic", "pppoe", "log")
+
+StreamKey = Tuple[int, str, str]
+
+
+class _LiveStream:
+    """One router follow-mode stream shared by many subscribers"""
+
+    def __init__(self, key: StreamKey, device: Any):
+        self.key = key
+        self.device = device
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self, event: Dict[str, Any]):
+        for queue in self.subscribers:
+            if queue.full():
+                # Slow browser: drop its oldest event rather than stall the router stream
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+class LiveStreamHub:
+    """Fan one RouterOS follow-mode stream per device out to any number of subscribers
+
+    The router stream is opened on the first subscription and closed when
+    the last subscriber leaves. It holds one pooled session while open and
+    reconnects with ``retry_delay`` if the router drops it.
+    """
+
+    def __init__(self, pool: MikroTikPool, queue_size: int = 100, retry_delay: float = 5):
+        self.pool = pool
+        self.queue_size = queue_size
+        self.retry_delay = retry_delay
+        self._streams: Dict[StreamKey, _LiveStream] = {}
+
+    @asynccontextmanager
+    async def subscribe(self, device: Any, topic: str, interface: str = "") -> AsyncIterator[asyncio.Queue]:
+        """Subscribe to a device topic; yields a queue of events"""
+        if topic not in LIVE_TOPICS:
+            raise ValueError(f"Unknown live topic: {topic}")
+
+        key = (device_field(device, "id"), topic, interface)
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = _LiveStream(key, device)
+            self._streams[key] = stream
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        stream.subscribers.add(queue)
+        if stream.task is None:
+            stream.task = asyncio.ensure_future(self._run(stream))
+
+        try:
+            yield queue
+        finally:
+            stream.subscribers.discard(queue)
+            if not stream.subscribers:
+                self._streams.pop(key, None)
+                stream.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Subscriber count per open router stream"""
+        return {f"{device_id}/{topic}/{interface}": len(stream.subscribers)
+                for (device_id, topic, interface), stream in self._streams.items()}
+
+    async def _run(self, stream: _LiveStream):
+        _, topic, interface = stream.key
+        while stream.subscribers:
+            try:
+                async with self.pool.session(stream.device) as api:
+                    if topic == "traffic":
+                        rows = api.monitor_traffic(interface)
+                    elif topic == "pppoe":
+                        rows = api.listen_pppoe()
+                    else:
+                        rows = api.listen_log()
+                    try:
+                        async for row in rows:
+                            stream.publish({"topic": topic, "time": datetime.utcnow().isoformat(), "data": row})
+                    finally:
+                        await rows.aclose()
+            except Exception as e:
+                # Whatever broke the stream (a dropped router, an unparsable row),
+                # subscribers are told and the stream is reopened
+                if not isinstance(e, MikroTikError):
+                    print(f"Live stream {stream.key} failed: {e!r}")
+                stream.publish({"topic": topic, "time": datetime.utcnow().isoformat(), "error": str(e)})
+            await asyncio.sleep(self.retry_delay)
+
+
+live_hub = LiveStreamHub(mikrotik_pool)
@@ -0,0 +1,242 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.services.accounting_spool import AccountingSpool, accounting_spool
+from app.services.mikrotik_api import MikroTikError, parse_uptime
+from app.services.mikrotik_pool import MikroTikPool, device_field, mikrotik_pool
+from app.services.quota_engine import QuotaEngine, quota_engine
+from app.services.session_table import ActiveSessionTable, session_table
+from app.services.traffic_rates import CounterDeltaEngine, store_traffic_records, traffic_records
+
+
+class DeviceSnapshot:
+    """Last polled state of one router"""
+
+    __slots__ = ("device_id", "stats", "interfaces", "pppoe_sessions",
+                 "polled_at", "updated", "duration", "error")
+
+    def __init__(self, device_id: int):
+        self.device_id = device_id
+        self.stats: Dict[str, Any] = {}
+        self.interfaces: List[Dict[str, Any]] = []
+        self.pppoe_sessions: List[Dict[str, Any]] = []
+        self.polled_at: Optional[datetime] = None
+        self.updated = 0.0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def age(self) -> float:
+        """Seconds since the last successful poll"""
+        return time.monotonic() - self.updated if self.updated else float("inf")
+
+
+class FleetPoller:
+    """Background poller for every active MikroTik device
+
+    Each cycle polls all devices concurrently, bounded by ``concurrency``.
+    A device gets ``device_timeout`` seconds and the whole cycle
+    ``cycle_timeout`` seconds; a router that misses its deadline keeps its
+    previous snapshot with ``error`` set, so one slow device never holds
+    up the rest. Snapshots are published as each device finishes.
+    """
+
+    def __init__(self, pool: MikroTikPool, interval: float = 60, concurrency: int = 50,
+                 device_timeout: float = 15, cycle_timeout: float = 50,
+                 record_traffic: bool = False,
+                 sessions: Optional[ActiveSessionTable] = session_table,
+                 spool: Optional[AccountingSpool] = None,
+                 quota: Optional[QuotaEngine] = None):
+        self.pool = pool
+        self.sessions = sessions
+        self.spool = spool
+        self.quota = quota
+        self.record_traffic = record_traffic
+        self.interval = interval
+        self.concurrency = concurrency
+        self.device_timeout = device_timeout
+        self.cycle_timeout = cycle_timeout
+        self.last_cycle: Dict[str, Any] = {}
+        self._snapshots: Dict[int, DeviceSnapshot] = {}
+        self._interface_counters: Dict[int, CounterDeltaEngine] = {}
+        self._session_counters: Dict[int, CounterDeltaEngine] = {}
+        self._device_source: Callable[[], Iterable[Any]] = list
+        self._task: Optional[asyncio.Task] = None
+
+    def snapshot(self, device_id: int) -> Optional[DeviceSnapshot]:
+        """Latest snapshot for a device"""
+        return self._snapshots.get(device_id)
+
+    def snapshots(self) -> List[DeviceSnapshot]:
+        """Latest snapshot for every polled device"""
+        return list(self._snapshots.values())
+
+    async def start(self, device_source: Callable[[], Iterable[Any]]):
+        """Start polling the devices returned by ``device_source``"""
+        self._device_source = device_source
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop the polling loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Device poll cycle error: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def poll_once(self) -> Dict[str, Any]:
+        """Run one poll cycle over all active devices"""
+        devices = list(self._device_source())
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started_at = datetime.utcnow()
+        started = time.monotonic()
+
+        async def poll(device):
+            async with semaphore:
+                return await self._poll_device(device)
+
+        tasks = [asyncio.ensure_future(poll(device)) for device in devices]
+        done, pending = set(), set()
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.cycle_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+            for device, task in zip(devices, tasks):
+                if task in pending:
+                    self._record_failure(device_field(device, "id"), "poll cycle deadline exceeded")
+
+        succeeded = sum(
+            1 for task in done
+            if not task.cancelled() and task.exception() is None and task.result()
+        )
+        self.last_cycle = {
+            "started_at": started_at.isoformat(),
+            "devices": len(devices),
+            "succeeded": succeeded,
+            "failed": len(devices) - succeeded,
+            "duration": round(time.monotonic() - started, 3)
+        }
+        return self.last_cycle
+
+    async def _poll_device(self, device: Any) -> bool:
+        """Collect resources, interfaces and PPPoE sessions from one device"""
+        device_id = device_field(device, "id")
+        started = time.monotonic()
+        try:
+            stats, interfaces, sessions = await asyncio.wait_for(
+                self._collect(device), self.device_timeout
+            )
+        except asyncio.TimeoutError:
+            self._record_failure(device_id, "device deadline exceeded")
+            return False
+        except (MikroTikError, OSError, ValueError) as e:
+            self._record_failure(device_id, str(e))
+            return False
+
+        snapshot = DeviceSnapshot(device_id)
+        snapshot.stats = stats
+        snapshot.interfaces = interfaces
+        snapshot.pppoe_sessions = sessions
+        snapshot.polled_at = datetime.utcnow()
+        snapshot.updated = time.monotonic()
+        snapshot.duration = snapshot.updated - started
+        records = self._apply_rates(device_id, snapshot)
+        self._snapshots[device_id] = snapshot
+        if self.sessions is not None:
+            self.sessions.update_from_poll(device_field(device, "ip_address"), device_id, sessions, started)
+
+        if records and self.quota is not None:
+            self.quota.add_rows(records)
+        if records and self.spool is not None:
+            if self.spool.append_many(records) < len(records):
+                print(f"Traffic record error: accounting spool full, dropped records of device {device_id}")
+        elif records:
+            loop = asyncio.get_event_loop()
+            try:
+                await loop.run_in_executor(None, store_traffic_records, records)
+            except Exception as e:
+                print(f"Traffic record error: {e}")
+        return True
+
+    def _apply_rates(self, device_id: int, snapshot: DeviceSnapshot) -> List[Dict[str, Any]]:
+        """Add bps rates to the snapshot rows; return TrafficData rows to store"""
+        now = time.time()
+        booted_at = now - parse_uptime(snapshot.stats.get("uptime", "0"))
+
+        engine = self._interface_counters.get(device_id)
+        if engine is None:
+            engine = self._interface_counters[device_id] = CounterDeltaEngine(["rx", "tx"])
+        interfaces = snapshot.interfaces
+        deltas = engine.update(
+            [row["name"] for row in interfaces],
+            [(row["rx_bytes"], row["tx_bytes"]) for row in interfaces],
+            now,
+            [booted_at] * len(interfaces)
+        )
+        for row, (rx_bps, tx_bps) in zip(interfaces, deltas.rates.tolist()):
+            row["rx_bps"] = rx_bps
+            row["tx_bps"] = tx_bps
+
+        engine = self._session_counters.get(device_id)
+        if engine is None:
+            engine = self._session_counters[device_id] = CounterDeltaEngine(["in", "out"])
+        sessions = snapshot.pppoe_sessions
+        names = [row["name"] for row in sessions]
+        # A re-dial shows up as a new session start time for the same name
+        deltas = engine.update(
+            names,
+            [(row["bytes_in"], row["bytes_out"]) for row in sessions],
+            now,
+            [now - parse_uptime(row["uptime"]) for row in sessions]
+        )
+        for row, (in_bps, out_bps) in zip(sessions, deltas.rates.tolist()):
+            row["in_bps"] = in_bps
+            row["out_bps"] = out_bps
+        engine.forget(list(set(engine.keys()) - set(names)))
+
+        if not self.record_traffic:
+            return []
+        return traffic_records(deltas, device_id, snapshot.polled_at)
+
+    async def _collect(self, device: Any):
+        async with self.pool.session(device) as api:
+            # All three prints are in flight on the same session at once
+            return await asyncio.gather(
+                api.get_system_stats(), api.get_interfaces(), api.get_pppoe_sessions()
+            )
+
+    def _record_failure(self, device_id: int, error: str):
+        snapshot = self._snapshots.get(device_id)
+        if snapshot is None:
+            snapshot = DeviceSnapshot(device_id)
+            self._snapshots[device_id] = snapshot
+        snapshot.error = error
+
+
+fleet_poller = FleetPoller(
+    mikrotik_pool,
+    interval=settings.MIKROTIK_POLL_INTERVAL,
+    concurrency=settings.MIKROTIK_POLL_CONCURRENCY,
+    device_timeout=settings.MIKROTIK_POLL_DEVICE_TIMEOUT,
+    cycle_timeout=settings.MIKROTIK_POLL_CYCLE_TIMEOUT,
+    record_traffic=settings.MIKROTIK_POLL_RECORD_TRAFFIC,
+    spool=accounting_spool if settings.ACCOUNTING_SPOOL_ENABLED else None,
+    # Session usage is counted from accounting when that is received
+    quota=None if settings.RADIUS_ACCT_SERVER_ENABLED else quota_engine,
+)
@@ -0,0 +1,231 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.mikrotik_async import (
+    AsyncMikroTikAPI, MikroTikError, MikroTikTrap, ResumingSSLContext, create_ssl_context
+)
+
+DeviceKey = Tuple[str, int, str]
+
+
+def device_field(device: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a device dict or MikroTikDevice row"""
+    if isinstance(device, dict):
+        return device.get(name, default)
+    return getattr(device, name, default)
+
+
+def device_uses_ssl(device: Any) -> bool:
+    """Whether a device is reached over API-SSL"""
+    if device_field(device, "use_ssl"):
+        return True
+    return device_field(device, "port") == settings.MIKROTIK_API_SSL_PORT
+
+
+def device_key(device: Any) -> DeviceKey:
+    """Pool key for a device: (ip, port, username)"""
+    return (
+        device_field(device, "ip_address"),
+        device_field(device, "port") or settings.MIKROTIK_DEFAULT_PORT,
+        device_field(device, "username"),
+    )
+
+
+class _IdleSession:
+    __slots__ = ("api", "idle_since", "checked_at")
+
+    def __init__(self, api: AsyncMikroTikAPI):
+        self.api = api
+        self.idle_since = time.monotonic()
+        self.checked_at = self.idle_since
+
+
+class _DevicePool:
+    """Authenticated sessions for one router"""
+
+    def __init__(self, key: DeviceKey, password: str, max_sessions: int, timeout: int,
+                 ssl_context: Optional[ResumingSSLContext] = None):
+        self.host, self.port, self.username = key
+        self.password = password
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        # A slot is held by every session that is lent out or being health
+        # checked, so open connections never exceed max_sessions
+        self.slots = asyncio.Semaphore(max_sessions)
+        self.idle: Deque[_IdleSession] = deque()
+        self.leased = 0
+        self.connects = 0
+        self.tls_resumed = 0
+        self.evictions = 0
+
+    async def acquire(self) -> AsyncMikroTikAPI:
+        await self.slots.acquire()
+        while self.idle:
+            api = self.idle.pop().api
+            if api.connected:
+                self.leased += 1
+                return api
+            self.evictions += 1
+            await api.disconnect()
+
+        api = AsyncMikroTikAPI(self.host, self.port, self.timeout, self.ssl_context)
+        try:
+            connected = await api.connect(self.username, self.password)
+        except BaseException:
+            self.slots.release()
+            raise
+        if not connected:
+            self.slots.release()
+            raise MikroTikError(f"Unable to connect to {self.host}:{self.port}")
+        self.connects += 1
+        self.tls_resumed += api.tls_resumed
+        self.leased += 1
+        return api
+
+    async def release(self, api: AsyncMikroTikAPI, healthy: bool):
+        self.leased -= 1
+        try:
+            if healthy and api.connected:
+                self.idle.append(_IdleSession(api))
+            else:
+                self.evictions += 1
+                await api.disconnect()
+        finally:
+            self.slots.release()
+
+    async def close_idle(self):
+        while self.idle:
+            await self.idle.pop().api.disconnect()
+
+    async def check_idle(self, idle_timeout: float, keepalive_interval: float):
+        """Drop expired idle sessions and ping the rest"""
+        now = time.monotonic()
+        for _ in range(len(self.idle)):
+            if self.slots.locked():
+                return
+            session = self.idle.popleft()
+            if now - session.idle_since > idle_timeout:
+                await session.api.disconnect()
+                continue
+            if now - session.checked_at < keepalive_interval:
+                self.idle.append(session)
+                continue
+
+            await self.slots.acquire()
+            try:
+                await session.api.command(["/system/identity/print"])
+                session.checked_at = time.monotonic()
+                self.idle.append(session)
+            except MikroTikError:
+                self.evictions += 1
+                await session.api.disconnect()
+            finally:
+                self.slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "idle": len(self.idle),
+            "leased": self.leased,
+            "connects": self.connects,
+            "tls_resumed": self.tls_resumed,
+            "evictions": self.evictions,
+        }
+
+
+class MikroTikPool:
+    """Per-device pool of authenticated RouterOS API sessions
+
+    Sessions are keyed by (ip, port, username) and lent out exclusively;
+    a caller can still multiplex many commands over its lease. Idle
+    sessions are pinged with a cheap keepalive and evicted when they stop
+    answering or sit idle past ``idle_timeout``.
+    """
+
+    def __init__(self, max_sessions: int = 4, idle_timeout: float = 300,
+                 keepalive_interval: float = 30, timeout: int = 10,
+                 ssl_context: Optional[ResumingSSLContext] = None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        # Shared by all API-SSL devices so TLS sessions survive reconnects
+        self.ssl_context = ssl_context or create_ssl_context()
+        self._devices: Dict[DeviceKey, _DevicePool] = {}
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    def _device_pool(self, device: Any) -> _DevicePool:
+        key = device_key(device)
+        password = device_field(device, "password", "") or ""
+        pool = self._devices.get(key)
+        if pool is None:
+            ssl_context = self.ssl_context if device_uses_ssl(device) else None
+            pool = _DevicePool(key, password, self.max_sessions, self.timeout, ssl_context)
+            self._devices[key] = pool
+        elif pool.password != password:
+            # Credentials changed: sessions opened with the old password go
+            pool.password = password
+            asyncio.ensure_future(pool.close_idle())
+        return pool
+
+    @asynccontextmanager
+    async def session(self, device: Any) -> AsyncIterator[AsyncMikroTikAPI]:
+        """Borrow an authenticated session for a device"""
+        pool = self._device_pool(device)
+        api = await pool.acquire()
+        healthy = True
+        try:
+            yield api
+        except MikroTikTrap:
+            # The router answered: the session is still in sync
+            raise
+        except BaseException:
+            # Anything else, cancellation included (e.g. a wait_for timeout),
+            # may leave a reply half read on the connection
+            healthy = False
+            raise
+        finally:
+            await pool.release(api, healthy)
+
+    async def start(self):
+        """Start the keepalive loop"""
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.ensure_future(self._keepalive_loop())
+
+    async def close(self):
+        """Stop the keepalive loop and close every idle session"""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+        for pool in self._devices.values():
+            await pool.close_idle()
+        self._devices.clear()
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            pools = list(self._devices.values())
+            await asyncio.gather(
+                *[p.check_idle(self.idle_timeout, self.keepalive_interval) for p in pools],
+                return_exceptions=True
+            )
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Session counters per device"""
+        return {f"{host}:{port}/{user}": pool.stats() for (host, port, user), pool in self._devices.items()}
+
+
+mikrotik_pool = MikroTikPool(
+    max_sessions=settings.MIKROTIK_POOL_MAX_SESSIONS,
+    idle_timeout=settings.MIKROTIK_POOL_IDLE_TIMEOUT,
+    keepalive_interval=settings.MIKROTIK_POOL_KEEPALIVE_INTERVAL,
+    timeout=settings.MIKROTIK_API_TIMEOUT,
+    ssl_context=create_ssl_context(settings.MIKROTIK_SSL_VERIFY, settings.MIKROTIK_SSL_CA_FILE),
+)
@@ -0,0 +1,506 @@
+import csv
+import hashlib
+import io
+import json
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.billing import BillingAccount, BillingStatus, Payment, PaymentAllocation, PaymentStatus
+from app.services.revenue_ledger import record_revenue
+
+# Column names seen in bank and e-wallet exports -> import field
+_ALIASES = {
+    "va": "virtual_account",
+    "va_number": "virtual_account",
+    "virtual_account_number": "virtual_account",
+    "ref": "reference",
+    "reference_no": "reference",
+    "transaction_id": "reference",
+    "trx_id": "reference",
+    "user": "username",
+    "msisdn": "phone",
+    "phone_number": "phone",
+    "date": "payment_date",
+    "transaction_date": "payment_date",
+    "paid_at": "payment_date",
+    "description": "notes",
+    "remark": "notes",
+}
+_DATE_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y")
+_OPEN = (PaymentStatus.PENDING, PaymentStatus.OVERDUE)
+_AMBIGUOUS = -1
+# Unmatched and invalid rows listed in the report, beyond which only counted
+_SAMPLE_LIMIT = 1000
+# (account id, position, invoice before the change, invoice after a part payment or None if taken)
+_Undo = Tuple[int, int, Tuple, Optional[Tuple]]
+
+
+def normalize_phone(value: Any) -> Optional[str]:
+    """Digits only, with the country code 62 written as a leading 0"""
+    digits = "".join(ch for ch in str(value or "") if ch.isdigit())
+    if digits.startswith("62"):
+        digits = "0" + digits[2:]
+    return digits or None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text: str) -> datetime:
+    # Statement rows share a handful of timestamps, hence the cache
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {text!r}")
+
+
+def parse_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """One statement row as import fields; raises ValueError if unusable
+
+    Rows without a reference get one hashed from their content, so
+    importing the same file again still finds them as duplicates.
+    """
+    fields: Dict[str, Any] = {}
+    for key, value in raw.items():
+        if key is None or value in (None, ""):
+            continue
+        name = key.strip().lower()
+        fields[_ALIASES.get(name, name)] = value.strip() if isinstance(value, str) else value
+    amount = fields.get("amount")
+    if isinstance(amount, str):
+        amount = amount.replace(",", "").replace(" ", "")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid amount {fields.get('amount')!r}")
+    if amount <= 0:
+        raise ValueError(f"invalid amount {fields.get('amount')!r}")
+    reference = fields.get("reference")
+    if reference is None:
+        digest = hashlib.sha1(json.dumps(raw, sort_keys=True, default=str).encode()).hexdigest()
+        reference = f"row:{digest}"
+    return {
+        "amount": round(amount, 2),
+        "reference": str(reference)[:100],
+        "payment_date": _parse_date(str(fields["payment_date"])) if "payment_date" in fields else None,
+        "virtual_account": str(fields["virtual_account"]) if "virtual_account" in fields else None,
+        "username": str(fields["username"]) if "username" in fields else None,
+        "phone": normalize_phone(fields.get("phone")),
+        "notes": str(fields["notes"]) if "notes" in fields else None,
+    }
+
+
+def read_rows(stream: BinaryIO, fmt: str = "csv") -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Stream ``(line, row, error)`` from a CSV (with header) or JSON lines file"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for raw in reader:
+                try:
+                    yield reader.line_num, parse_row(raw), None
+                except (KeyError, ValueError) as e:
+                    yield reader.line_num, None, str(e)
+        else:
+            for line, content in enumerate(text, 1):
+                if not content.strip():
+                    continue
+                try:
+                    raw = json.loads(content)
+                    if not isinstance(raw, dict):
+                        raise ValueError("not a JSON object")
+                    yield line, parse_row(raw), None
+                except (KeyError, ValueError) as e:
+                    yield line, None, str(e)
+    finally:
+        # The caller owns the underlying file
+        if not text.closed:
+            text.detach()
+
+
+class AccountIndex:
+    """Hash indexes for matching payments to billing accounts and open invoices
+
+    Accounts are looked up by virtual account number, an open invoice's
+    (outstanding amount, invoice_key) given as the payment reference,
+    username and phone, in that order. A phone shared by several accounts matches none
+    of them. Open invoices are kept per account, oldest due first.
+    """
+
+    def __init__(self):
+        self.by_virtual_account: Dict[str, int] = {}
+        self.by_invoice: Dict[Tuple[float, str], int] = {}
+        self.by_username: Dict[str, int] = {}
+        self.by_phone: Dict[str, int] = {}
+        # id -> [username, status, due_date, package_price, bandwidth_profile, package_name, ppp_profile]
+        self.accounts: Dict[int, List[Any]] = {}
+        # id -> [(due_date, payment id, outstanding amount, invoice_key)]
+        self.open_invoices: Dict[int, List[Tuple[datetime, int, float, Optional[str]]]] = {}
+
+    def load(self, db: Session, chunk_size: int = 10000, account_ids: Optional[List[int]] = None):
+        """Index every account, or only ``account_ids``"""
+        accounts = select(
+            BillingAccount.id, BillingAccount.username, BillingAccount.phone, BillingAccount.virtual_account,
+            BillingAccount.status, BillingAccount.due_date, BillingAccount.package_price,
+            BillingAccount.bandwidth_profile, BillingAccount.package_name, BillingAccount.ppp_profile
+        ).execution_options(yield_per=chunk_size)
+        if account_ids is not None:
+            accounts = accounts.where(BillingAccount.id.in_(account_ids))
+        for account_id, username, phone, virtual_account, status, due_date, price, profile, package, ppp_profile \
+                in db.execute(accounts):
+            self.accounts[account_id] = [username, status, due_date, price, profile, package, ppp_profile]
+            self.by_username[username] = account_id
+            if virtual_account:
+                self.by_virtual_account[virtual_account] = account_id
+            phone = normalize_phone(phone)
+            if phone:
+                self.by_phone[phone] = _AMBIGUOUS if phone in self.by_phone else account_id
+        invoices = (
+            select(Payment.id, Payment.billing_account_id, Payment.amount, Payment.paid_amount, Payment.due_date,
+                   Payment.invoice_key)
+            .where(Payment.status.in_(_OPEN))
+            .order_by(Payment.billing_account_id, Payment.due_date, Payment.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if account_ids is not None:
+            invoices = invoices.where(Payment.billing_account_id.in_(account_ids))
+        for invoice_id, account_id, amount, paid_amount, due_date, invoice_key in db.execute(invoices):
+            amount = round(amount - (paid_amount or 0.0), 2)
+            self.open_invoices.setdefault(account_id, []).append((due_date, invoice_id, amount, invoice_key))
+            if invoice_key:
+                self.by_invoice[(round(amount, 2), invoice_key)] = account_id
+
+    def match(self, row: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]]:
+        """Account id for a parsed row and what matched it"""
+        if row["virtual_account"] in self.by_virtual_account:
+            return self.by_virtual_account[row["virtual_account"]], "virtual_account"
+        account_id = self.by_invoice.get((row["amount"], row["reference"]))
+        if account_id is not None:
+            return account_id, "invoice"
+        if row["username"] in self.by_username:
+            return self.by_username[row["username"]], "username"
+        account_id = self.by_phone.get(row["phone"])
+        if account_id is not None:
+            return (None, "ambiguous") if account_id == _AMBIGUOUS else (account_id, "phone")
+        return None, None
+
+
+class PaymentImporter:
+    """Reconcile a settlement file against accounts and open invoices in batches
+
+    Each batch is one transaction: rows already imported from ``source``
+    (same reference) are skipped, matched rows become paid Payment rows
+    and revenue rollup entries, and each payment settles whole open
+    invoices of its account, oldest due first (or the invoice named by
+    its reference). What is left of it is applied to the next open
+    invoice as a part payment; money beyond every open invoice, or an
+    underpayment by an account billed without invoices, is reported as
+    unapplied. What each payment put towards each invoice is recorded as
+    a PaymentAllocation. An account left with nothing due is paid up: its due date
+    moves to its earliest open invoice's, or to that of the next cycle's
+    invoice if none is left, and, if suspended, it is reactivated. Rows
+    matching no account are only reported.
+    """
+
+    def __init__(self, db: Session, source: str, batch_size: int = settings.BILLING_IMPORT_BATCH_SIZE,
+                 now: Optional[datetime] = None, index: Optional[AccountIndex] = None):
+        self.db = db
+        self.source = source
+        self.batch_size = batch_size
+        self.now = now or datetime.now()
+        # Due date of the next cycle's invoice, as generate_monthly_invoices sets it
+        next_cycle = (self.now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                      + timedelta(days=32)).replace(day=1)
+        self.next_due = next_cycle + timedelta(days=settings.BILLING_INVOICE_DUE_DAYS)
+        self.index = index
+        self._seen: Set[str] = set()
+        self._paid: Set[int] = set()
+        # Open invoice id -> amount the run's payments put towards it
+        self.allocated: Dict[int, float] = {}
+        self.report: Dict[str, Any] = {
+            "source": source,
+            "rows": 0,
+            "payments_created": 0,
+            "amount": 0.0,
+            "matched": {"virtual_account": 0, "invoice": 0, "username": 0, "phone": 0},
+            "duplicates": 0,
+            "unmatched": 0,
+            "ambiguous": 0,
+            "invalid": 0,
+            "invoices_settled": 0,
+            "invoices_part_paid": 0,
+            "accounts_paid": 0,
+            "partial": 0,
+            "unapplied_amount": 0.0,
+            "reactivated": [],
+            "unmatched_rows": [],
+            "invalid_rows": [],
+        }
+
+    def run(self, rows: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        if self.index is None:
+            self.index = AccountIndex()
+            self.index.load(self.db)
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for line, row, error in rows:
+            self.report["rows"] += 1
+            if error is not None:
+                self.report["invalid"] += 1
+                self._sample("invalid_rows", {"line": line, "error": error})
+                continue
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        self.report["amount"] = round(self.report["amount"], 2)
+        self.report["unapplied_amount"] = round(self.report["unapplied_amount"], 2)
+        self.report["elapsed"] = round(time.perf_counter() - started, 3)
+        return self.report
+
+    def _sample(self, name: str, entry: Dict[str, Any]):
+        if len(self.report[name]) < _SAMPLE_LIMIT:
+            self.report[name].append(entry)
+
+    def _flush(self, batch: List[Tuple[int, Dict[str, Any]]]):
+        retried = False
+        while True:
+            existing = set(self.db.execute(
+                select(Payment.reference).where(
+                    Payment.payment_method == self.source,
+                    Payment.reference.in_([row["reference"] for _, row in batch])
+                )
+            ).scalars())
+            undo: List[_Undo] = []
+            plan = self._plan(batch, existing, undo)
+            try:
+                if plan["payments"]:
+                    self.db.execute(insert(Payment.__table__), plan["payments"])
+                    record_revenue(self.db, plan["payments"])
+                if plan["allocations"]:
+                    self._allocate(plan["allocations"])
+                if plan["settled"]:
+                    table = Payment.__table__
+                    self.db.execute(
+                        update(table).where(table.c.id == bindparam("settled_id"))
+                        .values(status=PaymentStatus.PAID, payment_date=bindparam("settled_at"),
+                                paid_amount=table.c.amount),
+                        plan["settled"]
+                    )
+                if plan["applied"]:
+                    table = Payment.__table__
+                    self.db.execute(
+                        update(table).where(table.c.id == bindparam("applied_id"))
+                        .values(paid_amount=table.c.paid_amount + bindparam("applied")),
+                        plan["applied"]
+                    )
+                if plan["paid"]:
+                    self._mark_paid(plan["paid"])
+                self.db.commit()
+            except IntegrityError:
+                # Another import stored some of these references first: redo the batch without them
+                self.db.rollback()
+                self._undo(undo)
+                if retried:
+                    raise
+                retried = True
+                continue
+            break
+        self._commit_plan(plan)
+
+    def _plan(self, batch: List[Tuple[int, Dict[str, Any]]], existing: Set[str],
+              undo: List[_Undo]) -> Dict[str, Any]:
+        plan: Dict[str, Any] = {
+            "payments": [], "settled": [], "applied": [], "allocations": [], "paid": {}, "references": set(),
+            "duplicates": 0, "unmatched": [], "ambiguous": 0, "matched": [], "partial": 0, "unapplied": 0.0
+        }
+        for line, row in batch:
+            reference = row["reference"]
+            if reference in existing or reference in self._seen or reference in plan["references"]:
+                plan["duplicates"] += 1
+                continue
+            account_id, matched_by = self.index.match(row)
+            if account_id is None:
+                if matched_by == "ambiguous":
+                    plan["ambiguous"] += 1
+                plan["unmatched"].append({"line": line, "amount": row["amount"], "reference": reference})
+                continue
+            plan["references"].add(reference)
+            plan["matched"].append(matched_by)
+            paid_at = row["payment_date"] or self.now
+            settled, applied, remaining = self._settle(
+                account_id, row["amount"], reference if matched_by == "invoice" else None, undo
+            )
+            for invoice in settled:
+                plan["settled"].append({"settled_id": invoice[1], "settled_at": paid_at})
+                plan["allocations"].append((reference, invoice[1], invoice[2]))
+            if applied is not None:
+                plan["applied"].append({"applied_id": applied[0], "applied": applied[1]})
+                plan["allocations"].append((reference, applied[0], applied[1]))
+            account = self.index.accounts[account_id]
+            invoices = self.index.open_invoices.get(account_id)
+            if settled:
+                paid = not any(invoice[0] <= self.now for invoice in invoices or ())
+            elif applied is None:
+                # Accounts billed without invoices pay their package price
+                paid = row["amount"] >= account[3] - 0.005
+            else:
+                paid = False
+            if paid:
+                # Invoices left open are not due yet: the account is next due with the first of them
+                plan["paid"][account_id] = invoices[0][0] if invoices else self.next_due
+            elif not settled:
+                plan["partial"] += 1
+            if settled or not paid:
+                plan["unapplied"] += remaining
+            plan["payments"].append({
+                "billing_account_id": account_id,
+                "amount": row["amount"],
+                "payment_method": self.source,
+                "status": PaymentStatus.PAID,
+                "payment_date": paid_at,
+                "due_date": settled[0][0] if settled else account[2],
+                "notes": row["notes"] or f"Imported from {self.source}",
+                "reference": reference,
+                "package_name": account[5],
+                "created_at": self.now,
+            })
+        return plan
+
+    def _settle(self, account_id: int, amount: float, invoice_key: Optional[str],
+                undo: List[_Undo]) -> Tuple[List[Tuple], Optional[Tuple[int, float]], float]:
+        """Apply ``amount`` to the account's open invoices
+
+        Returns the invoices it covers (taken off the account's list), the
+        (invoice id, amount) part payment made with the rest, if any, and
+        what was left with no open invoice to apply it to.
+        """
+        invoices = self.index.open_invoices.get(account_id)
+        settled: List[Tuple] = []
+        if not invoices:
+            return settled, None, amount
+        position = None
+        if invoice_key is not None:
+            position = next((i for i, invoice in enumerate(invoices) if invoice[3] == invoice_key), None)
+            if position is not None and invoices[position][2] <= amount + 0.005:
+                settled.append(self._take(account_id, invoices, position, undo))
+                amount -= settled[-1][2]
+                position = None
+        while position is None and invoices and invoices[0][2] <= amount + 0.005:
+            settled.append(self._take(account_id, invoices, 0, undo))
+            amount -= settled[-1][2]
+        amount = max(round(amount, 2), 0.0)
+        if invoices and amount > 0:
+            position = position or 0
+            self._reduce(account_id, invoices, position, amount, undo)
+            return settled, (invoices[position][1], amount), 0.0
+        return settled, None, amount
+
+    def _take(self, account_id: int, invoices: List[Tuple], position: int,
+              undo: List[_Undo]) -> Tuple:
+        invoice = invoices.pop(position)
+        if invoice[3]:
+            self.index.by_invoice.pop((round(invoice[2], 2), invoice[3]), None)
+        undo.append((account_id, position, invoice, None))
+        return invoice
+
+    def _reduce(self, account_id: int, invoices: List[Tuple], position: int, amount: float,
+                undo: List[_Undo]):
+        invoice = invoices[position]
+        reduced = (invoice[0], invoice[1], round(invoice[2] - amount, 2), invoice[3])
+        invoices[position] = reduced
+        if invoice[3]:
+            # The rest of the invoice can still be paid by its key
+            self.index.by_invoice.pop((round(invoice[2], 2), invoice[3]), None)
+            self.index.by_invoice[(reduced[2], invoice[3])] = account_id
+        undo.append((account_id, position, invoice, reduced))
+
+    def _undo(self, undo: List[_Undo]):
+        for account_id, position, invoice, reduced in reversed(undo):
+            invoices = self.index.open_invoices[account_id]
+            if reduced is None:
+                invoices.insert(position, invoice)
+            else:
+                invoices[position] = invoice
+                if invoice[3]:
+                    self.index.by_invoice.pop((reduced[2], invoice[3]), None)
+            if invoice[3]:
+                self.index.by_invoice[(round(invoice[2], 2), invoice[3])] = account_id
+
+    def _allocate(self, allocations: List[Tuple[str, int, float]]):
+        """Store (reference, invoice id, amount) allocations against the new payments' ids"""
+        ids = dict(self.db.execute(
+            select(Payment.reference, Payment.id).where(
+                Payment.payment_method == self.source,
+                Payment.reference.in_({reference for reference, _, _ in allocations})
+            )
+        ).all())
+        self.db.execute(insert(PaymentAllocation.__table__), [
+            {"payment_id": ids[reference], "invoice_id": invoice_id, "amount": amount}
+            for reference, invoice_id, amount in allocations
+        ])
+
+    def _mark_paid(self, paid: Dict[int, datetime]):
+        """Move paid-up accounts' due dates forward to the given ones and reactivate them"""
+        ids = list(paid)
+        table = BillingAccount.__table__
+        self.db.execute(
+            update(table)
+            .where(table.c.id == bindparam("paid_id"), table.c.due_date < bindparam("paid_due"))
+            .values(due_date=bindparam("paid_due"), updated_at=self.now),
+            [{"paid_id": account_id, "paid_due": due_date} for account_id, due_date in paid.items()]
+        )
+        suspended = [account_id for account_id in ids
+                     if self.index.accounts[account_id][1] == BillingStatus.SUSPENDED]
+        if suspended:
+            self.db.execute(
+                update(BillingAccount)
+                .where(BillingAccount.id.in_(suspended), BillingAccount.status == BillingStatus.SUSPENDED)
+                .values(status=BillingStatus.ACTIVE)
+                .execution_options(synchronize_session=False)
+            )
+
+    def _commit_plan(self, plan: Dict[str, Any]):
+        report = self.report
+        self._seen.update(plan["references"])
+        report["payments_created"] += len(plan["payments"])
+        report["amount"] += sum(payment["amount"] for payment in plan["payments"])
+        for matched_by in plan["matched"]:
+            report["matched"][matched_by] += 1
+        report["duplicates"] += plan["duplicates"]
+        report["unmatched"] += len(plan["unmatched"])
+        report["ambiguous"] += plan["ambiguous"]
+        for entry in plan["unmatched"]:
+            self._sample("unmatched_rows", entry)
+        report["invoices_settled"] += len(plan["settled"])
+        report["invoices_part_paid"] += len(plan["applied"])
+        for _, invoice_id, amount in plan["allocations"]:
+            self.allocated[invoice_id] = self.allocated.get(invoice_id, 0.0) + amount
+        self._paid.update(plan["paid"])
+        report["accounts_paid"] = len(self._paid)
+        report["partial"] += plan["partial"]
+        report["unapplied_amount"] += plan["unapplied"]
+        for account_id, due_date in plan["paid"].items():
+            account = self.index.accounts[account_id]
+            account[2] = max(account[2], due_date)
+            if account[1] == BillingStatus.SUSPENDED:
+                account[1] = BillingStatus.ACTIVE
+                report["reactivated"].append({
+                    "account_id": account_id,
+                    "username": account[0],
+                    "bandwidth_profile": account[4],
+                    "ppp_profile": account[6],
+                })
\ No newline at end of file
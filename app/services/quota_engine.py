@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models.billing import TrafficData
+from app.services.radius_coa import CoaDispatcher, coa_dispatcher
+from app.services.subscriber_index import SubscriberIndex, subscriber_index
+
+GB = 1000 ** 3
+
+
+def load_cycle_usage(since: datetime) -> List[Tuple[str, int]]:
+    """Bytes per username recorded since ``since`` (naive UTC), in one aggregate"""
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(TrafficData.username, func.sum(TrafficData.total_bytes))
+            .where(TrafficData.recorded_at >= since)
+            .group_by(TrafficData.username)
+        ).all()
+    finally:
+        db.close()
+
+
+class QuotaEngine:
+    """Per-subscriber usage for the current billing cycle and FUP enforcement
+
+    Traffic deltas from accounting and polling are added to a running total
+    per username as they arrive; when a subscriber's total reaches the
+    quota of their bandwidth profile (``policies``: profile ->
+    {"quota_gb", "rate_limit"}) their sessions are moved to the policy's
+    rate limit through the CoA dispatcher, which together with the auth
+    server takes that rate from ``throttle_rate``. When the cycle (calendar
+    month in ``timezone_name``) rolls over, totals restart from zero and
+    throttled subscribers are restored. On start the current cycle is
+    summed from TrafficData once, and subscribers already over quota are
+    marked throttled so the next roll-over restores them; after that usage
+    queries never touch the table.
+    """
+
+    def __init__(self, policies: Dict[str, Dict[str, Any]], timezone_name: str = "UTC",
+                 index: SubscriberIndex = subscriber_index, dispatcher: CoaDispatcher = coa_dispatcher,
+                 usage_source: Callable[[datetime], Iterable[Tuple[str, int]]] = load_cycle_usage):
+        self.policies = {
+            profile: (int(float(policy["quota_gb"]) * GB), policy["rate_limit"])
+            for profile, policy in policies.items()
+        }
+        self.tz = ZoneInfo(timezone_name)
+        self.index = index
+        self.dispatcher = dispatcher
+        self.usage_source = usage_source
+        self._usage: Dict[str, int] = {}
+        self._throttled: Set[str] = set()
+        self.cycle_start, self.cycle_end = self._bounds(datetime.utcnow())
+        self.throttles = 0
+        self.restores = 0
+        self.late = 0
+
+    async def start(self):
+        """Sum the current cycle so far and mark subscribers already over quota"""
+        loop = asyncio.get_event_loop()
+        try:
+            rows = await loop.run_in_executor(None, self.usage_source, self.cycle_start)
+        except Exception as e:
+            print(f"Quota engine: cannot load cycle usage: {e}")
+            return
+        for username, total in rows:
+            self._usage[username] = self._usage.get(username, 0) + int(total or 0)
+        # Throttled before the restart: their sessions and re-logins already get the FUP rate
+        self._throttled.update(username for username in self._usage if self.throttle_rate(username))
+
+    def add(self, username: str, total_bytes: int, recorded_at: datetime):
+        """Count a traffic delta and throttle the subscriber if it crosses the quota"""
+        if recorded_at >= self.cycle_end:
+            self.roll(recorded_at)
+        elif recorded_at < self.cycle_start:
+            # Delivered after the cycle closed: already billed as closed
+            self.late += 1
+            return
+        used = self._usage.get(username, 0) + total_bytes
+        self._usage[username] = used
+        if username in self._throttled:
+            return
+        policy = self._policy(username)
+        if policy is not None and used >= policy[0]:
+            self._throttled.add(username)
+            self.throttles += 1
+            # The dispatcher asks throttle_rate() for the new rate limit
+            self.dispatcher.account_changed(username)
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]):
+        """Count TrafficData rows"""
+        for row in rows:
+            self.add(row["username"], row["total_bytes"], row["recorded_at"])
+
+    def throttle_rate(self, username: str) -> Optional[str]:
+        """Rate limit a subscriber over quota must get, e.g. on re-authentication"""
+        policy = self._policy(username)
+        if policy is not None and self._usage.get(username, 0) >= policy[0]:
+            return policy[1]
+        return None
+
+    def roll(self, now: Optional[datetime] = None) -> int:
+        """Start a new cycle if ``now`` (naive UTC) is past the current one"""
+        now = now or datetime.utcnow()
+        if now < self.cycle_end:
+            return 0
+        self.cycle_start, self.cycle_end = self._bounds(now)
+        throttled = self._throttled
+        self._usage = {}
+        self._throttled = set()
+        for username in throttled:
+            self.dispatcher.account_changed(username)
+        self.restores += len(throttled)
+        return len(throttled)
+
+    def usage(self, username: str) -> Dict[str, Any]:
+        """Usage so far this cycle against the subscriber's quota"""
+        used = self._usage.get(username, 0)
+        policy = self._policy(username)
+        return {
+            "cycle_start": self.cycle_start.replace(tzinfo=timezone.utc).astimezone(self.tz).isoformat(),
+            "monthly_usage": used,
+            "quota": policy[0] if policy else 0,  # 0: unlimited
+            "remaining": max(policy[0] - used, 0) if policy else None,
+            "throttled": username in self._throttled,
+            "remaining_days": max((self.cycle_end - datetime.utcnow()).days, 0),
+        }
+
+    def _policy(self, username: str) -> Optional[Tuple[int, str]]:
+        subscriber = self.index.get(username)
+        if subscriber is None or subscriber.bandwidth_profile is None:
+            return None
+        return self.policies.get(subscriber.bandwidth_profile)
+
+    def _bounds(self, moment: datetime) -> Tuple[datetime, datetime]:
+        """Naive UTC start and end of the cycle containing ``moment`` (naive UTC)"""
+        local = moment.replace(tzinfo=timezone.utc).astimezone(self.tz)
+        start = local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = (start.replace(tzinfo=None) + timedelta(days=32)).replace(day=1).replace(tzinfo=self.tz)
+        return (
+            start.astimezone(timezone.utc).replace(tzinfo=None),
+            end.astimezone(timezone.utc).replace(tzinfo=None),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Cycle, tracked subscribers and enforcement counters"""
+        return {
+            "cycle_start": self.cycle_start.isoformat(),
+            "cycle_end": self.cycle_end.isoformat(),
+            "subscribers": len(self._usage),
+            "throttled": len(self._throttled),
+            "policies": len(self.policies),
+            "throttles": self.throttles,
+            "restores": self.restores,
+            "late": self.late,
+        }
+
+
+quota_engine = QuotaEngine(settings.FUP_POLICIES, settings.BILLING_TIMEZONE)
\ No newline at end of file
@@ -0,0 +1,388 @@
+import asyncio
+import socket
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, tuple_
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models.billing import AcctSessionCounter
+from app.services.accounting_spool import AccountingSpool, accounting_spool
+from app.services.mikrotik_pool import device_field
+from app.services.quota_engine import QuotaEngine, quota_engine
+from app.services.radius_codec import (
+    ACCOUNTING_REQUEST, ACCOUNTING_RESPONSE, ACCT_INTERIM_UPDATE, ACCT_START, ACCT_STOP,
+    Packet, PacketEncoder, RadiusSecret, verify_request
+)
+from app.services.session_table import ActiveSessionTable, session_table
+from app.services.traffic_rates import store_traffic_records
+
+SessionKey = Tuple[str, str]
+
+
+def load_session_counters(max_age: float) -> Dict[SessionKey, Tuple[int, int, int]]:
+    """Persisted counters of open sessions, dropping any not updated within ``max_age`` seconds"""
+    table = AcctSessionCounter.__table__
+    db = SessionLocal()
+    try:
+        db.execute(delete(table).where(table.c.updated_at < datetime.utcnow() - timedelta(seconds=max_age)))
+        rows = db.execute(select(
+            table.c.nas_ip, table.c.session_id, table.c.input_octets, table.c.output_octets, table.c.session_time
+        )).all()
+        db.commit()
+        return {(nas_ip, session_id): (i, o, t) for nas_ip, session_id, i, o, t in rows}
+    finally:
+        db.close()
+
+
+def store_session_counters(updated: List[Dict[str, Any]], closed: List[SessionKey]):
+    """Replace the counters of updated sessions and forget closed ones in one transaction"""
+    table = AcctSessionCounter.__table__
+    db = SessionLocal()
+    try:
+        keys = closed + [(row["nas_ip"], row["session_id"]) for row in updated]
+        for start in range(0, len(keys), 500):
+            db.execute(delete(table).where(tuple_(table.c.nas_ip, table.c.session_id).in_(keys[start:start + 500])))
+        if updated:
+            db.execute(insert(table), updated)
+        db.commit()
+    finally:
+        db.close()
+
+
+class AccountingRecord:
+    """One decoded Accounting-Request"""
+
+    __slots__ = ("status", "username", "session_id", "nas_ip", "framed_ip",
+                 "input_octets", "output_octets", "session_time", "received_at")
+
+    def __init__(self, packet: Packet, nas_address: str):
+        self.status = packet.get("Acct-Status-Type", 0)
+        self.username = packet.get("User-Name", "")
+        self.session_id = packet.get("Acct-Session-Id", "")
+        self.nas_ip = packet.get("NAS-IP-Address", nas_address)
+        self.framed_ip = packet.get("Framed-IP-Address")
+        self.input_octets = packet.counter("Acct-Input-Octets")
+        self.output_octets = packet.counter("Acct-Output-Octets")
+        self.session_time = packet.get("Acct-Session-Time", 0)
+        self.received_at = datetime.utcnow()
+
+
+class _SessionCounters:
+    __slots__ = ("input_octets", "output_octets", "session_time")
+
+    def __init__(self, input_octets: int = 0, output_octets: int = 0, session_time: int = 0):
+        self.input_octets = input_octets
+        self.output_octets = output_octets
+        self.session_time = session_time
+
+
+class RadiusAccountingServer(asyncio.DatagramProtocol):
+    """Asyncio RADIUS accounting server feeding TrafficData
+
+    Every valid Accounting-Request is acknowledged straight from the
+    datagram callback; the cumulative counters are turned into per-session
+    deltas and queued for a writer task that bulk inserts them in a worker
+    thread, so database latency never reaches the socket or the HTTP API.
+    When the queue is full requests are left unanswered and the NAS
+    retransmits them later instead of losing them. Retransmissions of an
+    already counted request are acknowledged again but not re-counted.
+
+    With a ``spool`` the rows go to the durable AccountingSpool instead of
+    the in-memory queue, and are acknowledged once appended there. Each
+    delta is also counted by the ``quota`` engine as it arrives.
+
+    The last counters of every open session are checkpointed to the
+    database every ``checkpoint_interval`` seconds and on stop, and loaded
+    again on start, so the first update after a restart is counted from
+    there instead of only becoming the new baseline.
+    """
+
+    def __init__(self, secret: str, host: str = "0.0.0.0", port: int = 1813,
+                 batch_size: int = 1000, flush_interval: float = 1.0, queue_size: int = 100000,
+                 device_source: Callable[[], Iterable[Any]] = list,
+                 store: Callable[[List[Dict]], None] = store_traffic_records,
+                 sessions: Optional[ActiveSessionTable] = session_table,
+                 spool: Optional[AccountingSpool] = None,
+                 quota: Optional[QuotaEngine] = quota_engine,
+                 checkpoint_interval: float = 5.0, counter_max_age: float = 86400,
+                 counter_source: Callable[[float], Dict[SessionKey, Tuple[int, int, int]]] = load_session_counters,
+                 counter_store: Callable[[List[Dict], List[SessionKey]], None] = store_session_counters):
+        self.secret = RadiusSecret(secret)
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.device_source = device_source
+        self.store = store
+        self.sessions = sessions
+        self.spool = spool
+        self.quota = quota
+        self.checkpoint_interval = checkpoint_interval
+        self.counter_max_age = counter_max_age
+        self.counter_source = counter_source
+        self.counter_store = counter_store
+        self._encoder = PacketEncoder(self.secret)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._sessions: Dict[SessionKey, _SessionCounters] = {}
+        # Sessions changed since the last checkpoint; None: closed
+        self._dirty: Dict[SessionKey, Optional[_SessionCounters]] = {}
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self._recent: "OrderedDict[Tuple[Any, int, bytes], float]" = OrderedDict()
+        self.received = 0
+        self.acknowledged = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.deferred = 0
+        self.records_written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.checkpoint_errors = 0
+
+    async def start(self):
+        """Load session counters, bind the accounting port and start the writer"""
+        loop = asyncio.get_event_loop()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        try:
+            counters = await loop.run_in_executor(None, self.counter_source, self.counter_max_age)
+        except Exception as e:
+            print(f"RADIUS accounting: cannot load session counters: {e}")
+            counters = {}
+        for key, values in counters.items():
+            self._sessions.setdefault(key, _SessionCounters(*values))
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+        if self.spool is None:
+            self._writer_task = asyncio.ensure_future(self._writer())
+        self._checkpoint_task = asyncio.ensure_future(self._checkpointer())
+
+    async def stop(self):
+        """Close the socket and flush queued records"""
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        if self._writer_task:
+            # The writer drains the queue before it exits
+            self._stopping = True
+            self._wakeup.set()
+            await self._writer_task
+            self._writer_task = None
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+            await self.checkpoint()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # Absorb interim-update bursts while the loop is busy elsewhere
+        sock = transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        except OSError:
+            pass
+
+    def datagram_received(self, data: bytes, addr):
+        self.received += 1
+        if len(data) < 20 or data[0] != ACCOUNTING_REQUEST:
+            self.invalid += 1
+            return
+        if not verify_request(data, self.secret):
+            self.invalid += 1
+            return
+
+        key = (addr, data[1], data[4:20])
+        now = time.monotonic()
+        if key in self._recent:
+            self.duplicates += 1
+        else:
+            try:
+                record = AccountingRecord(Packet(data), addr[0])
+            except ValueError:
+                self.invalid += 1
+                return
+            if record.status in (ACCT_INTERIM_UPDATE, ACCT_STOP) and self._full():
+                # No answer: the NAS keeps the record and retransmits
+                self.deferred += 1
+                return
+            if self.sessions is not None:
+                self.sessions.update_from_accounting(record)
+            row = self._traffic_row(record)
+            if row is not None and self.quota is not None:
+                self.quota.add(row["username"], row["total_bytes"], row["recorded_at"])
+            if row is not None and self.spool is not None:
+                self.spool.append(row)
+            elif row is not None:
+                self._queue.put_nowait(row)
+                if self._queue.qsize() >= self.batch_size:
+                    self._wakeup.set()
+            self._remember(key, now)
+
+        self.transport.sendto(
+            self._encoder.encode(ACCOUNTING_RESPONSE, data[1], (), request_authenticator=data[4:20]), addr
+        )
+        self.acknowledged += 1
+
+    def _full(self) -> bool:
+        return self.spool.full() if self.spool is not None else self._queue.full()
+
+    def _remember(self, key: Tuple[Any, int, bytes], now: float):
+        self._recent[key] = now
+        # NAS retransmissions stop well within a minute
+        while self._recent:
+            oldest_key, seen = next(iter(self._recent.items()))
+            if now - seen < 60 and len(self._recent) <= 200000:
+                break
+            del self._recent[oldest_key]
+
+    def _traffic_row(self, record: AccountingRecord) -> Optional[Dict[str, Any]]:
+        """Per-session delta since the previous update, as a TrafficData row"""
+        session_key = (record.nas_ip, record.session_id)
+        if record.status == ACCT_START:
+            self._sessions[session_key] = self._dirty[session_key] = _SessionCounters()
+            return None
+        if record.status not in (ACCT_INTERIM_UPDATE, ACCT_STOP):
+            return None
+
+        previous = self._sessions.get(session_key)
+        if record.status == ACCT_STOP:
+            self._sessions.pop(session_key, None)
+            self._dirty[session_key] = None
+        else:
+            self._sessions[session_key] = self._dirty[session_key] = _SessionCounters(
+                record.input_octets, record.output_octets, record.session_time
+            )
+        if previous is None:
+            # Session started before this process: take this update as the baseline
+            return None
+
+        input_delta = max(record.input_octets - previous.input_octets, 0)
+        output_delta = max(record.output_octets - previous.output_octets, 0)
+        if not (input_delta or output_delta):
+            return None
+        # NAS input is the subscriber's upload
+        return {
+            "nas_ip": record.nas_ip,
+            "username": record.username,
+            "rx_bytes": output_delta,
+            "tx_bytes": input_delta,
+            "total_bytes": input_delta + output_delta,
+            "session_time": max(record.session_time - previous.session_time, 0),
+            "recorded_at": record.received_at,
+            "date_only": record.received_at.strftime("%Y-%m-%d"),
+        }
+
+    async def _checkpointer(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
+
+    async def checkpoint(self) -> int:
+        """Persist the counters of sessions changed since the last checkpoint"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        now = datetime.utcnow()
+        updated = [
+            {"nas_ip": nas_ip, "session_id": session_id, "input_octets": counters.input_octets,
+             "output_octets": counters.output_octets, "session_time": counters.session_time, "updated_at": now}
+            for (nas_ip, session_id), counters in dirty.items() if counters is not None
+        ]
+        closed = [key for key, counters in dirty.items() if counters is None]
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.counter_store, updated, closed)
+        except Exception as e:
+            self.checkpoint_errors += 1
+            print(f"RADIUS accounting checkpoint error: {e}")
+            # Retry next time unless the session changed again meanwhile
+            for key, counters in dirty.items():
+                self._dirty.setdefault(key, counters)
+            return 0
+        return len(dirty)
+
+    async def _writer(self):
+        while True:
+            if self._queue.qsize() < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            batch = []
+            while not self._queue.empty() and len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await self._flush(batch)
+            elif self._stopping:
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        device_ids = {
+            device_field(device, "ip_address"): device_field(device, "id")
+            for device in self.device_source()
+        }
+        for row in batch:
+            if "nas_ip" in row:
+                row["mikrotik_device_id"] = device_ids.get(row.pop("nas_ip"))
+        loop = asyncio.get_event_loop()
+        delay = 1.0
+        while True:
+            try:
+                await loop.run_in_executor(None, self.store, batch)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Already acknowledged to the NAS, so keep retrying until shutdown
+                self.write_errors += 1
+                print(f"RADIUS accounting write error: {e}")
+                if self._stopping and delay >= 4.0:
+                    print(f"RADIUS accounting: dropping {len(batch)} records at shutdown")
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        self.records_written += len(batch)
+        self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Packet and write counters"""
+        return {
+            "listening": self.transport is not None,
+            "received": self.received,
+            "acknowledged": self.acknowledged,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "deferred": self.deferred,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "spooled": self.spool is not None,
+            "open_sessions": len(self._sessions),
+            "records_written": self.records_written,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "checkpoint_errors": self.checkpoint_errors,
+        }
+
+
+accounting_server = RadiusAccountingServer(
+    settings.RADIUS_SECRET,
+    host=settings.RADIUS_ACCT_BIND,
+    port=settings.RADIUS_ACCT_PORT,
+    batch_size=settings.RADIUS_ACCT_BATCH_SIZE,
+    flush_interval=settings.RADIUS_ACCT_FLUSH_INTERVAL,
+    queue_size=settings.RADIUS_ACCT_QUEUE_SIZE,
+    spool=accounting_spool if settings.ACCOUNTING_SPOOL_ENABLED else None,
+    checkpoint_interval=settings.RADIUS_ACCT_CHECKPOINT_INTERVAL,
+    counter_max_age=settings.RADIUS_ACCT_COUNTER_MAX_AGE,
+)
\ No newline at end of file
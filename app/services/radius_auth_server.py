@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import hmac
+import socket
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.radius_codec import (
+    ACCESS_ACCEPT, ACCESS_REJECT, ACCESS_REQUEST, Packet, PacketEncoder, RadiusSecret,
+    unhide_password, verify_message_authenticator
+)
+from app.services.subscriber_index import Subscriber, SubscriberIndex, subscriber_index
+
+
+def chap_valid(chap_password: bytes, challenge: bytes, password: bytes) -> bool:
+    """Check a CHAP-Password against the cleartext password"""
+    if len(chap_password) != 17:
+        return False
+    expected = hashlib.md5(chap_password[:1] + password + challenge).digest()
+    return hmac.compare_digest(expected, chap_password[1:])
+
+
+def subscriber_attributes(subscriber: Subscriber, group_rate_limits: Dict[str, str],
+                          throttle_rate: Optional[str] = None) -> List[Tuple[str, Any]]:
+    """MikroTik authorization attributes for a subscriber's current state
+
+    ``throttle_rate`` replaces the usual rate limit of a subscriber over
+    their fair-usage quota; isolation still takes precedence.
+    """
+    rate_limit = throttle_rate or group_rate_limits.get(subscriber.group_name) or subscriber.bandwidth_profile
+    if subscriber.isolated:
+        reply = [
+            ("Mikrotik-Group", settings.MIKROTIK_ISOLATION_PROFILE),
+            ("Mikrotik-Address-List", settings.MIKROTIK_ISOLATION_ADDRESS_LIST),
+        ]
+        rate_limit = settings.MIKROTIK_ISOLATION_RATE_LIMIT or rate_limit
+    else:
+        reply = []
+    if rate_limit:
+        reply.append(("Mikrotik-Rate-Limit", rate_limit))
+    return reply
+
+
+class RadiusAuthServer(asyncio.DatagramProtocol):
+    """Asyncio Access-Request responder answering from a SubscriberIndex
+
+    PAP and CHAP logins are checked against the indexed password. Active
+    subscribers get Mikrotik-Rate-Limit from their group (or the account's
+    bandwidth profile); isolated ones are accepted into the isolation
+    profile and address list so the router can redirect them. Answers to
+    recent requests are cached, so NAS retransmissions during a re-dial
+    storm get the same reply without being evaluated again.
+
+    Against Blast-RADIUS (CVE-2024-3596) every reply is signed with
+    Message-Authenticator and, with ``require_message_authenticator``,
+    requests without one are dropped; set it off only for NASes that
+    cannot sign.
+    """
+
+    def __init__(self, secret: str, host: str = "0.0.0.0", port: int = 1812,
+                 index: SubscriberIndex = subscriber_index,
+                 group_rate_limits: Optional[Dict[str, str]] = None,
+                 throttle: Optional[Callable[[str], Optional[str]]] = None,
+                 require_message_authenticator: bool = True):
+        self.secret = RadiusSecret(secret)
+        self.host = host
+        self.port = port
+        self.index = index
+        self.group_rate_limits = group_rate_limits or {}
+        # username -> fair-usage throttle rate limit, if over quota
+        self.throttle = throttle
+        self.require_message_authenticator = require_message_authenticator
+        self._encoder = PacketEncoder(self.secret)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._recent: "OrderedDict[Tuple[Any, int, bytes], Tuple[bytes, float]]" = OrderedDict()
+        self.requests = 0
+        self.accepted = 0
+        self.isolated = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.unsigned = 0
+        self.duplicates = 0
+
+    async def start(self):
+        """Bind the authentication port"""
+        loop = asyncio.get_event_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+
+    async def stop(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        except OSError:
+            pass
+
+    def datagram_received(self, data: bytes, addr):
+        self.requests += 1
+        if len(data) < 20 or data[0] != ACCESS_REQUEST:
+            self.invalid += 1
+            return
+
+        key = (addr, data[1], data[4:20])
+        now = time.monotonic()
+        cached = self._recent.get(key)
+        if cached is not None:
+            self.duplicates += 1
+            self.transport.sendto(cached[0], addr)
+            return
+
+        packet = Packet(data)
+        try:
+            signed = "Message-Authenticator" in packet
+        except ValueError:
+            self.invalid += 1
+            return
+        if not signed:
+            if self.require_message_authenticator:
+                self.unsigned += 1
+                return
+        elif not verify_message_authenticator(packet, self.secret):
+            # RFC 3579: silently discard
+            self.invalid += 1
+            return
+
+        code, reply_attributes = self.authorize(packet)
+        response = self._encoder.encode(
+            code, packet.identifier, reply_attributes,
+            request_authenticator=packet.authenticator, message_authenticator=True
+        )
+        self.transport.sendto(response, addr)
+        self._remember(key, response, now)
+
+    def authorize(self, packet: Packet) -> Tuple[int, List[Tuple[str, Any]]]:
+        """Decide Accept/Reject and the reply attributes for one request"""
+        username = packet.get("User-Name", "")
+        subscriber = self.index.get(username)
+        if subscriber is None or subscriber.password is None:
+            return self._reject("Unknown user")
+        if not subscriber.allowed:
+            return self._reject("Account disabled")
+
+        password = subscriber.password.encode("utf-8")
+        if "User-Password" in packet:
+            supplied = unhide_password(packet.get("User-Password"), self.secret, packet.authenticator)
+            valid = hmac.compare_digest(supplied, password)
+        elif "CHAP-Password" in packet:
+            challenge = packet.get("CHAP-Challenge", packet.authenticator)
+            valid = chap_valid(packet.get("CHAP-Password"), challenge, password)
+        else:
+            valid = False
+        if not valid:
+            return self._reject("Invalid password")
+
+        self.accepted += 1
+        return ACCESS_ACCEPT, self._reply_attributes(subscriber)
+
+    def _reject(self, message: str) -> Tuple[int, List[Tuple[str, Any]]]:
+        self.rejected += 1
+        return ACCESS_REJECT, [("Reply-Message", message)]
+
+    def _reply_attributes(self, subscriber: Subscriber) -> List[Tuple[str, Any]]:
+        if subscriber.isolated:
+            self.isolated += 1
+        throttle_rate = self.throttle(subscriber.username) if self.throttle else None
+        return subscriber_attributes(subscriber, self.group_rate_limits, throttle_rate)
+
+    def _remember(self, key: Tuple[Any, int, bytes], response: bytes, now: float):
+        self._recent[key] = (response, now)
+        while self._recent:
+            oldest_key, (_, seen) = next(iter(self._recent.items()))
+            if now - seen < 30 and len(self._recent) <= 100000:
+                break
+            del self._recent[oldest_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counters"""
+        return {
+            "listening": self.transport is not None,
+            "requests": self.requests,
+            "accepted": self.accepted,
+            "isolated": self.isolated,
+            "rejected": self.rejected,
+            "invalid": self.invalid,
+            "unsigned": self.unsigned,
+            "duplicates": self.duplicates,
+            "index": self.index.stats(),
+        }
+
+
+auth_server = RadiusAuthServer(
+    settings.RADIUS_SECRET,
+    host=settings.RADIUS_AUTH_BIND,
+    port=settings.RADIUS_AUTH_PORT,
+    group_rate_limits=settings.RADIUS_GROUP_RATE_LIMITS,
+    require_message_authenticator=settings.RADIUS_REQUIRE_MESSAGE_AUTHENTICATOR,
+)
\ No newline at end of file
@@ -0,0 +1,285 @@
+import asyncio
+import socket
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.radius_service import RadiusService
+
+ACCESS_ACCEPT = 2
+ACCOUNTING_RESPONSE = 5
+
+
+class RadiusError(Exception):
+    """RADIUS request failure"""
+
+
+class RadiusTimeout(RadiusError):
+    """No valid reply after all retransmissions"""
+
+
+class _Outstanding:
+    __slots__ = ("packet", "address", "future", "attempts", "timer")
+
+    def __init__(self, packet: bytes, address: Tuple[str, int], future: asyncio.Future):
+        self.packet = packet
+        self.address = address
+        self.future = future
+        self.attempts = 1
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class _RadiusSocket(asyncio.DatagramProtocol):
+    """One UDP socket with its own 256-entry identifier space"""
+
+    def __init__(self, client: "AsyncRadiusClient"):
+        self.client = client
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.pending: Dict[int, _Outstanding] = {}
+        # Released identifiers go to the back, so reuse is as late as possible
+        self.free_ids: Deque[int] = deque(range(256))
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # Room for a full window of replies arriving in one burst
+        sock = transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        except OSError:
+            pass
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) < 20:
+            self.client.invalid += 1
+            return
+        outstanding = self.pending.get(data[1])
+        if outstanding is None:
+            # Late duplicate of an answered or expired request
+            self.client.duplicates += 1
+            return
+        if tuple(addr[:2]) != outstanding.address:
+            # Only the server the request went to may answer it
+            self.client.invalid += 1
+            return
+        if not self.client.service.verify_response(data, outstanding.packet[4:20]):
+            self.client.invalid += 1
+            return
+        self.client.replies += 1
+        self._finish(data[1], outstanding)
+        if not outstanding.future.done():
+            outstanding.future.set_result(data)
+
+    def error_received(self, exc: Exception):
+        # ICMP errors are not tied to a request; retransmission covers them
+        self.client.socket_errors += 1
+
+    def connection_lost(self, exc: Optional[Exception]):
+        error = RadiusError(f"RADIUS socket closed: {exc}" if exc else "RADIUS socket closed")
+        for identifier, outstanding in list(self.pending.items()):
+            self._finish(identifier, outstanding)
+            if not outstanding.future.done():
+                outstanding.future.set_exception(error)
+        self.transport = None
+
+    def send(self, identifier: int, packet: bytes, address: Tuple[str, int]) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        outstanding = _Outstanding(packet, address, future)
+        self.pending[identifier] = outstanding
+        try:
+            self.transport.sendto(packet, address)
+        except BaseException:
+            del self.pending[identifier]
+            raise
+        self.client.sent += 1
+        self._arm(identifier, outstanding)
+        return future
+
+    def _arm(self, identifier: int, outstanding: _Outstanding):
+        delay = self.client.timeout * self.client.backoff ** (outstanding.attempts - 1)
+        outstanding.timer = asyncio.get_event_loop().call_later(
+            delay, self._expired, identifier, outstanding
+        )
+
+    def _expired(self, identifier: int, outstanding: _Outstanding):
+        if self.pending.get(identifier) is not outstanding:
+            return
+        if outstanding.attempts > self.client.retries or self.transport is None:
+            self.client.timeouts += 1
+            self._finish(identifier, outstanding)
+            if not outstanding.future.done():
+                outstanding.future.set_exception(
+                    RadiusTimeout(f"No reply from {outstanding.address[0]}:{outstanding.address[1]}")
+                )
+            return
+        # Same identifier and authenticator, so the server can detect the duplicate
+        outstanding.attempts += 1
+        self.client.retransmits += 1
+        self.transport.sendto(outstanding.packet, outstanding.address)
+        self._arm(identifier, outstanding)
+
+    def _finish(self, identifier: int, outstanding: _Outstanding):
+        if outstanding.timer:
+            outstanding.timer.cancel()
+        del self.pending[identifier]
+        self.free_ids.append(identifier)
+        self.client.capacity.release()
+
+
+class AsyncRadiusClient:
+    """Asyncio RADIUS client multiplexing requests over a few UDP sockets
+
+    Every socket tracks up to 256 outstanding identifiers; replies are
+    matched by identifier, must come from the server's address and are
+    verified against the request authenticator. Unanswered requests are
+    retransmitted unchanged after ``timeout``, growing by ``backoff`` per
+    attempt, up to ``retries`` times.
+    """
+
+    def __init__(self, server: str, secret: str, auth_port: int = 1812, acct_port: int = 1813,
+                 sockets: int = 4, timeout: float = 2.0, retries: int = 3, backoff: float = 2.0):
+        self.server = server
+        self.auth_port = auth_port
+        self.acct_port = acct_port
+        self.socket_count = sockets
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # Packet building and authenticator checks are shared with the blocking client
+        self.service = RadiusService(server, auth_port, secret)
+        self.capacity: Optional[asyncio.Semaphore] = None
+        # Resolved on open, so replies can be matched to the address sent to
+        self._server_ip: Optional[str] = None
+        self._sockets: List[_RadiusSocket] = []
+        self._next_socket = 0
+        self.sent = 0
+        self.replies = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.socket_errors = 0
+
+    async def open(self):
+        """Create the UDP sockets"""
+        loop = asyncio.get_event_loop()
+        if self._server_ip is None:
+            addresses = await loop.getaddrinfo(self.server, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            self._server_ip = addresses[0][4][0]
+        if self.capacity is None:
+            self.capacity = asyncio.Semaphore(self.socket_count * 256)
+        while len(self._sockets) < self.socket_count:
+            _, protocol = await loop.create_datagram_endpoint(
+                lambda: _RadiusSocket(self), local_addr=("0.0.0.0", 0)
+            )
+            self._sockets.append(protocol)
+
+    async def close(self):
+        """Close the sockets, failing anything still outstanding"""
+        for sock in self._sockets:
+            if sock.transport:
+                sock.transport.close()
+        self._sockets = []
+
+    async def __aenter__(self) -> "AsyncRadiusClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, build: Callable[[int], bytes], port: int) -> bytes:
+        """Send the packet ``build(identifier)`` and wait for its verified reply"""
+        if not self._sockets:
+            await self.open()
+        await self.capacity.acquire()
+        for _ in range(len(self._sockets)):
+            sock = self._sockets[self._next_socket]
+            self._next_socket = (self._next_socket + 1) % len(self._sockets)
+            if sock.free_ids and sock.transport:
+                identifier = sock.free_ids.popleft()
+                break
+        else:
+            self.capacity.release()
+            raise RadiusError("RADIUS client is closed")
+        try:
+            future = sock.send(identifier, build(identifier), (self._server_ip, port))
+        except BaseException:
+            sock.free_ids.append(identifier)
+            self.capacity.release()
+            raise
+        return await future
+
+    async def authenticate(self, username: str, password: str) -> bool:
+        """Authenticate user via RADIUS"""
+        reply = await self.request(
+            lambda identifier: self.service._create_access_request(username, password, identifier),
+            self.auth_port
+        )
+        return reply[0] == ACCESS_ACCEPT
+
+    async def accounting(self, username: str, session_id: str, nas_ip: str, status: str,
+                         session_time: int = 0, bytes_in: int = 0, bytes_out: int = 0) -> bool:
+        """Send an accounting start/update/stop packet"""
+        reply = await self.request(
+            lambda identifier: self.service._create_accounting_packet(
+                username, session_id, nas_ip, status, session_time, bytes_in, bytes_out, identifier
+            ),
+            self.acct_port
+        )
+        return reply[0] == ACCOUNTING_RESPONSE
+
+    async def authenticate_many(self, credentials: Iterable[Tuple[str, str]]) -> List[Any]:
+        """Authenticate (username, password) pairs; True/False or the error per pair"""
+        return await self._batch(credentials, lambda item: self.authenticate(*item))
+
+    async def accounting_many(self, records: Iterable[Dict[str, Any]]) -> List[Any]:
+        """Send accounting records (``accounting`` keyword arguments); True/False or the error per record"""
+        return await self._batch(records, lambda item: self.accounting(**item))
+
+    async def _batch(self, items: Iterable[Any], send: Callable[[Any], Any]) -> List[Any]:
+        # A fixed set of workers keeps every identifier busy without
+        # creating one task per request for very large batches
+        results: List[Any] = []
+        source = iter(enumerate(items))
+
+        async def worker():
+            for index, item in source:
+                try:
+                    result = await send(item)
+                except (RadiusError, OSError, ValueError) as e:
+                    # One bad item (e.g. a packet too large) must not end the batch
+                    result = e
+                results.append((index, result))
+
+        if not self._sockets:
+            await self.open()
+        await asyncio.gather(*[worker() for _ in range(len(self._sockets) * 256)])
+        results.sort(key=lambda pair: pair[0])
+        return [result for _, result in results]
+
+    def stats(self) -> Dict[str, int]:
+        """Request counters"""
+        return {
+            "sockets": len(self._sockets),
+            "outstanding": sum(len(sock.pending) for sock in self._sockets),
+            "sent": self.sent,
+            "replies": self.replies,
+            "retransmits": self.retransmits,
+            "timeouts": self.timeouts,
+            "invalid": self.invalid,
+            "duplicates": self.duplicates,
+            "socket_errors": self.socket_errors,
+        }
+
+
+def create_radius_client() -> AsyncRadiusClient:
+    """Client for the configured RADIUS server"""
+    return AsyncRadiusClient(
+        settings.RADIUS_SERVER,
+        settings.RADIUS_SECRET,
+        auth_port=settings.RADIUS_AUTH_PORT,
+        acct_port=settings.RADIUS_ACCT_PORT,
+        sockets=settings.RADIUS_CLIENT_SOCKETS,
+        timeout=settings.RADIUS_CLIENT_TIMEOUT,
+        retries=settings.RADIUS_CLIENT_RETRIES,
+    )
\ No newline at end of file
@@ -0,0 +1,243 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.radius_auth_server import subscriber_attributes
+from app.services.radius_client import AsyncRadiusClient, RadiusError
+from app.services.radius_codec import COA_ACK, DISCONNECT_ACK, Packet
+from app.services.session_table import ActiveSessionTable, session_table
+from app.services.subscriber_index import SubscriberIndex, subscriber_index
+
+DISCONNECT = "disconnect"
+COA = "coa"
+
+# Error-Cause (RFC 5176 section 3.5)
+SESSION_CONTEXT_NOT_FOUND = 503
+
+
+class CoaRequest:
+    """One Disconnect or CoA request for one session"""
+
+    __slots__ = ("action", "username", "session_id", "framed_ip", "attributes", "attempts")
+
+    def __init__(self, action: str, username: str, session_id: Optional[str], framed_ip: Optional[str],
+                 attributes: Optional[List[Tuple[str, Any]]] = None):
+        self.action = action
+        self.username = username
+        self.session_id = session_id
+        self.framed_ip = framed_ip
+        self.attributes = attributes or []
+        self.attempts = 0
+
+
+class _NasQueue:
+    __slots__ = ("nas_ip", "client", "pending", "in_flight", "wakeup", "task",
+                 "acked", "not_found", "rejected", "failed")
+
+    def __init__(self, nas_ip: str, client: AsyncRadiusClient):
+        self.nas_ip = nas_ip
+        self.client = client
+        # Keyed by session, so a newer change for the same session replaces a queued one
+        self.pending: "OrderedDict[str, CoaRequest]" = OrderedDict()
+        self.in_flight: Set[asyncio.Future] = set()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.acked = 0
+        self.not_found = 0
+        self.rejected = 0
+        self.failed = 0
+
+
+class CoaDispatcher:
+    """RFC 5176 Disconnect/CoA sender with one queue per NAS
+
+    Requests are queued per NAS and drained by a task per NAS that keeps
+    at most ``nas_concurrency`` of them in flight, so a mass isolation
+    runs every router in parallel without flooding any one of them.
+    Each NAS gets its own AsyncRadiusClient (identifier multiplexing,
+    retransmission and reply verification); a request that still gets no
+    answer is queued again up to ``max_attempts`` times. A NAK saying the
+    session is already gone counts as done.
+    """
+
+    def __init__(self, secret: str, port: int = 3799, mode: str = DISCONNECT,
+                 nas_concurrency: int = 32, timeout: float = 2.0, retries: int = 2,
+                 max_attempts: int = 3, sessions: ActiveSessionTable = session_table,
+                 index: SubscriberIndex = subscriber_index,
+                 group_rate_limits: Optional[Dict[str, str]] = None,
+                 throttle: Optional[Callable[[str], Optional[str]]] = None):
+        self.secret = secret
+        self.port = port
+        self.mode = mode
+        self.nas_concurrency = nas_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.max_attempts = max_attempts
+        self.sessions = sessions
+        self.index = index
+        self.group_rate_limits = group_rate_limits or {}
+        self.throttle = throttle
+        self._queues: Dict[str, _NasQueue] = {}
+        self._running = False
+        self._stopping = False
+        self.queued = 0
+        self.retried = 0
+
+    async def start(self):
+        self._running = True
+        self._stopping = False
+
+    async def stop(self):
+        """Send what is still queued, then close every NAS client"""
+        self._stopping = True
+        for nas in self._queues.values():
+            nas.wakeup.set()
+        tasks = [nas.task for nas in self._queues.values() if nas.task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for nas in self._queues.values():
+            nas.task = None
+            await nas.client.close()
+        self._running = False
+
+    def account_changed(self, username: str) -> int:
+        """Push a suspend/reactivate or FUP throttle/restore of ``username`` to its online sessions"""
+        if self.mode == COA:
+            subscriber = self.index.get(username)
+            if subscriber is not None:
+                throttle_rate = self.throttle(username) if self.throttle else None
+                return self.change(
+                    username, subscriber_attributes(subscriber, self.group_rate_limits, throttle_rate)
+                )
+        # Re-authentication picks up the new profile from the RADIUS server
+        return self.disconnect(username)
+
+    def disconnect(self, username: str) -> int:
+        """Queue a Disconnect-Request for every online session of ``username``"""
+        return self._enqueue(DISCONNECT, username)
+
+    def change(self, username: str, attributes: List[Tuple[str, Any]]) -> int:
+        """Queue a CoA-Request with ``attributes`` for every online session of ``username``"""
+        return self._enqueue(COA, username, attributes)
+
+    def _enqueue(self, action: str, username: str,
+                 attributes: Optional[List[Tuple[str, Any]]] = None) -> int:
+        if not self._running or self._stopping:
+            return 0
+        count = 0
+        for session in self.sessions.get(username):
+            # Sessions only known from a router poll have no Acct-Session-Id yet
+            session_id = None if session.session_id.startswith("ppp:") else session.session_id
+            request = CoaRequest(action, username, session_id, session.framed_ip, attributes)
+            nas = self._nas(session.nas_ip)
+            nas.pending[session.session_id] = request
+            nas.wakeup.set()
+            count += 1
+        self.queued += count
+        return count
+
+    def _nas(self, nas_ip: str) -> _NasQueue:
+        nas = self._queues.get(nas_ip)
+        if nas is None:
+            client = AsyncRadiusClient(
+                nas_ip, self.secret, sockets=1, timeout=self.timeout, retries=self.retries
+            )
+            nas = self._queues[nas_ip] = _NasQueue(nas_ip, client)
+        if nas.task is None:
+            # Created on first use so it lands on the running loop
+            nas.task = asyncio.ensure_future(self._run(nas))
+        return nas
+
+    async def _run(self, nas: _NasQueue):
+        while True:
+            while nas.pending and len(nas.in_flight) < self.nas_concurrency:
+                key, request = nas.pending.popitem(last=False)
+                task = asyncio.ensure_future(self._send(nas, key, request))
+                nas.in_flight.add(task)
+                task.add_done_callback(lambda done: self._sent(nas, done))
+            if self._stopping and not nas.pending and not nas.in_flight:
+                return
+            await nas.wakeup.wait()
+            nas.wakeup.clear()
+
+    def _sent(self, nas: _NasQueue, task: asyncio.Future):
+        nas.in_flight.discard(task)
+        nas.wakeup.set()
+
+    async def _send(self, nas: _NasQueue, key: str, request: CoaRequest):
+        request.attempts += 1
+        service = nas.client.service
+        if request.action == DISCONNECT:
+            build = lambda identifier: service._create_disconnect_request(
+                request.username, request.session_id, request.framed_ip, identifier
+            )
+        else:
+            build = lambda identifier: service._create_coa_request(
+                request.username, request.attributes, request.session_id, request.framed_ip, identifier
+            )
+        try:
+            reply = Packet(await nas.client.request(build, self.port))
+        except (RadiusError, ValueError) as e:
+            if request.attempts < self.max_attempts and not self._stopping:
+                self.retried += 1
+                asyncio.get_event_loop().call_later(
+                    self.timeout * request.attempts, self._requeue, nas, key, request
+                )
+                return
+            nas.failed += 1
+            print(f"RADIUS {request.action} for {request.username} on {nas.nas_ip} failed: {e}")
+            return
+
+        if reply.code in (DISCONNECT_ACK, COA_ACK):
+            nas.acked += 1
+        elif reply.get("Error-Cause") == SESSION_CONTEXT_NOT_FOUND:
+            nas.not_found += 1
+        else:
+            nas.rejected += 1
+            print(f"RADIUS {request.action} for {request.username} rejected by {nas.nas_ip}: "
+                  f"Error-Cause {reply.get('Error-Cause')}")
+
+    def _requeue(self, nas: _NasQueue, key: str, request: CoaRequest):
+        if self._stopping or key in nas.pending:
+            # Shutting down, or superseded by a newer change for the session
+            return
+        nas.pending[key] = request
+        nas.wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue and acknowledgement counters, overall and per NAS"""
+        per_nas = {
+            nas.nas_ip: {
+                "pending": len(nas.pending),
+                "in_flight": len(nas.in_flight),
+                "acked": nas.acked,
+                "not_found": nas.not_found,
+                "rejected": nas.rejected,
+                "failed": nas.failed,
+            }
+            for nas in self._queues.values()
+        }
+        totals = {
+            name: sum(counters[name] for counters in per_nas.values())
+            for name in ("pending", "in_flight", "acked", "not_found", "rejected", "failed")
+        }
+        return {
+            "running": self._running,
+            "mode": self.mode,
+            "queued": self.queued,
+            "retried": self.retried,
+            **totals,
+            "nas": per_nas,
+        }
+
+
+coa_dispatcher = CoaDispatcher(
+    settings.RADIUS_SECRET,
+    port=settings.RADIUS_COA_PORT,
+    mode=settings.RADIUS_COA_MODE,
+    nas_concurrency=settings.RADIUS_COA_NAS_CONCURRENCY,
+    timeout=settings.RADIUS_COA_TIMEOUT,
+    retries=settings.RADIUS_COA_RETRIES,
+    group_rate_limits=settings.RADIUS_GROUP_RATE_LIMITS,
+)
\ No newline at end of file
@@ -0,0 +1,517 @@
+import hashlib
+import hmac
+import os
+import socket
+import struct
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Packet codes
+ACCESS_REQUEST = 1
+ACCESS_ACCEPT = 2
+ACCESS_REJECT = 3
+ACCOUNTING_REQUEST = 4
+ACCOUNTING_RESPONSE = 5
+DISCONNECT_REQUEST = 40
+DISCONNECT_ACK = 41
+DISCONNECT_NAK = 42
+COA_REQUEST = 43
+COA_ACK = 44
+COA_NAK = 45
+
+# Acct-Status-Type values
+ACCT_START = 1
+ACCT_STOP = 2
+ACCT_INTERIM_UPDATE = 3
+ACCT_ACCOUNTING_ON = 7
+ACCT_ACCOUNTING_OFF = 8
+
+# Requests whose authenticator is an MD5 over the packet (RFC 2866, RFC 5176)
+_SIGNED_REQUESTS = (ACCOUNTING_REQUEST, DISCONNECT_REQUEST, COA_REQUEST)
+
+MAX_PACKET_SIZE = 4096
+VENDOR_SPECIFIC = 26
+MESSAGE_AUTHENTICATOR = 80
+MIKROTIK_VENDOR_ID = 14988
+
+STRING = "string"
+OCTETS = "octets"
+INTEGER = "integer"
+IPADDR = "ipaddr"
+DATE = "date"
+
+_HEADER = struct.Struct("!BBH")
+_VENDOR_ATTRIBUTE = struct.Struct("!BBLBB")
+_INTEGER = struct.Struct("!BBL")
+_VENDOR_INTEGER = struct.Struct("!BBLBBL")
+_UINT32 = struct.Struct("!L")
+_COUNTER = struct.Struct("!BBLBBL")
+_ZERO_AUTHENTICATOR = b"\x00" * 16
+
+
+class AttributeDef:
+    """One dictionary entry with its encoder picked up front
+
+    ``encode(value)`` returns the complete attribute (type, length and,
+    for vendor attributes, the Vendor-Specific wrapper). Integer
+    attributes encode through a single precompiled ``struct`` call, so
+    building a packet never branches on the attribute type.
+    """
+
+    __slots__ = ("name", "code", "kind", "vendor", "key", "gigawords", "encode", "_encode_value", "_headers")
+
+    def __init__(self, name: str, code: int, kind: str, vendor: Optional[int] = None):
+        self.name = name
+        self.code = code
+        self.kind = kind
+        self.vendor = vendor
+        # Lookup key used by Packet: the type for standard attributes,
+        # (vendor, vendor type) for vendor-specific ones
+        self.key = code if vendor is None else (vendor, code)
+        self.gigawords: Optional["AttributeDef"] = None
+        self._headers: Dict[int, bytes] = {}
+        if kind in (INTEGER, DATE):
+            if vendor is None:
+                self._encode_value = partial(_INTEGER.pack, code, 6)
+            else:
+                self._encode_value = partial(_VENDOR_INTEGER.pack, VENDOR_SPECIFIC, 12, vendor, code, 6)
+        elif kind == STRING:
+            self._encode_value = self._encode_string
+        elif kind == IPADDR:
+            self._header(4)
+            self._encode_value = self._encode_ipaddr
+        else:
+            self._encode_value = self._encode_octets
+        self.encode = self._encode_value
+
+    def add_gigawords(self, gigawords: "AttributeDef"):
+        """Split values above 32 bits into this attribute plus ``gigawords``"""
+        self.gigawords = gigawords
+        self.encode = self._encode_counter
+
+    def _encode_counter(self, value: int) -> bytes:
+        if not value >> 32:
+            return self._encode_value(value)
+        if self.vendor is None:
+            return _COUNTER.pack(self.gigawords.code, 6, value >> 32, self.code, 6, value & 0xFFFFFFFF)
+        return self.gigawords.encode(value >> 32) + self._encode_value(value & 0xFFFFFFFF)
+
+    def _encode_string(self, value: Union[str, bytes]) -> bytes:
+        if value.__class__ is str:
+            value = value.encode("utf-8")
+        header = self._headers.get(len(value))
+        if header is None:
+            header = self._header(len(value))
+        return header + value
+
+    def _encode_ipaddr(self, value: str) -> bytes:
+        return self._headers[4] + socket.inet_aton(value)
+
+    def _encode_octets(self, value: bytes) -> bytes:
+        header = self._headers.get(len(value))
+        if header is None:
+            header = self._header(len(value))
+        return header + bytes(value)
+
+    def _header(self, size: int) -> bytes:
+        """Type/length prefix for a value of ``size`` bytes, cached per size"""
+        if self.vendor is None:
+            if size > 253:
+                raise ValueError(f"{self.name} value too long")
+            header = bytes((self.code, size + 2))
+        else:
+            if size > 247:
+                raise ValueError(f"{self.name} value too long")
+            header = _VENDOR_ATTRIBUTE.pack(VENDOR_SPECIFIC, size + 8, self.vendor, self.code, size + 2)
+        self._headers[size] = header
+        return header
+
+
+_STANDARD_ATTRIBUTES = [
+    ("User-Name", 1, STRING),
+    ("User-Password", 2, OCTETS),
+    ("CHAP-Password", 3, OCTETS),
+    ("NAS-IP-Address", 4, IPADDR),
+    ("NAS-Port", 5, INTEGER),
+    ("Service-Type", 6, INTEGER),
+    ("Framed-Protocol", 7, INTEGER),
+    ("Framed-IP-Address", 8, IPADDR),
+    ("Framed-IP-Netmask", 9, IPADDR),
+    ("Filter-Id", 11, STRING),
+    ("Framed-MTU", 12, INTEGER),
+    ("Reply-Message", 18, STRING),
+    ("State", 24, OCTETS),
+    ("Class", 25, OCTETS),
+    ("Vendor-Specific", VENDOR_SPECIFIC, OCTETS),
+    ("Session-Timeout", 27, INTEGER),
+    ("Idle-Timeout", 28, INTEGER),
+    ("Called-Station-Id", 30, STRING),
+    ("Calling-Station-Id", 31, STRING),
+    ("NAS-Identifier", 32, STRING),
+    ("Proxy-State", 33, OCTETS),
+    ("Acct-Status-Type", 40, INTEGER),
+    ("Acct-Delay-Time", 41, INTEGER),
+    ("Acct-Input-Octets", 42, INTEGER),
+    ("Acct-Output-Octets", 43, INTEGER),
+    ("Acct-Session-Id", 44, STRING),
+    ("Acct-Authentic", 45, INTEGER),
+    ("Acct-Session-Time", 46, INTEGER),
+    ("Acct-Input-Packets", 47, INTEGER),
+    ("Acct-Output-Packets", 48, INTEGER),
+    ("Acct-Terminate-Cause", 49, INTEGER),
+    ("Acct-Multi-Session-Id", 50, STRING),
+    ("Acct-Link-Count", 51, INTEGER),
+    ("Acct-Input-Gigawords", 52, INTEGER),
+    ("Acct-Output-Gigawords", 53, INTEGER),
+    ("Event-Timestamp", 55, DATE),
+    ("CHAP-Challenge", 60, OCTETS),
+    ("NAS-Port-Type", 61, INTEGER),
+    ("Message-Authenticator", MESSAGE_AUTHENTICATOR, OCTETS),
+    ("Acct-Interim-Interval", 85, INTEGER),
+    ("NAS-Port-Id", 87, STRING),
+    ("Error-Cause", 101, INTEGER),
+]
+
+# MikroTik dictionary (vendor 14988)
+_MIKROTIK_ATTRIBUTES = [
+    ("Mikrotik-Recv-Limit", 1, INTEGER),
+    ("Mikrotik-Xmit-Limit", 2, INTEGER),
+    ("Mikrotik-Group", 3, STRING),
+    ("Mikrotik-Wireless-Forward", 4, INTEGER),
+    ("Mikrotik-Wireless-Skip-Dot1x", 5, INTEGER),
+    ("Mikrotik-Wireless-Enc-Algo", 6, INTEGER),
+    ("Mikrotik-Wireless-Enc-Key", 7, STRING),
+    ("Mikrotik-Rate-Limit", 8, STRING),
+    ("Mikrotik-Realm", 9, STRING),
+    ("Mikrotik-Host-IP", 10, IPADDR),
+    ("Mikrotik-Mark-Id", 11, STRING),
+    ("Mikrotik-Advertise-URL", 12, STRING),
+    ("Mikrotik-Advertise-Interval", 13, INTEGER),
+    ("Mikrotik-Recv-Limit-Gigawords", 14, INTEGER),
+    ("Mikrotik-Xmit-Limit-Gigawords", 15, INTEGER),
+    ("Mikrotik-Wireless-PSK", 16, STRING),
+    ("Mikrotik-Total-Limit", 17, INTEGER),
+    ("Mikrotik-Total-Limit-Gigawords", 18, INTEGER),
+    ("Mikrotik-Address-List", 19, STRING),
+    ("Mikrotik-Wireless-MPKey", 20, STRING),
+    ("Mikrotik-Wireless-Comment", 21, STRING),
+    ("Mikrotik-Delegated-IPv6-Pool", 22, STRING),
+    ("Mikrotik-DHCP-Option-Set", 23, STRING),
+    ("Mikrotik-DHCP-Option-Param-STR1", 24, STRING),
+    ("Mikrotik-DHCP-Option-Param-STR2", 25, STRING),
+    ("Mikrotik-Wireless-VLANID", 26, INTEGER),
+    ("Mikrotik-Wireless-VLANIDtype", 27, INTEGER),
+    ("Mikrotik-Wireless-Minsignal", 28, STRING),
+    ("Mikrotik-Wireless-Maxsignal", 29, STRING),
+]
+
+DICTIONARY: Dict[str, AttributeDef] = {}
+for _name, _code, _kind in _STANDARD_ATTRIBUTES:
+    DICTIONARY[_name] = AttributeDef(_name, _code, _kind)
+for _name, _code, _kind in _MIKROTIK_ATTRIBUTES:
+    DICTIONARY[_name] = AttributeDef(_name, _code, _kind, MIKROTIK_VENDOR_ID)
+BY_KEY: Dict[Any, AttributeDef] = {definition.key: definition for definition in DICTIONARY.values()}
+
+# 64-bit counters carried as a 32-bit attribute plus a Gigawords attribute
+GIGAWORDS = {
+    "Acct-Input-Octets": "Acct-Input-Gigawords",
+    "Acct-Output-Octets": "Acct-Output-Gigawords",
+    "Mikrotik-Recv-Limit": "Mikrotik-Recv-Limit-Gigawords",
+    "Mikrotik-Xmit-Limit": "Mikrotik-Xmit-Limit-Gigawords",
+    "Mikrotik-Total-Limit": "Mikrotik-Total-Limit-Gigawords",
+}
+for _name, _gigawords in GIGAWORDS.items():
+    DICTIONARY[_name].add_gigawords(DICTIONARY[_gigawords])
+_USER_PASSWORD = DICTIONARY["User-Password"]
+_MESSAGE_SIGNATURE_PLACEHOLDER = DICTIONARY["Message-Authenticator"].encode(_ZERO_AUTHENTICATOR)
+
+
+class RadiusSecret:
+    """Shared secret with its MD5 and HMAC-MD5 key state computed once"""
+
+    __slots__ = ("secret", "_md5", "_hmac")
+
+    def __init__(self, secret: Union[str, bytes]):
+        self.secret = secret.encode("utf-8") if isinstance(secret, str) else bytes(secret)
+        self._md5 = hashlib.md5(self.secret)
+        self._hmac = hmac.new(self.secret, digestmod=hashlib.md5)
+
+    def md5(self, data: bytes = b"") -> bytes:
+        """MD5(secret + data) without re-hashing the secret"""
+        digest = self._md5.copy()
+        digest.update(data)
+        return digest.digest()
+
+    def hmac(self, data: bytes) -> bytes:
+        """HMAC-MD5(secret, data) with the key pads already absorbed"""
+        mac = self._hmac.copy()
+        mac.update(data)
+        return mac.digest()
+
+
+def _xor(chunk: bytes, key: bytes) -> bytes:
+    size = len(chunk)
+    return (int.from_bytes(chunk, "big") ^ int.from_bytes(key[:size], "big")).to_bytes(size, "big")
+
+
+def hide_password(password: bytes, secret: RadiusSecret, authenticator: bytes) -> bytes:
+    """User-Password hiding, RFC 2865 section 5.2"""
+    padded = password.ljust(max((len(password) + 15) // 16, 1) * 16, b"\x00")
+    if len(padded) == 16:
+        return _xor(padded, secret.md5(authenticator))
+    chunks = []
+    previous = authenticator
+    for offset in range(0, len(padded), 16):
+        previous = _xor(padded[offset:offset + 16], secret.md5(previous))
+        chunks.append(previous)
+    return b"".join(chunks)
+
+
+def unhide_password(hidden: bytes, secret: RadiusSecret, authenticator: bytes) -> bytes:
+    """Recover a hidden User-Password"""
+    chunks = []
+    previous = authenticator
+    for offset in range(0, len(hidden), 16):
+        chunk = bytes(hidden[offset:offset + 16])
+        chunks.append(_xor(chunk, secret.md5(previous)))
+        previous = chunk
+    return b"".join(chunks).rstrip(b"\x00")
+
+
+def verify_request(data: bytes, secret: RadiusSecret) -> bool:
+    """Check the authenticator of an Accounting/CoA/Disconnect-Request"""
+    if len(data) < 20:
+        return False
+    expected = hashlib.md5(bytes(data[:4]) + _ZERO_AUTHENTICATOR + bytes(data[20:]) + secret.secret).digest()
+    return hmac.compare_digest(expected, bytes(data[4:20]))
+
+
+def verify_response(data: bytes, request_authenticator: bytes, secret: RadiusSecret) -> bool:
+    """Check a reply's Response Authenticator against the request it answers"""
+    if len(data) < 20:
+        return False
+    expected = hashlib.md5(
+        bytes(data[:4]) + bytes(request_authenticator) + bytes(data[20:]) + secret.secret
+    ).digest()
+    return hmac.compare_digest(expected, bytes(data[4:20]))
+
+
+class Packet:
+    """Read-only view of a RADIUS packet with lazily indexed attributes
+
+    Nothing is copied or decoded until an attribute is asked for; the
+    first lookup walks the attribute list once and records where each
+    value starts in the received buffer (its length byte sits right
+    before it), and each ``get`` decodes only that value.
+    """
+
+    __slots__ = ("data", "_starts", "_repeated")
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]):
+        if len(data) < 20:
+            raise ValueError("packet shorter than the RADIUS header")
+        self.data = data
+        self._starts: Optional[Dict[Any, int]] = None
+        self._repeated: List[Tuple[Any, int]] = []
+
+    @property
+    def code(self) -> int:
+        return self.data[0]
+
+    @property
+    def identifier(self) -> int:
+        return self.data[1]
+
+    @property
+    def length(self) -> int:
+        return _HEADER.unpack_from(self.data)[2]
+
+    @property
+    def authenticator(self) -> bytes:
+        return bytes(self.data[4:20])
+
+    def _index(self) -> Dict[Any, int]:
+        data = self.data
+        end = min(_HEADER.unpack_from(data)[2], len(data))
+        starts: Dict[Any, int] = {}
+        repeated = self._repeated
+        offset = 20
+        while offset < end:
+            attr_type = data[offset]
+            next_offset = offset + data[offset + 1] if offset + 1 < end else end + 1
+            if next_offset < offset + 2 or next_offset > end:
+                raise ValueError("malformed attribute")
+            if attr_type == VENDOR_SPECIFIC and next_offset - offset >= 8:
+                self._index_vendor(starts, offset, next_offset)
+            elif attr_type in starts:
+                repeated.append((attr_type, offset + 2))
+            else:
+                starts[attr_type] = offset + 2
+            offset = next_offset
+        self._starts = starts
+        return starts
+
+    def _index_vendor(self, starts: Dict[Any, int], offset: int, end: int):
+        data = self.data
+        vendor = _UINT32.unpack_from(data, offset + 2)[0]
+        position = offset + 6
+        while position + 2 <= end:
+            vsa_end = position + data[position + 1]
+            if vsa_end < position + 2 or vsa_end > end:
+                break
+            key = (vendor, data[position])
+            if key in starts:
+                self._repeated.append((key, position + 2))
+            else:
+                starts[key] = position + 2
+            position = vsa_end
+
+    def _start(self, name: Union[str, int, Tuple[int, int]]) -> Optional[int]:
+        starts = self._starts
+        if starts is None:
+            starts = self._index()
+        return starts.get(DICTIONARY[name].key if name.__class__ is str else name)
+
+    def __contains__(self, name: Union[str, int, Tuple[int, int]]) -> bool:
+        return self._start(name) is not None
+
+    def offset(self, name: Union[str, int, Tuple[int, int]]) -> Optional[int]:
+        """Position of the first occurrence's value in the packet"""
+        return self._start(name)
+
+    def raw(self, name: Union[str, int, Tuple[int, int]]) -> Optional[memoryview]:
+        """Undecoded value of the first occurrence, without copying"""
+        start = self._start(name)
+        if start is None:
+            return None
+        return memoryview(self.data)[start:start + self.data[start - 1] - 2]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Decoded value of the first occurrence"""
+        definition = DICTIONARY[name]
+        starts = self._starts
+        if starts is None:
+            starts = self._index()
+        start = starts.get(definition.key)
+        if start is None:
+            return default
+        kind = definition.kind
+        if kind is INTEGER:
+            data = self.data
+            return _UINT32.unpack_from(data, start)[0] if data[start - 1] == 6 else default
+        if kind is STRING:
+            return str(self.data[start:start + self.data[start - 1] - 2], "utf-8", "replace")
+        return self._decode(definition, start, default)
+
+    def _decode(self, definition: AttributeDef, start: int, default: Any = None) -> Any:
+        data = self.data
+        size = data[start - 1] - 2
+        kind = definition.kind
+        if kind is INTEGER or kind is DATE:
+            return _UINT32.unpack_from(data, start)[0] if size == 4 else default
+        if kind is STRING:
+            return str(data[start:start + size], "utf-8", "replace")
+        if kind is IPADDR:
+            return socket.inet_ntoa(data[start:start + size]) if size == 4 else default
+        return bytes(data[start:start + size])
+
+    def get_all(self, name: str) -> List[Any]:
+        definition = DICTIONARY[name]
+        start = self._start(name)
+        if start is None:
+            return []
+        starts = [start] + [offset for key, offset in self._repeated if key == definition.key]
+        return [self._decode(definition, offset) for offset in starts]
+
+    def counter(self, name: str) -> int:
+        """64-bit counter from a 32-bit attribute and its Gigawords companion"""
+        definition = DICTIONARY[name]
+        starts = self._starts
+        if starts is None:
+            starts = self._index()
+        data = self.data
+        value = 0
+        for shift, key in ((32, definition.gigawords.key), (0, definition.key)):
+            start = starts.get(key)
+            if start is not None and data[start - 1] == 6:
+                value += _UINT32.unpack_from(data, start)[0] << shift
+        return value
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Every attribute in the dictionary, decoded"""
+        starts = self._starts if self._starts is not None else self._index()
+        result = []
+        for key, start in list(starts.items()) + self._repeated:
+            definition = BY_KEY.get(key)
+            if definition is not None:
+                result.append((definition.name, self._decode(definition, start)))
+        return result
+
+
+class PacketEncoder:
+    """Builds packets from ``(name, value)`` attribute pairs
+
+    Integers above 32 bits on counter attributes get their Gigawords
+    companion, User-Password is hidden with the request authenticator,
+    and the request/response authenticator (plus Message-Authenticator
+    when asked for) is filled in last. The secret's MD5 and HMAC state
+    is computed once per encoder, not per packet.
+    """
+
+    def __init__(self, secret: Union[str, bytes, RadiusSecret]):
+        self.secret = secret if isinstance(secret, RadiusSecret) else RadiusSecret(secret)
+
+    def encode(self, code: int, identifier: int, attributes: Iterable[Tuple[str, Any]],
+               authenticator: Optional[bytes] = None,
+               request_authenticator: Optional[bytes] = None,
+               message_authenticator: bool = False) -> bytes:
+        """Encode one packet"""
+        if code == ACCESS_REQUEST:
+            authenticator = authenticator or os.urandom(16)
+            parts = []
+            for name, value in attributes:
+                definition = DICTIONARY[name]
+                if definition is _USER_PASSWORD:
+                    value = hide_password(
+                        value.encode("utf-8") if value.__class__ is str else bytes(value),
+                        self.secret, authenticator
+                    )
+                parts.append(definition.encode(value))
+        else:
+            if code in _SIGNED_REQUESTS:
+                authenticator = _ZERO_AUTHENTICATOR
+            elif request_authenticator is None:
+                raise ValueError("responses need the request authenticator")
+            else:
+                authenticator = bytes(request_authenticator)
+            parts = [DICTIONARY[name].encode(value) for name, value in attributes]
+        if message_authenticator:
+            # First attribute, so a forged packet cannot prepend data to it (Blast-RADIUS)
+            parts.insert(0, _MESSAGE_SIGNATURE_PLACEHOLDER)
+        body = b"".join(parts)
+        if len(body) > MAX_PACKET_SIZE - 20:
+            raise ValueError("RADIUS packet exceeds 4096 bytes")
+
+        header = _HEADER.pack(code, identifier, 20 + len(body))
+        if message_authenticator:
+            # Signed over the packet as it stands, with the request (or zero) authenticator
+            body = body[:2] + self.secret.hmac(header + authenticator + body) + body[18:]
+        if code != ACCESS_REQUEST:
+            authenticator = hashlib.md5(header + authenticator + body + self.secret.secret).digest()
+        return header + authenticator + body
+
+
+def verify_message_authenticator(packet: Packet, secret: RadiusSecret,
+                                 request_authenticator: Optional[bytes] = None) -> bool:
+    """Check Message-Authenticator (RFC 3579); replies pass their request's authenticator"""
+    offset = packet.offset("Message-Authenticator")
+    if offset is None or packet.data[offset - 1] != 18:
+        return False
+    data = bytearray(packet.data[:packet.length])
+    signature = bytes(data[offset:offset + 16])
+    data[offset:offset + 16] = _ZERO_AUTHENTICATOR
+    if packet.code in _SIGNED_REQUESTS:
+        data[4:20] = _ZERO_AUTHENTICATOR
+    elif request_authenticator is not None:
+        data[4:20] = request_authenticator
+    return hmac.compare_digest(secret.hmac(bytes(data)), signature)
\ No newline at end of file
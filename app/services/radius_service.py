@@ -1,7 +1,10 @@
-import hashlib
-import struct
 import socket
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.radius_codec import (
+    ACCESS_REQUEST, ACCOUNTING_REQUEST, ACCT_INTERIM_UPDATE, ACCT_START, ACCT_STOP,
+    COA_REQUEST, DISCONNECT_REQUEST, PacketEncoder, RadiusSecret, verify_response
+)
 
 class RadiusService:
     """RADIUS Authentication Service"""
@@ -11,6 +14,8 @@ class RadiusService:
         self.port = port
         self.secret = secret.encode('utf-8')
         self.identifier = 1
+        self._secret = RadiusSecret(self.secret)
+        self._encoder = PacketEncoder(self._secret)
     
     def authenticate(self, username: str, password: str) -> bool:
         """Authenticate user via RADIUS"""
@@ -29,70 +34,32 @@ class RadiusService:
             
             # Parse response
             code = response[0]
-            return code == 2  # Access-Accept
+            return code == 2 and self.verify_response(response, packet[4:20])  # Access-Accept
             
         except Exception as e:
             print(f"RADIUS authentication error: {e}")
             return False
     
-    def _create_access_request(self, username: str, password: str) -> bytes:
-        """Create RADIUS Access-Request packet"""
-        # RADIUS packet structure
-        code = 1  # Access-Request
+    def _next_identifier(self) -> int:
         identifier = self.identifier
         self.identifier = (self.identifier + 1) % 256
-        
-        # Request Authenticator (16 random bytes)
-        authenticator = b'\x00' * 16
-        
-        # Attributes
-        attributes = b''
-        
-        # User-Name attribute (Type 1)
-        username_bytes = username.encode('utf-8')
-        attributes += struct.pack('BB', 1, len(username_bytes) + 2) + username_bytes
-        
-        # User-Password attribute (Type 2) - encrypted
-        password_encrypted = self._encrypt_password(password, authenticator)
-        attributes += struct.pack('BB', 2, len(password_encrypted) + 2) + password_encrypted
-        
-        # NAS-IP-Address attribute (Type 4)
-        nas_ip = socket.inet_aton('127.0.0.1')
-        attributes += struct.pack('BB', 4, 6) + nas_ip
-        
-        # Calculate length
-        length = 20 + len(attributes)
-        
-        # Create packet
-        packet = struct.pack('!BBH', code, identifier, length) + authenticator + attributes
-        
-        # Calculate and replace Request Authenticator
-        authenticator = hashlib.md5(packet + self.secret).digest()
-        packet = packet[:4] + authenticator + packet[20:]
-        
-        return packet
+        return identifier
     
-    def _encrypt_password(self, password: str, authenticator: bytes) -> bytes:
-        """Encrypt password for RADIUS"""
-        password_bytes = password.encode('utf-8')
-        
-        # Pad password to 16-byte boundary
-        while len(password_bytes) % 16 != 0:
-            password_bytes += b'\x00'
-        
-        encrypted = b''
-        prev = authenticator
-        
-        for i in range(0, len(password_bytes), 16):
-            chunk = password_bytes[i:i+16]
-            hash_input = self.secret + prev
-            hash_result = hashlib.md5(hash_input).digest()
-            
-            encrypted_chunk = bytes(a ^ b for a, b in zip(chunk, hash_result))
-            encrypted += encrypted_chunk
-            prev = encrypted_chunk
-        
-        return encrypted
+    def _create_access_request(self, username: str, password: str,
+                               identifier: Optional[int] = None) -> bytes:
+        """Create RADIUS Access-Request packet"""
+        if identifier is None:
+            identifier = self._next_identifier()
+        # User-Password is hidden by the encoder with the random authenticator
+        return self._encoder.encode(ACCESS_REQUEST, identifier, [
+            ("User-Name", username),
+            ("User-Password", password),
+            ("NAS-IP-Address", "127.0.0.1"),
+        ], message_authenticator=True)
+    
+    def verify_response(self, response: bytes, request_authenticator: bytes) -> bool:
+        """Check a reply's Response Authenticator against the request it answers"""
+        return verify_response(response, request_authenticator, self._secret)
     
     def accounting_start(self, username: str, session_id: str, nas_ip: str) -> bool:
         """Send accounting start packet"""
@@ -106,7 +73,7 @@ class RadiusService:
             response, addr = sock.recvfrom(1024)
             sock.close()
             
-            return response[0] == 5  # Accounting-Response
+            return response[0] == 5 and self.verify_response(response, packet[4:20])  # Accounting-Response
             
         except Exception as e:
             print(f"RADIUS accounting start error: {e}")
@@ -128,7 +95,7 @@ class RadiusService:
             response, addr = sock.recvfrom(1024)
             sock.close()
             
-            return response[0] == 5  # Accounting-Response
+            return response[0] == 5 and self.verify_response(response, packet[4:20])  # Accounting-Response
             
         except Exception as e:
             print(f"RADIUS accounting stop error: {e}")
@@ -136,46 +103,52 @@ class RadiusService:
     
     def _create_accounting_packet(self, username: str, session_id: str, nas_ip: str, 
                                 status: str, session_time: int = 0, 
-                                bytes_in: int = 0, bytes_out: int = 0) -> bytes:
+                                bytes_in: int = 0, bytes_out: int = 0,
+                                identifier: Optional[int] = None) -> bytes:
         """Create RADIUS Accounting packet"""
-        code = 4  # Accounting-Request
-        identifier = self.identifier
-        self.identifier = (self.identifier + 1) % 256
-        
-        authenticator = b'\x00' * 16
-        attributes = b''
-        
-        # User-Name attribute
-        username_bytes = username.encode('utf-8')
-        attributes += struct.pack('BB', 1, len(username_bytes) + 2) + username_bytes
-        
-        # Acct-Status-Type attribute
-        status_map = {"start": 1, "stop": 2, "update": 3}
-        attributes += struct.pack('!BBL', 40, 6, status_map.get(status, 1))
-        
-        # Acct-Session-Id attribute
-        session_bytes = session_id.encode('utf-8')
-        attributes += struct.pack('BB', 44, len(session_bytes) + 2) + session_bytes
-        
-        # NAS-IP-Address attribute
-        nas_ip_bytes = socket.inet_aton(nas_ip)
-        attributes += struct.pack('BB', 4, 6) + nas_ip_bytes
-        
-        if status == "stop":
-            # Acct-Session-Time attribute
-            attributes += struct.pack('!BBL', 46, 6, session_time)
-            
-            # Acct-Input-Octets attribute
-            attributes += struct.pack('!BBL', 42, 6, bytes_in)
-            
-            # Acct-Output-Octets attribute
-            attributes += struct.pack('!BBL', 43, 6, bytes_out)
-        
-        length = 20 + len(attributes)
-        packet = struct.pack('!BBH', code, identifier, length) + authenticator + attributes
-        
-        # Calculate Request Authenticator for accounting
-        authenticator = hashlib.md5(packet + self.secret).digest()
-        packet = packet[:4] + authenticator + packet[20:]
-        
-        return packet
\ No newline at end of file
+        if identifier is None:
+            identifier = self._next_identifier()
+        
+        status_map = {"start": ACCT_START, "stop": ACCT_STOP, "update": ACCT_INTERIM_UPDATE}
+        attributes = [
+            ("User-Name", username),
+            ("Acct-Status-Type", status_map.get(status, ACCT_START)),
+            ("Acct-Session-Id", session_id),
+            ("NAS-IP-Address", nas_ip),
+        ]
+        if status in ("stop", "update"):
+            # Octet counters above 4 GiB get Acct-Input/Output-Gigawords
+            attributes += [
+                ("Acct-Session-Time", session_time),
+                ("Acct-Input-Octets", bytes_in),
+                ("Acct-Output-Octets", bytes_out),
+            ]
+        
+        # The encoder signs the Request Authenticator
+        return self._encoder.encode(ACCOUNTING_REQUEST, identifier, attributes)
+    
+    def _create_disconnect_request(self, username: str, session_id: Optional[str] = None,
+                                   framed_ip: Optional[str] = None,
+                                   identifier: Optional[int] = None) -> bytes:
+        """Create RFC 5176 Disconnect-Request packet"""
+        return self._create_dynamic_request(DISCONNECT_REQUEST, username, session_id, framed_ip, [], identifier)
+    
+    def _create_coa_request(self, username: str, attributes: List[Tuple[str, Any]],
+                            session_id: Optional[str] = None, framed_ip: Optional[str] = None,
+                            identifier: Optional[int] = None) -> bytes:
+        """Create RFC 5176 CoA-Request packet carrying new authorization ``attributes``"""
+        return self._create_dynamic_request(COA_REQUEST, username, session_id, framed_ip, attributes, identifier)
+    
+    def _create_dynamic_request(self, code: int, username: str, session_id: Optional[str],
+                                framed_ip: Optional[str], attributes: List[Tuple[str, Any]],
+                                identifier: Optional[int]) -> bytes:
+        if identifier is None:
+            identifier = self._next_identifier()
+        
+        # Session identification: the NAS matches on every attribute given
+        session = [("User-Name", username)]
+        if session_id:
+            session.append(("Acct-Session-Id", session_id))
+        if framed_ip:
+            session.append(("Framed-IP-Address", framed_ip))
+        return self._encoder.encode(code, identifier, session + list(attributes), message_authenticator=True)
\ No newline at end of file
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+
+CacheKey = Tuple[Hashable, str]
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class SingleFlightCache:
+    """Per-device, per-command TTL cache with request coalescing
+
+    Concurrent misses for the same key share one in-flight fetch. Within
+    ``stale_ttl`` after expiry the old value is served immediately while a
+    single background fetch refreshes it. ``invalidate`` drops entries
+    after writes; a fetch that was already running when the key was
+    invalidated is neither stored nor shared with later callers, and
+    ``invalidated_at`` lets other copies of the same data (poll
+    snapshots) tell whether they predate the write.
+    """
+
+    def __init__(self, ttl: float = 10, stale_ttl: float = 30):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[CacheKey, _Entry] = {}
+        # key -> (generation the fetch started in, its future)
+        self._inflight: Dict[CacheKey, Tuple[int, asyncio.Future]] = {}
+        self._generations: Dict[CacheKey, int] = {}
+        self._invalidated: Dict[CacheKey, float] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, device_id: Hashable, command: str,
+                  fetch: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for (device_id, command) or fetch it"""
+        key = (device_id, command)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                if self._current_fetch(key) is None:
+                    self._start_fetch(key, fetch, ttl).add_done_callback(_ignore_result)
+                return entry.value
+
+        self.misses += 1
+        future = self._current_fetch(key)
+        if future is None:
+            future = self._start_fetch(key, fetch, ttl)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def _current_fetch(self, key: CacheKey) -> Optional[asyncio.Future]:
+        """The in-flight fetch for ``key``, unless it started before the last invalidation"""
+        inflight = self._inflight.get(key)
+        if inflight is None or inflight[0] != self._generations.get(key, 0):
+            return None
+        return inflight[1]
+
+    def _start_fetch(self, key: CacheKey, fetch: Callable[[], Awaitable[Any]],
+                     ttl: Optional[float]) -> asyncio.Future:
+        generation = self._generations.get(key, 0)
+        future = asyncio.ensure_future(self._fetch(key, fetch, ttl, generation))
+        self._inflight[key] = (generation, future)
+        return future
+
+    async def _fetch(self, key: CacheKey, fetch: Callable[[], Awaitable[Any]],
+                     ttl: Optional[float], generation: int) -> Any:
+        try:
+            value = await fetch()
+        finally:
+            # A newer fetch may have replaced this one after an invalidation
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] == generation:
+                del self._inflight[key]
+        if self._generations.get(key, 0) == generation:
+            now = time.monotonic()
+            fresh_until = now + (self.ttl if ttl is None else ttl)
+            self._entries[key] = _Entry(value, fresh_until, fresh_until + self.stale_ttl)
+        return value
+
+    def invalidate(self, device_id: Hashable, command: Optional[str] = None):
+        """Drop a device's entries, or only ``command`` and its ``command:*`` variants"""
+        self._invalidated[(device_id, command or "")] = time.monotonic()
+        for key in list(self._entries) + list(self._inflight):
+            key_device, key_command = key
+            if key_device != device_id:
+                continue
+            if command is None or key_command == command or key_command.startswith(command + ":"):
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidated_at(self, device_id: Hashable, command: str) -> float:
+        """Monotonic time ``command`` was last invalidated for a device, 0.0 if never"""
+        return max(
+            self._invalidated.get((device_id, ""), 0.0),
+            self._invalidated.get((device_id, command.split(":", 1)[0]), 0.0),
+            self._invalidated.get((device_id, command), 0.0),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters"""
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+def _ignore_result(future: asyncio.Future):
+    # Background refresh errors keep the stale value; retrieve them so
+    # asyncio does not log "exception was never retrieved"
+    if not future.cancelled():
+        future.exception()
+
+
+device_cache = SingleFlightCache(
+    ttl=settings.MIKROTIK_CACHE_TTL,
+    stale_ttl=settings.MIKROTIK_CACHE_STALE_TTL,
+)
\ No newline at end of file
@@ -0,0 +1,171 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.billing import BillingAccount, Payment, PaymentStatus, RevenueDaily
+
+# Invoices are what is owed; the payments settling them are the revenue
+INVOICE_METHOD = "invoice"
+UNKNOWN_PACKAGE = ""
+_BUCKETS = {
+    "daily": lambda day: day.isoformat(),
+    "weekly": lambda day: "%d-W%02d" % day.isocalendar()[:2],
+    "monthly": lambda day: day.strftime("%Y-%m"),
+    "yearly": lambda day: day.strftime("%Y"),
+}
+
+
+def counts_as_revenue(payment: Dict[str, Any]) -> bool:
+    return payment["status"] == PaymentStatus.PAID and payment["payment_method"] != INVOICE_METHOD
+
+
+def _day(payment: Dict[str, Any]) -> date:
+    return (payment.get("payment_date") or payment["created_at"]).date()
+
+
+def record_revenue(db: Session, payments: Iterable[Dict[str, Any]], sign: int = 1) -> int:
+    """Add (``sign=-1``: take back) paid payments to the daily rollup
+
+    Runs in the caller's transaction, so the rollup commits or rolls back
+    with the payment rows themselves. Payments are summed per (day,
+    method, package) first, so a batch costs one upsert per key.
+    """
+    deltas: Dict[Tuple[date, str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+    for payment in payments:
+        if not counts_as_revenue(payment):
+            continue
+        totals = deltas[(_day(payment), payment["payment_method"], payment.get("package_name") or UNKNOWN_PACKAGE)]
+        totals[0] += sign
+        totals[1] += sign * payment["amount"]
+    if not deltas:
+        return 0
+    rows = [
+        {"day": day, "payment_method": method, "package_name": package, "payments": count, "amount": amount}
+        for (day, method, package), (count, amount) in deltas.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        statement = upsert(RevenueDaily.__table__)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["day", "payment_method", "package_name"],
+                set_={
+                    "payments": RevenueDaily.__table__.c.payments + statement.excluded.payments,
+                    "amount": RevenueDaily.__table__.c.amount + statement.excluded.amount,
+                }
+            ),
+            rows
+        )
+        return len(rows)
+    # Other databases: update, then insert the keys that had no row yet
+    table = RevenueDaily.__table__
+    for row in rows:
+        updated = db.execute(
+            update(table)
+            .where(table.c.day == row["day"], table.c.payment_method == row["payment_method"],
+                   table.c.package_name == row["package_name"])
+            .values(payments=table.c.payments + row["payments"], amount=table.c.amount + row["amount"])
+        )
+        if updated.rowcount == 0:
+            db.execute(insert(table), [row])
+    return len(rows)
+
+
+def rebuild_revenue(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    """Recompute the rollup for [start, end] (default: all days) from the payments table
+
+    For backfilling and after changes made outside the application.
+    """
+    day = func.date(func.coalesce(Payment.payment_date, Payment.created_at))
+    package = func.coalesce(Payment.package_name, BillingAccount.package_name, UNKNOWN_PACKAGE)
+    source = (
+        select(day, Payment.payment_method, package, func.count(), func.sum(Payment.amount))
+        .select_from(Payment)
+        .outerjoin(BillingAccount, BillingAccount.id == Payment.billing_account_id)
+        .where(Payment.status == PaymentStatus.PAID, Payment.payment_method != INVOICE_METHOD)
+        .group_by(day, Payment.payment_method, package)
+    )
+    clear = delete(RevenueDaily)
+    if start is not None:
+        source = source.where(day >= start.isoformat())
+        clear = clear.where(RevenueDaily.day >= start)
+    if end is not None:
+        source = source.where(day <= end.isoformat())
+        clear = clear.where(RevenueDaily.day <= end)
+    rows = [
+        {
+            "day": value if isinstance(value, date) else date.fromisoformat(value),
+            "payment_method": method,
+            "package_name": package_name,
+            "payments": count,
+            "amount": amount or 0.0,
+        }
+        for value, method, package_name, count, amount in db.execute(source)
+    ]
+    db.execute(clear)
+    if rows:
+        db.execute(insert(RevenueDaily.__table__), rows)
+    db.commit()
+    return {"rows": len(rows), "payments": sum(row["payments"] for row in rows)}
+
+
+def revenue_report(db: Session, start: date, end: date, period: str = "daily") -> Dict[str, Any]:
+    """Revenue for [start, end] from the rollup: totals, per method, per package and per ``period``"""
+    in_range = and_(RevenueDaily.day >= start, RevenueDaily.day <= end)
+    payments = func.sum(RevenueDaily.payments)
+    amount = func.sum(RevenueDaily.amount)
+
+    def grouped(column) -> List[Tuple[Any, int, float]]:
+        return db.execute(
+            select(column, payments, amount).where(in_range).group_by(column).order_by(column)
+        ).all()
+
+    bucket = _BUCKETS[period]
+    breakdown: Dict[str, List[float]] = {}
+    for day, count, total in grouped(RevenueDaily.day):
+        key = bucket(day if isinstance(day, date) else date.fromisoformat(day))
+        entry = breakdown.setdefault(key, [0, 0.0])
+        entry[0] += count
+        entry[1] += total
+    total_payments = sum(entry[0] for entry in breakdown.values())
+    total_revenue = round(sum(entry[1] for entry in breakdown.values()), 2)
+    return {
+        "total_revenue": total_revenue,
+        "total_payments": total_payments,
+        "average_payment": round(total_revenue / total_payments, 2) if total_payments else 0,
+        "payment_methods": {
+            method: {"count": count, "amount": round(total, 2)}
+            for method, count, total in grouped(RevenueDaily.payment_method) if count
+        },
+        "packages": {
+            package or "unknown": {"count": count, "amount": round(total, 2)}
+            for package, count, total in grouped(RevenueDaily.package_name) if count
+        },
+        "breakdown": [
+            {"date": key, "revenue": round(total, 2), "payments": count}
+            for key, (count, total) in breakdown.items() if count
+        ],
+    }
+
+
+def report_range(period: str, start: Optional[str] = None, end: Optional[str] = None,
+                 today: Optional[date] = None) -> Tuple[date, date]:
+    """Parse YYYY-MM-DD bounds, defaulting to a span that suits ``period``"""
+    today = today or date.today()
+    end_date = date.fromisoformat(end) if end else today
+    if start:
+        return date.fromisoformat(start), end_date
+    if period == "daily":
+        return end_date.replace(day=1), end_date
+    if period == "yearly":
+        return date(end_date.year - 4, 1, 1), end_date
+    if period == "weekly":
+        return end_date - timedelta(weeks=12), end_date
+    return date(end_date.year, 1, 1), end_date
\ No newline at end of file
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lease, every worker runs the jobs
+    fcntl = None
+
+from app.core.config import settings
+
+_FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+
+
+def _parse_field(text: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"cron field {text!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """Five-field cron expression (minute hour day month weekday) in a timezone
+
+    Weekday 0 and 7 are Sunday. As in cron, when both day and weekday are
+    restricted a time matches if either does.
+    """
+
+    def __init__(self, expression: str, tz: str = "UTC"):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.tz = ZoneInfo(tz)
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(text, low, high) for text, (_, low, high) in zip(fields, _FIELDS)
+        )
+        # cron counts Sunday as 0, Python as 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = moment.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, after: datetime) -> datetime:
+        """First matching time strictly after ``after`` (aware), in UTC"""
+        moment = after.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.replace(tzinfo=self.tz).astimezone(timezone.utc)
+        raise ValueError(f"cron expression never matches: {self.expression!r}")
+
+
+class FileLease:
+    """Exclusive lock file: of all processes sharing it, one holds the lease
+
+    The lock dies with the process, so a crashed holder never blocks the
+    others; they take over on their next attempt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None and self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+class Job:
+    """One scheduled job and its recent runs"""
+
+    def __init__(self, name: str, trigger: CronTrigger, func: Callable, jitter: float = 0,
+                 max_instances: int = 1, process: bool = False, history: int = 50):
+        self.name = name
+        self.trigger = trigger
+        self.func = func
+        self.jitter = jitter
+        self.max_instances = max_instances
+        self.process = process
+        self.running = 0
+        self.next_run: Optional[datetime] = None
+        self.runs: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.skipped = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "cron": self.trigger.expression,
+            "next_run": self.next_run.astimezone(self.trigger.tz).isoformat() if self.next_run else None,
+            "running": self.running,
+            "max_instances": self.max_instances,
+            "skipped": self.skipped,
+            "runs": list(self.runs),
+        }
+
+
+class JobScheduler:
+    """Asyncio cron scheduler run from the application lifespan
+
+    Only the process holding the file lease fires jobs, so several uvicorn
+    workers on one host still run each job once; the others keep trying
+    the lease every ``lease_interval`` seconds and take over if the holder
+    exits. A job fires at most ``max_instances`` times concurrently (extra
+    fires are skipped and counted) after a random delay of up to
+    ``jitter`` seconds. Coroutine jobs run on the event loop and must
+    offload their heavy parts, e.g. with ``run_in_process``; plain
+    functions run in a thread, or with ``process=True`` in the process
+    pool, so none of them holds up API requests.
+    """
+
+    def __init__(self, timezone_name: str = "UTC", lease: Optional[FileLease] = None,
+                 process_workers: int = 2, lease_interval: float = 30):
+        self.timezone_name = timezone_name
+        self.lease = lease
+        self.process_workers = process_workers
+        self.lease_interval = lease_interval
+        self._jobs: Dict[str, Job] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._runs: Set[asyncio.Future] = set()
+
+    def add_job(self, name: str, cron: str, func: Callable, jitter: float = 0,
+                max_instances: int = 1, process: bool = False) -> Job:
+        """Register ``func`` to run on the cron schedule ``cron``"""
+        job = Job(name, CronTrigger(cron, self.timezone_name), func, jitter, max_instances, process)
+        self._jobs[name] = job
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    @property
+    def leader(self) -> bool:
+        return self.lease is None or self.lease.held
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop firing, wait for running jobs and release the lease"""
+        if self._task:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._runs:
+            await asyncio.gather(*self._runs, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self.lease is not None:
+            self.lease.release()
+
+    async def run_in_process(self, func: Callable, *args: Any) -> Any:
+        """Run a picklable function in the scheduler's process pool"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.process_workers)
+        return await asyncio.get_event_loop().run_in_executor(self._pool, func, *args)
+
+    def run_now(self, name: str) -> bool:
+        """Fire a job immediately, subject to its instance limit"""
+        return self._fire(self._jobs[name], jitter=False)
+
+    async def _run(self):
+        next_lease_attempt = 0.0
+        while not self._stopping:
+            now = datetime.now(timezone.utc)
+            if not self.leader and time.monotonic() >= next_lease_attempt:
+                next_lease_attempt = time.monotonic() + self.lease_interval
+                if self.lease.acquire():
+                    print(f"Scheduler: this process ({os.getpid()}) now runs the jobs")
+            timeout = self.lease_interval
+            for job in self._jobs.values():
+                if job.next_run is None:
+                    job.next_run = job.trigger.next_after(now)
+                if job.next_run <= now:
+                    # Missed fires (sleep, busy loop) collapse into one
+                    job.next_run = job.trigger.next_after(now)
+                    if self.leader:
+                        self._fire(job)
+                timeout = min(timeout, (job.next_run - now).total_seconds())
+            await self._sleep(max(timeout, 0.05))
+
+    async def _sleep(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _fire(self, job: Job, jitter: bool = True) -> bool:
+        if job.running >= job.max_instances:
+            job.skipped += 1
+            print(f"Scheduler: skipping {job.name}, {job.running} run(s) still in progress")
+            return False
+        job.running += 1
+        run = asyncio.ensure_future(self._execute(job, random.uniform(0, job.jitter) if jitter else 0))
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+        return True
+
+    async def _execute(self, job: Job, delay: float):
+        record: Dict[str, Any] = {"scheduled_at": datetime.now(timezone.utc).isoformat(), "status": "waiting"}
+        job.runs.append(record)
+        try:
+            if delay:
+                # Spread jobs sharing a minute, and workers sharing a database
+                await asyncio.sleep(delay)
+            record["started_at"] = datetime.now(timezone.utc).isoformat()
+            record["status"] = "running"
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(job.func):
+                    result = await job.func()
+                elif job.process:
+                    result = await self.run_in_process(job.func)
+                else:
+                    result = await asyncio.get_event_loop().run_in_executor(None, job.func)
+                record["status"] = "ok"
+                record["result"] = result
+            except Exception as e:
+                record["status"] = "error"
+                record["error"] = str(e)
+                print(f"Scheduler: job {job.name} failed: {e}")
+            record["duration"] = round(time.perf_counter() - started, 3)
+            record["finished_at"] = datetime.now(timezone.utc).isoformat()
+        finally:
+            job.running -= 1
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in self._jobs.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        """Leadership and per-job schedule and run history"""
+        return {
+            "running": self._task is not None,
+            "leader": self.leader,
+            "pid": os.getpid(),
+            "timezone": self.timezone_name,
+            "jobs": self.jobs(),
+        }
+
+
+job_scheduler = JobScheduler(
+    settings.BILLING_TIMEZONE,
+    lease=FileLease(settings.SCHEDULER_LOCK_FILE),
+    process_workers=settings.SCHEDULER_PROCESS_WORKERS,
+)
\ No newline at end of file
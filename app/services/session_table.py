@@ -0,0 +1,261 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.mikrotik_api import parse_uptime
+from app.services.radius_codec import ACCT_INTERIM_UPDATE, ACCT_START, ACCT_STOP
+
+SessionKey = Tuple[str, str]
+
+
+class ActiveSession:
+    """One online subscriber session"""
+
+    __slots__ = ("nas_ip", "session_id", "username", "framed_ip", "caller_id",
+                 "started_at", "input_octets", "output_octets", "in_bps", "out_bps",
+                 "source", "updated")
+
+    def __init__(self, nas_ip: str, session_id: str, username: str):
+        self.nas_ip = nas_ip
+        self.session_id = session_id
+        self.username = username
+        self.framed_ip: Optional[str] = None
+        self.caller_id: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.input_octets = 0
+        self.output_octets = 0
+        self.in_bps = 0
+        self.out_bps = 0
+        self.source = "accounting"
+        self.updated = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "username": self.username,
+            "session_id": self.session_id,
+            "nas_ip": self.nas_ip,
+            "framed_ip": self.framed_ip,
+            "caller_id": self.caller_id,
+            "started_at": self.started_at,
+            "input_octets": self.input_octets,
+            "output_octets": self.output_octets,
+            "in_bps": self.in_bps,
+            "out_bps": self.out_bps,
+            "source": self.source,
+            "idle": round(time.monotonic() - self.updated, 1),
+        }
+
+
+class ActiveSessionTable:
+    """Who is online, indexed by username, framed IP, NAS and session id
+
+    Fed by RADIUS accounting (Start/Interim-Update/Stop) and by the PPPoE
+    list of every fleet poll, so lookups never have to ask the routers.
+    Sessions are kept in last-update order; anything not refreshed within
+    ``ttl`` seconds (a missed Stop, a NAS that went away) is dropped from
+    the front of that order as the table is used.
+    """
+
+    def __init__(self, ttl: float = 900):
+        self.ttl = ttl
+        self._sessions: "OrderedDict[SessionKey, ActiveSession]" = OrderedDict()
+        self._by_username: Dict[str, Set[SessionKey]] = {}
+        self._by_nas: Dict[str, Set[SessionKey]] = {}
+        self._by_session_id: Dict[str, Set[SessionKey]] = {}
+        self._by_framed_ip: Dict[str, SessionKey] = {}
+        self._nas_devices: Dict[str, int] = {}
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def update_from_accounting(self, record: Any):
+        """Apply one decoded Accounting-Request"""
+        key = (record.nas_ip, record.session_id)
+        if record.status == ACCT_STOP:
+            self._remove(key)
+            return
+        if record.status not in (ACCT_START, ACCT_INTERIM_UPDATE):
+            return
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._add(key, record.username)
+            session.started_at = record.received_at - timedelta(seconds=record.session_time)
+            # Replace the entry a poll made before accounting knew the session
+            placeholder = self._sessions.get((record.nas_ip, f"ppp:{record.username}"))
+            if placeholder is not None:
+                session.caller_id = placeholder.caller_id
+                session.in_bps = placeholder.in_bps
+                session.out_bps = placeholder.out_bps
+                self._remove((placeholder.nas_ip, placeholder.session_id))
+        session.input_octets = record.input_octets
+        session.output_octets = record.output_octets
+        self._set_framed_ip(session, record.framed_ip)
+        self._touch(key, session)
+
+    def update_from_poll(self, nas_ip: str, device_id: int, rows: Iterable[Dict[str, Any]],
+                         polled_at: float):
+        """Reconcile one router's /ppp/active list
+
+        Sessions on that router missing from the list and not refreshed
+        since ``polled_at`` (monotonic time the poll started) are closed.
+        """
+        self._nas_devices[nas_ip] = device_id
+        now = datetime.utcnow()
+        for row in rows:
+            username = row["name"]
+            key = self._find(nas_ip, username)
+            session = self._sessions.get(key) if key else None
+            if session is None:
+                # Not (yet) seen in accounting: key it by login name
+                key = (nas_ip, f"ppp:{username}")
+                session = self._add(key, username)
+                session.source = "poll"
+                session.started_at = now - timedelta(seconds=parse_uptime(row.get("uptime") or "0"))
+            session.caller_id = row.get("caller_id") or session.caller_id
+            session.in_bps = row.get("in_bps", 0)
+            session.out_bps = row.get("out_bps", 0)
+            if session.source == "poll":
+                session.input_octets = row.get("bytes_in", 0)
+                session.output_octets = row.get("bytes_out", 0)
+            self._set_framed_ip(session, row.get("address") or None)
+            self._touch(key, session)
+
+        for key in list(self._by_nas.get(nas_ip, ())):
+            session = self._sessions.get(key)
+            if session is not None and session.updated < polled_at:
+                self._remove(key)
+
+    def get(self, username: str) -> List[ActiveSession]:
+        """Sessions of one subscriber"""
+        self.expire()
+        return [self._sessions[key] for key in self._by_username.get(username, ())]
+
+    def by_framed_ip(self, address: str) -> Optional[ActiveSession]:
+        self.expire()
+        key = self._by_framed_ip.get(address)
+        return self._sessions[key] if key else None
+
+    def sessions(self, username: Optional[str] = None, nas_ip: Optional[str] = None,
+                 framed_ip: Optional[str] = None, session_id: Optional[str] = None,
+                 device_id: Optional[int] = None) -> List[ActiveSession]:
+        """Sessions matching every given filter, narrowed through the most selective index"""
+        self.expire()
+        if device_id is not None and nas_ip is None:
+            nas_ip = next((ip for ip, device in self._nas_devices.items() if device == device_id), None)
+            if nas_ip is None:
+                return []
+        if framed_ip is not None:
+            key = self._by_framed_ip.get(framed_ip)
+            keys: Iterable[SessionKey] = (key,) if key else ()
+        elif session_id is not None:
+            keys = self._by_session_id.get(session_id, ())
+        elif username is not None:
+            keys = self._by_username.get(username, ())
+        elif nas_ip is not None:
+            keys = self._by_nas.get(nas_ip, ())
+        else:
+            keys = self._sessions.keys()
+
+        result = []
+        for key in keys:
+            session = self._sessions[key]
+            if username is not None and session.username != username:
+                continue
+            if nas_ip is not None and session.nas_ip != nas_ip:
+                continue
+            if session_id is not None and session.session_id != session_id:
+                continue
+            if device_id is not None and self._nas_devices.get(session.nas_ip) != device_id:
+                continue
+            result.append(session)
+        return result
+
+    def session_dict(self, session: ActiveSession) -> Dict[str, Any]:
+        """Session fields, with the device resolved from its NAS address"""
+        fields = session.to_dict()
+        fields["device_id"] = self._nas_devices.get(session.nas_ip)
+        return fields
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop sessions not refreshed within ``ttl``"""
+        if now is None:
+            now = time.monotonic()
+        removed = 0
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.updated < self.ttl:
+                break
+            self._remove(key)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def clear(self):
+        self._sessions.clear()
+        self._by_username.clear()
+        self._by_nas.clear()
+        self._by_session_id.clear()
+        self._by_framed_ip.clear()
+        self._nas_devices.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Table size and index counts"""
+        self.expire()
+        return {
+            "sessions": len(self._sessions),
+            "subscribers": len(self._by_username),
+            "nas": len(self._by_nas),
+            "expired": self.expired,
+        }
+
+    def _find(self, nas_ip: str, username: str) -> Optional[SessionKey]:
+        for key in self._by_username.get(username, ()):
+            if key[0] == nas_ip:
+                return key
+        return None
+
+    def _add(self, key: SessionKey, username: str) -> ActiveSession:
+        session = ActiveSession(key[0], key[1], username)
+        self._sessions[key] = session
+        self._by_username.setdefault(username, set()).add(key)
+        self._by_nas.setdefault(key[0], set()).add(key)
+        self._by_session_id.setdefault(key[1], set()).add(key)
+        return session
+
+    def _touch(self, key: SessionKey, session: ActiveSession):
+        session.updated = time.monotonic()
+        self._sessions.move_to_end(key)
+        self.expire(session.updated)
+
+    def _set_framed_ip(self, session: ActiveSession, address: Optional[str]):
+        if address == session.framed_ip or address is None:
+            return
+        key = (session.nas_ip, session.session_id)
+        if session.framed_ip is not None and self._by_framed_ip.get(session.framed_ip) == key:
+            del self._by_framed_ip[session.framed_ip]
+        previous = self._by_framed_ip.get(address)
+        if previous is not None and previous != key:
+            # The address was handed out again: the old holder no longer has it
+            self._sessions[previous].framed_ip = None
+        self._by_framed_ip[address] = key
+        session.framed_ip = address
+
+    def _remove(self, key: SessionKey):
+        session = self._sessions.pop(key, None)
+        if session is None:
+            return
+        for index, value in ((self._by_username, session.username), (self._by_nas, session.nas_ip),
+                             (self._by_session_id, session.session_id)):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+        if session.framed_ip is not None and self._by_framed_ip.get(session.framed_ip) == key:
+            del self._by_framed_ip[session.framed_ip]
+
+
+session_table = ActiveSessionTable(ttl=settings.RADIUS_SESSION_TTL)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import asyncio
+import enum
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.billing import BillingAccount
+from app.models.radius import RadiusUser
+from app.services.mikrotik_pool import device_field
+
+
+def _status(value: Any) -> Optional[str]:
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def load_subscriber_rows() -> Tuple[List[Any], List[Any]]:
+    """What the index reads of every RadiusUser and BillingAccount"""
+    db = SessionLocal()
+    try:
+        users = db.execute(select(
+            RadiusUser.username, RadiusUser.password, RadiusUser.group_name, RadiusUser.is_active,
+            RadiusUser.billing_account_id
+        )).all()
+        accounts = db.execute(select(
+            BillingAccount.id, BillingAccount.username, BillingAccount.status, BillingAccount.bandwidth_profile
+        )).all()
+        return users, accounts
+    finally:
+        db.close()
+
+
+class Subscriber:
+    """What the RADIUS responder needs to know about one login"""
+
+    __slots__ = ("username", "password", "group_name", "is_active", "account_id",
+                 "account_status", "bandwidth_profile")
+
+    def __init__(self, username: str, password: Optional[str] = None, group_name: Optional[str] = None,
+                 is_active: bool = True, account_id: Optional[int] = None):
+        self.username = username
+        self.password = password
+        self.group_name = group_name
+        self.is_active = is_active
+        self.account_id = account_id
+        self.account_status: Optional[str] = None
+        self.bandwidth_profile: Optional[str] = None
+
+    @property
+    def isolated(self) -> bool:
+        return self.account_status == "suspended"
+
+    @property
+    def allowed(self) -> bool:
+        return self.is_active and self.account_status != "terminated"
+
+
+class SubscriberIndex:
+    """In-memory view of RadiusUser and BillingAccount rows keyed by username
+
+    Built once with ``load`` (``start``: from ``source``, the database)
+    and then kept current by ``update_user`` / ``update_account`` /
+    ``set_account_status`` as rows change, so the authentication path
+    never touches the database. Rows may be dicts, ORM objects or result
+    rows.
+    """
+
+    def __init__(self):
+        self.source: Optional[Callable[[], Tuple[Iterable[Any], Iterable[Any]]]] = None
+        self._subscribers: Dict[str, Subscriber] = {}
+        self._accounts: Dict[Any, Dict[str, Any]] = {}
+        self._account_ids: Dict[str, Any] = {}
+        self._logins: Dict[Any, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def get(self, username: str) -> Optional[Subscriber]:
+        return self._subscribers.get(username)
+
+    def load(self, users: Iterable[Any], accounts: Iterable[Any]):
+        """Rebuild the index from full user and account lists"""
+        self._subscribers = {}
+        self._accounts = {}
+        self._account_ids = {}
+        self._logins = defaultdict(set)
+        for account in accounts:
+            self.update_account(account)
+        for user in users:
+            self.update_user(user)
+
+    async def start(self):
+        """Load the index from ``source`` in a worker thread"""
+        if self.source is None:
+            return
+        try:
+            users, accounts = await asyncio.get_event_loop().run_in_executor(None, self.source)
+        except Exception as e:
+            print(f"Subscriber index: cannot load from source: {e}")
+            return
+        self.load(users, accounts)
+
+    def update_user(self, user: Any):
+        """Add or refresh one RadiusUser"""
+        username = device_field(user, "username")
+        subscriber = self._subscribers.get(username)
+        if subscriber is None:
+            subscriber = Subscriber(username)
+            self._subscribers[username] = subscriber
+        password = device_field(user, "password")
+        if password is not None:
+            subscriber.password = password
+        subscriber.group_name = device_field(user, "group_name")
+        subscriber.is_active = bool(device_field(user, "is_active", True))
+        self._logins[subscriber.account_id].discard(username)
+        subscriber.account_id = device_field(user, "billing_account_id")
+        self._logins[subscriber.account_id].add(username)
+        account = self._accounts.get(subscriber.account_id)
+        if account is None and subscriber.account_id is None:
+            account = self._accounts.get(self._account_ids.get(username))
+        if account:
+            subscriber.account_status = account["status"]
+            subscriber.bandwidth_profile = account["bandwidth_profile"]
+
+    def update_account(self, account: Any):
+        """Add or refresh one BillingAccount"""
+        fields = {
+            "username": device_field(account, "username"),
+            "status": _status(device_field(account, "status")),
+            "bandwidth_profile": device_field(account, "bandwidth_profile"),
+        }
+        account_id = device_field(account, "id")
+        self._accounts[account_id] = fields
+        self._account_ids[fields["username"]] = account_id
+        self._apply(account_id, fields)
+
+    def set_account_status(self, username: str, status: Any):
+        """Record a status change for the account behind ``username``"""
+        account_id = self._account_ids.get(username)
+        fields = self._accounts.get(account_id)
+        if fields is None:
+            fields = {"username": username, "status": None, "bandwidth_profile": None}
+        fields["status"] = _status(status)
+        self._apply(account_id, fields)
+
+    def remove_user(self, username: str):
+        subscriber = self._subscribers.pop(username, None)
+        if subscriber:
+            self._logins[subscriber.account_id].discard(username)
+
+    def _apply(self, account_id: Any, fields: Dict[str, Any]):
+        # Logins linked by billing_account_id, or by username if unlinked
+        usernames = set(self._logins.get(account_id, ())) if account_id is not None else set()
+        subscriber = self._subscribers.get(fields["username"])
+        if subscriber and subscriber.account_id is None:
+            usernames.add(subscriber.username)
+        for username in usernames:
+            subscriber = self._subscribers[username]
+            subscriber.account_status = fields["status"]
+            subscriber.bandwidth_profile = fields["bandwidth_profile"]
+
+    def stats(self) -> Dict[str, int]:
+        """Subscriber counts"""
+        subscribers = list(self._subscribers.values())
+        return {
+            "subscribers": len(subscribers),
+            "active": sum(1 for s in subscribers if s.allowed and not s.isolated),
+            "isolated": sum(1 for s in subscribers if s.allowed and s.isolated),
+            "disabled": sum(1 for s in subscribers if not s.allowed),
+        }
+
+
+subscriber_index = SubscriberIndex()
+subscriber_index.source = load_subscriber_rows
\ No newline at end of file
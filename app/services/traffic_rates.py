@@ -0,0 +1,192 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import insert
+
+from app.database import SessionLocal
+from app.models.billing import TrafficData
+
+# Per-row flags (bitmask) reported with every delta
+FLAG_NEW = 1      # first sample for this counter, no delta yet
+FLAG_WRAP = 2     # counter wrapped around its width
+FLAG_RESET = 4    # counter restarted: reboot, re-dial or cleared counters
+
+
+class CounterDeltas:
+    """Deltas and rates for one batch of counter samples"""
+
+    __slots__ = ("keys", "columns", "deltas", "rates", "intervals", "flags")
+
+    def __init__(self, keys: Sequence[str], columns: Sequence[str], deltas: np.ndarray,
+                 rates: np.ndarray, intervals: np.ndarray, flags: np.ndarray):
+        self.keys = keys
+        self.columns = columns
+        self.deltas = deltas
+        self.rates = rates
+        self.intervals = intervals
+        self.flags = flags
+
+    def rate_map(self, suffix: str = "_bps") -> Dict[str, Dict[str, float]]:
+        """Rates keyed by counter key, e.g. {"ether1": {"rx_bps": ..}}"""
+        names = [column + suffix for column in self.columns]
+        rates = self.rates.tolist()
+        return {key: dict(zip(names, row)) for key, row in zip(self.keys, rates)}
+
+
+class CounterDeltaEngine:
+    """Vectorized delta and rate engine for cumulative byte counters
+
+    ``update`` takes the latest sample of thousands of counters at once
+    (one row per key, one column per counter) and returns per-interval
+    deltas and bits-per-second rates. A counter that went down is treated
+    as a wrap when that is plausible for ``counter_bits`` and
+    ``max_rate``, otherwise as a reset; rows whose ``epochs`` value moved
+    (boot time, session start) are always resets. After a reset the new
+    value itself is the delta, since the counter restarted from zero.
+    """
+
+    def __init__(self, columns: Sequence[str], counter_bits: int = 64,
+                 max_rate: float = 100e9, epoch_tolerance: float = 10.0):
+        self.columns = list(columns)
+        self.counter_bits = counter_bits
+        self.max_rate = max_rate
+        self.epoch_tolerance = epoch_tolerance
+        self._index: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._used = 0
+        self._values = np.zeros((0, len(self.columns)), dtype=np.uint64)
+        self._times = np.zeros(0, dtype=np.float64)
+        self._epochs = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self) -> List[str]:
+        """Counters currently tracked"""
+        return list(self._index)
+
+    def _rows_for(self, keys: Sequence[str]) -> np.ndarray:
+        """Map keys to state rows, allocating rows for new keys"""
+        index = self._index
+        for key in keys:
+            if key not in index:
+                if self._free:
+                    index[key] = self._free.pop()
+                else:
+                    index[key] = self._used
+                    self._used += 1
+        if self._used > len(self._times):
+            grow = max(self._used, 2 * len(self._times)) - len(self._times)
+            self._values = np.vstack([self._values, np.zeros((grow, len(self.columns)), dtype=np.uint64)])
+            self._times = np.concatenate([self._times, np.full(grow, np.nan)])
+            self._epochs = np.concatenate([self._epochs, np.full(grow, np.nan)])
+        return np.fromiter((index[key] for key in keys), dtype=np.intp, count=len(keys))
+
+    def update(self, keys: Sequence[str], values, timestamp: float,
+               epochs: Optional[Sequence[float]] = None) -> CounterDeltas:
+        """Feed the latest counter values and get deltas since the previous sample"""
+        rows = self._rows_for(keys)
+        current = np.asarray(values, dtype=np.uint64).reshape(len(keys), len(self.columns))
+        previous = self._values[rows]
+        previous_times = self._times[rows]
+
+        intervals = timestamp - previous_times
+        is_new = np.isnan(previous_times)
+        intervals[is_new] = 0.0
+
+        # uint64 subtraction is modulo 2**64, which is exactly the 64-bit wrap delta
+        deltas = current - previous
+        if self.counter_bits < 64:
+            deltas &= np.uint64((1 << self.counter_bits) - 1)
+
+        went_down = current < previous
+        limit = np.maximum(intervals, 1.0) * (self.max_rate / 8)
+        plausible_wrap = went_down & (deltas.astype(np.float64) <= limit[:, None])
+        if self.counter_bits < 64:
+            plausible_wrap &= previous < np.uint64(1 << self.counter_bits)
+        reset_rows = (went_down & ~plausible_wrap).any(axis=1)
+
+        if epochs is not None:
+            new_epochs = np.asarray(epochs, dtype=np.float64)
+            moved = np.abs(new_epochs - self._epochs[rows]) > self.epoch_tolerance
+            reset_rows |= moved & ~is_new
+            self._epochs[rows] = new_epochs
+
+        deltas[reset_rows] = current[reset_rows]
+        deltas[is_new] = 0
+
+        flags = np.zeros(len(keys), dtype=np.uint8)
+        flags[plausible_wrap.any(axis=1) & ~reset_rows] |= FLAG_WRAP
+        flags[reset_rows & ~is_new] |= FLAG_RESET
+        flags[is_new] = FLAG_NEW
+
+        signed = deltas.astype(np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.where(intervals[:, None] > 0, signed * 8.0 / intervals[:, None], 0.0)
+
+        self._values[rows] = current
+        self._times[rows] = timestamp
+        return CounterDeltas(keys, self.columns, signed, rates, intervals, flags)
+
+    def forget(self, keys: Sequence[str]):
+        """Drop state for counters that no longer exist"""
+        for key in keys:
+            row = self._index.pop(key, None)
+            if row is not None:
+                self._values[row] = 0
+                self._times[row] = np.nan
+                self._epochs[row] = np.nan
+                self._free.append(row)
+        if len(self._free) > 1024 and len(self._free) * 2 > self._used:
+            self._compact()
+
+    def _compact(self):
+        keys = list(self._index)
+        rows = np.fromiter(self._index.values(), dtype=np.intp, count=len(keys))
+        self._values = self._values[rows]
+        self._times = self._times[rows]
+        self._epochs = self._epochs[rows]
+        self._index = {key: i for i, key in enumerate(keys)}
+        self._free = []
+        self._used = len(keys)
+
+
+def traffic_records(deltas: CounterDeltas, device_id: Optional[int],
+                    recorded_at: datetime) -> List[Dict]:
+    """Turn PPPoE session deltas into TrafficData rows
+
+    Columns are expected as (bytes_in, bytes_out) from the router's point
+    of view, so the subscriber's rx is bytes_out and tx is bytes_in.
+    """
+    date_only = recorded_at.strftime("%Y-%m-%d")
+    records = []
+    for key, (bytes_in, bytes_out), interval, flag in zip(
+        deltas.keys, deltas.deltas.tolist(), deltas.intervals.tolist(), deltas.flags.tolist()
+    ):
+        if flag & FLAG_NEW or not (bytes_in or bytes_out):
+            continue
+        records.append({
+            "mikrotik_device_id": device_id,
+            "username": key,
+            "rx_bytes": bytes_out,
+            "tx_bytes": bytes_in,
+            "total_bytes": bytes_in + bytes_out,
+            "session_time": int(interval),
+            "recorded_at": recorded_at,
+            "date_only": date_only
+        })
+    return records
+
+
+
+def store_traffic_records(records: List[Dict]):
+    """Bulk insert TrafficData rows in one transaction"""
+    if not records:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(insert(TrafficData), records)
+        db.commit()
+    finally:
+        db.close()
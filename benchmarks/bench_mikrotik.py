@@ -0,0 +1,149 @@
+"""RouterOS API client benchmarks against the local emulator
+
+Measures, without any hardware:
+
+* codec: sentences/sec for encode_sentence and SentenceDecoder
+* print: rows/sec for a large /ppp/active print, async and blocking clients
+* fleet: wall time of a FleetPoller cycle over N emulated routers
+* memory: bytes per 10k PPPoE sessions held by the client and the poller
+
+    python -m benchmarks.bench_mikrotik --sessions 10000 --devices 50 --device-sessions 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from app.services.mikrotik_api import MikroTikAPI, SentenceDecoder, encode_sentence
+from app.services.mikrotik_async import AsyncMikroTikAPI
+from app.services.mikrotik_poller import FleetPoller
+from app.services.mikrotik_pool import MikroTikPool
+from benchmarks.routeros_emulator import EmulatedRouter, RouterOSEmulator
+
+SAMPLE_ROW = [
+    "!re", "=.id=*1A2B", "=name=user12345", "=service=pppoe", "=caller-id=4C:5E:0C:01:02:03",
+    "=address=10.0.48.57", "=uptime=2d3h4m5s", "=bytes-in=123456789", "=bytes-out=9876543210", ".tag=7"
+]
+
+
+def bench_codec(count: int):
+    started = time.perf_counter()
+    for _ in range(count):
+        encode_sentence(SAMPLE_ROW)
+    encode_rate = count / (time.perf_counter() - started)
+
+    data = encode_sentence(SAMPLE_ROW) * count
+    decoder = SentenceDecoder()
+    decoded = 0
+    started = time.perf_counter()
+    for offset in range(0, len(data), 65536):
+        decoder.feed(data[offset:offset + 65536])
+        for _ in decoder.sentences():
+            decoded += 1
+    decode_rate = decoded / (time.perf_counter() - started)
+
+    print(f"codec: encode {encode_rate:,.0f} sentences/s, decode {decode_rate:,.0f} sentences/s")
+
+
+async def bench_print(sessions: int, rounds: int):
+    router = EmulatedRouter(sessions=sessions, seed=1)
+    await router.start()
+
+    api = AsyncMikroTikAPI("127.0.0.1", router.port, timeout=60)
+    await api.connect("admin", "")
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        rows = await api.get_pppoe_sessions()
+        timings.append(time.perf_counter() - started)
+    await api.disconnect()
+    print(f"print (async): {len(rows):,} sessions in {statistics.median(timings) * 1000:.1f} ms, "
+          f"{len(rows) / statistics.median(timings):,.0f} rows/s")
+
+    def blocking():
+        client = MikroTikAPI("127.0.0.1", router.port, timeout=60)
+        client.connect("admin", "")
+        result = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            client.get_pppoe_sessions()
+            result.append(time.perf_counter() - started)
+        client.disconnect()
+        return result
+
+    timings = await asyncio.get_event_loop().run_in_executor(None, blocking)
+    print(f"print (sync):  {sessions:,} sessions in {statistics.median(timings) * 1000:.1f} ms, "
+          f"{sessions / statistics.median(timings):,.0f} rows/s")
+    await router.close()
+
+
+async def bench_fleet(devices: int, device_sessions: int, latency: float, loss: float, cycles: int):
+    emulator = RouterOSEmulator(devices, sessions=device_sessions, latency=latency, loss=loss, seed=1)
+    await emulator.start()
+    pool = MikroTikPool(max_sessions=1, timeout=30)
+    poller = FleetPoller(pool, concurrency=devices, device_timeout=30, cycle_timeout=120)
+    poller._device_source = emulator.devices
+
+    cold = await poller.poll_once()
+    warm = [(await poller.poll_once())["duration"] for _ in range(cycles)]
+    print(f"fleet: {devices} devices x {device_sessions} sessions, latency {latency * 1000:.0f} ms, "
+          f"loss {loss:.1%}: cold cycle {cold['duration'] * 1000:.0f} ms, "
+          f"warm cycle {statistics.median(warm) * 1000:.0f} ms median, "
+          f"{cold['succeeded']}/{devices} ok")
+
+    await pool.close()
+    await emulator.close()
+
+
+async def bench_memory(sessions: int):
+    router = EmulatedRouter(sessions=sessions, seed=1)
+    await router.start()
+    device = router.device(1)
+    per_10k = 10000 / sessions
+
+    api = AsyncMikroTikAPI("127.0.0.1", router.port, timeout=60)
+    await api.connect("admin", "")
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    rows = await api.get_pppoe_sessions()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await api.disconnect()
+    print(f"memory (client): {(retained - baseline) * per_10k / 1e6:.1f} MB retained, "
+          f"{(peak - baseline) * per_10k / 1e6:.1f} MB peak per 10k sessions ({len(rows):,} fetched)")
+    del rows
+
+    pool = MikroTikPool(max_sessions=1, timeout=60)
+    poller = FleetPoller(pool)
+    poller._device_source = lambda: [device]
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await poller.poll_once()
+    await poller.poll_once()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory (poller): {(retained - baseline) * per_10k / 1e6:.1f} MB retained, "
+          f"{(peak - baseline) * per_10k / 1e6:.1f} MB peak per 10k sessions")
+
+    await pool.close()
+    await router.close()
+
+
+async def main(args: argparse.Namespace):
+    bench_codec(args.sentences)
+    await bench_print(args.sessions, args.rounds)
+    await bench_fleet(args.devices, args.device_sessions, args.latency, args.loss, args.rounds)
+    await bench_memory(args.sessions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=200000, help="sentences for the codec benchmark")
+    parser.add_argument("--sessions", type=int, default=10000, help="PPPoE sessions for print/memory")
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--device-sessions", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""Overdue isolation benchmark: BillingService.process_overdue_accounts at scale
+
+Fills a throwaway SQLite database with ``--accounts`` billing accounts, a
+``--overdue`` fraction of them active and past due, and isolates them with
+the chunked, index-backed process_overdue_accounts. For comparison the
+same work is done on a copy of the database the way the service used to:
+walk every account in Python, parse its due date, suspend it row by row
+in one long transaction.
+
+    python -m benchmarks.bench_overdue --accounts 1000000 --overdue 0.05
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from app.models.billing import BillingAccount, BillingStatus
+from app.services.billing_service import BillingService
+
+
+def populate(engine, accounts: int, overdue: float, now: datetime):
+    BillingAccount.__table__.create(engine)
+    rng = random.Random(42)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(accounts):
+            if rng.random() < overdue:
+                status, due_date = BillingStatus.ACTIVE, now - timedelta(days=rng.randint(1, 60))
+            else:
+                status = BillingStatus.ACTIVE if rng.random() < 0.9 else BillingStatus.SUSPENDED
+                due_date = now + timedelta(days=rng.randint(0, 30), hours=1)
+                if status == BillingStatus.SUSPENDED:
+                    due_date -= timedelta(days=45)
+            batch.append({
+                "username": f"user{i:07d}",
+                "full_name": f"Customer {i}",
+                "email": f"user{i}@example.com",
+                "package_name": "Basic 25Mbps",
+                "package_price": 200000.0,
+                "bandwidth_profile": "25M/25M",
+                "status": status,
+                "due_date": due_date,
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(batch) == 50000:
+                conn.execute(insert(BillingAccount), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(BillingAccount), batch)
+
+
+def naive_process(engine, now: datetime) -> int:
+    """The old approach: every account through Python, one UPDATE per isolation"""
+    isolated = 0
+    with Session(engine) as db:
+        rows = db.execute(select(BillingAccount.id, BillingAccount.due_date, BillingAccount.status)).all()
+        for account_id, due_date, status in rows:
+            if datetime.fromisoformat(due_date.isoformat()) < now and status == BillingStatus.ACTIVE:
+                db.execute(
+                    update(BillingAccount).where(BillingAccount.id == account_id)
+                    .values(status=BillingStatus.SUSPENDED)
+                )
+                isolated += 1
+        db.commit()
+    return isolated
+
+
+def main(args: argparse.Namespace):
+    now = datetime.now()
+    directory = tempfile.mkdtemp(prefix="bench_overdue_")
+    path = os.path.join(directory, "accounts.db")
+    try:
+        engine = create_engine(f"sqlite:///{path}")
+        started = time.perf_counter()
+        populate(engine, args.accounts, args.overdue, now)
+        print(f"populated {args.accounts:,} accounts in {time.perf_counter() - started:.1f}s")
+        if args.naive:
+            shutil.copy(path, path + ".naive")
+
+        with Session(engine) as db:
+            service = BillingService(db)
+            candidates = (
+                select(BillingAccount.id)
+                .where(BillingAccount.status == BillingStatus.ACTIVE, BillingAccount.due_date < now)
+                .order_by(BillingAccount.due_date)
+            )
+            plan = db.execute(
+                text("EXPLAIN QUERY PLAN " + str(candidates.compile(engine, compile_kwargs={"literal_binds": True})))
+            ).all()
+            print("candidate query plan:", "; ".join(row[-1] for row in plan))
+
+            started = time.perf_counter()
+            isolated = service.process_overdue_accounts(now=now, chunk_size=args.chunk)
+            elapsed = time.perf_counter() - started
+        chunks = -(-len(isolated) // args.chunk)
+        print(f"set-based: isolated {len(isolated):,} in {elapsed:.2f}s "
+              f"({chunks} chunks of {args.chunk}, {len(isolated) / elapsed:,.0f} accounts/s)")
+        engine.dispose()
+
+        if args.naive:
+            naive_engine = create_engine(f"sqlite:///{path}.naive")
+            started = time.perf_counter()
+            count = naive_process(naive_engine, now)
+            naive = time.perf_counter() - started
+            naive_engine.dispose()
+            print(f"row by row: isolated {count:,} in {naive:.2f}s (one transaction)")
+            print(f"  speedup {naive / elapsed:.1f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=1000000)
+    parser.add_argument("--overdue", type=float, default=0.05)
+    parser.add_argument("--chunk", type=int, default=5000)
+    parser.add_argument("--no-naive", dest="naive", action="store_false",
+                        help="skip the row-by-row comparison")
+    main(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Quota engine benchmark: fair-usage accounting for a large subscriber base
+
+Indexes ``--subscribers`` subscribers on one FUP policy and feeds
+``--updates`` interim updates per subscriber through QuotaEngine.add,
+sized so that ``--over`` of them cross their quota on the last update.
+Reports deltas per second, the time one interim-update interval's worth
+of deltas takes and how many throttles were issued.
+
+    python -m benchmarks.bench_quota --subscribers 100000 --updates 10
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import List
+
+from app.services.quota_engine import GB, QuotaEngine
+from app.services.subscriber_index import SubscriberIndex
+
+
+class CountingDispatcher:
+    def __init__(self):
+        self.changed: List[str] = []
+
+    def account_changed(self, username: str) -> int:
+        self.changed.append(username)
+        return 1
+
+
+def main(args: argparse.Namespace):
+    usernames = [f"user{i:07d}" for i in range(args.subscribers)]
+    index = SubscriberIndex()
+    index.load(
+        [{"username": name, "password": "secret", "is_active": True} for name in usernames],
+        [{"id": i, "username": name, "status": "active", "bandwidth_profile": "20M/20M"}
+         for i, name in enumerate(usernames)],
+    )
+    dispatcher = CountingDispatcher()
+    engine = QuotaEngine(
+        {"20M/20M": {"quota_gb": 100, "rate_limit": "2M/2M"}}, index=index, dispatcher=dispatcher
+    )
+    heavy = set(usernames[:int(args.subscribers * args.over)])
+    light_delta = 100 * GB // (args.updates + 1)
+    heavy_delta = 100 * GB // args.updates
+    now = datetime.utcnow()
+    slowest = 0.0
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        interval_started = time.perf_counter()
+        for name in usernames:
+            engine.add(name, heavy_delta if name in heavy else light_delta, now)
+        slowest = max(slowest, time.perf_counter() - interval_started)
+    elapsed = time.perf_counter() - started
+    deltas = args.subscribers * args.updates
+    print(f"{deltas:,} deltas in {elapsed:.2f}s, {deltas / elapsed:,.0f} deltas/s")
+    print(f"slowest interim-update interval ({args.subscribers:,} deltas): {slowest * 1000:.0f} ms")
+    print(f"throttled {len(dispatcher.changed):,} subscribers (expected {len(heavy):,})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--over", type=float, default=0.05)
+    main(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""RADIUS client load test: thousands of requests through AsyncRadiusClient
+
+Without ``--server`` a local responder answers every Access-Request with
+Access-Accept and every Accounting-Request with Accounting-Response,
+dropping ``--drop`` of the requests to exercise retransmission. With
+``--server`` the load goes to a real RADIUS server (e.g. FreeRADIUS),
+whose clients.conf must list this host with ``--secret``.
+
+    python -m benchmarks.bench_radius_client --requests 20000 --drop 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import socket
+import struct
+import time
+
+from app.services.radius_client import AsyncRadiusClient
+
+
+class Responder(asyncio.DatagramProtocol):
+    """Minimal RADIUS server: accept everything, answer with a valid authenticator"""
+
+    def __init__(self, secret: bytes, drop: float):
+        self.secret = secret
+        self.drop = drop
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+
+    def datagram_received(self, data: bytes, addr):
+        if random.random() < self.drop:
+            return
+        code = 2 if data[0] == 1 else 5
+        header = struct.pack("!BBH", code, data[1], 20)
+        authenticator = hashlib.md5(header + data[4:20] + self.secret).digest()
+        self.transport.sendto(header + authenticator, addr)
+
+
+async def main(args: argparse.Namespace):
+    loop = asyncio.get_event_loop()
+    responders = []
+    server, auth_port, acct_port = args.server, args.auth_port, args.acct_port
+    if server is None:
+        server = "127.0.0.1"
+        for _ in range(2):
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: Responder(args.secret.encode(), args.drop), local_addr=(server, 0)
+            )
+            responders.append(transport)
+        auth_port = responders[0].get_extra_info("sockname")[1]
+        acct_port = responders[1].get_extra_info("sockname")[1]
+
+    client = AsyncRadiusClient(
+        server, args.secret, auth_port, acct_port,
+        sockets=args.sockets, timeout=args.timeout, retries=args.retries
+    )
+    async with client:
+        started = time.perf_counter()
+        results = await client.authenticate_many(
+            (f"user{i}", "password") for i in range(args.requests)
+        )
+        elapsed = time.perf_counter() - started
+        print(f"auth: {args.requests:,} requests in {elapsed:.2f} s, "
+              f"{args.requests / elapsed:,.0f} req/s, {sum(r is True for r in results):,} accepted")
+
+        started = time.perf_counter()
+        results = await client.accounting_many(
+            {
+                "username": f"user{i}",
+                "session_id": f"{i:08x}",
+                "nas_ip": "10.0.0.1",
+                "status": "stop",
+                "session_time": 3600,
+                "bytes_in": 1000000,
+                "bytes_out": 5000000
+            }
+            for i in range(args.requests)
+        )
+        elapsed = time.perf_counter() - started
+        print(f"acct: {args.requests:,} requests in {elapsed:.2f} s, "
+              f"{args.requests / elapsed:,.0f} req/s, {sum(r is True for r in results):,} acknowledged")
+        print(client.stats())
+
+    for transport in responders:
+        transport.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--server", default=None, help="RADIUS server; default is a local responder")
+    parser.add_argument("--auth-port", type=int, default=1812)
+    parser.add_argument("--acct-port", type=int, default=1813)
+    parser.add_argument("--secret", default="testing123")
+    parser.add_argument("--sockets", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--drop", type=float, default=0.0, help="fraction dropped by the local responder")
+    asyncio.run(main(parser.parse_args()))
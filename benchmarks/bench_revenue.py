@@ -0,0 +1,107 @@
+"""Revenue report benchmark: daily rollup versus aggregating the payments table
+
+Fills a throwaway SQLite database with ``--payments`` paid payments spread
+over ``--years`` years, several payment methods and packages, builds the
+RevenueDaily rollup from them, then answers a yearly billing report
+covering every year both from the rollup and by grouping the payments
+table directly, the way a rollup-less report would.
+
+    python -m benchmarks.bench_revenue --payments 1000000 --years 3
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.billing import BillingAccount, Payment, PaymentStatus, RevenueDaily
+from app.services.revenue_ledger import INVOICE_METHOD, rebuild_revenue, revenue_report
+
+METHODS = ("bank_transfer", "cash", "ovo", "gopay", "dana")
+PACKAGES = ("Basic 10Mbps", "Basic 25Mbps", "Premium 50Mbps", "Premium 100Mbps", "Business 200Mbps")
+
+
+def populate(engine, payments: int, first_day: date, days: int):
+    BillingAccount.__table__.create(engine)
+    Payment.__table__.create(engine)
+    RevenueDaily.__table__.create(engine)
+    rng = random.Random(5)
+    batch = []
+    with engine.begin() as conn:
+        for _ in range(payments):
+            paid_at = datetime.combine(first_day, datetime.min.time()) + timedelta(
+                days=rng.randrange(days), seconds=rng.randrange(86400)
+            )
+            batch.append({
+                "billing_account_id": rng.randint(1, 200000),
+                "amount": rng.choice((150000.0, 200000.0, 350000.0, 500000.0)),
+                "payment_method": rng.choice(METHODS),
+                "status": PaymentStatus.PAID,
+                "payment_date": paid_at,
+                "due_date": paid_at,
+                "package_name": rng.choice(PACKAGES),
+                "created_at": paid_at,
+            })
+            if len(batch) == 50000:
+                conn.execute(insert(Payment.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Payment.__table__), batch)
+
+
+def direct_report(db: Session, start: date, end: date) -> float:
+    """Yearly totals, per method and per package straight from the payments table"""
+    paid = (
+        Payment.status == PaymentStatus.PAID,
+        Payment.payment_method != INVOICE_METHOD,
+        Payment.payment_date >= datetime.combine(start, datetime.min.time()),
+        Payment.payment_date < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    )
+    year = func.strftime("%Y", Payment.payment_date)
+    total = 0.0
+    for column in (year, Payment.payment_method, Payment.package_name):
+        rows = db.execute(select(column, func.count(), func.sum(Payment.amount)).where(*paid).group_by(column))
+        total = sum(amount for _, _, amount in rows)
+    return total
+
+
+def main(args: argparse.Namespace):
+    end = date.today()
+    start = date(end.year - args.years + 1, 1, 1)
+    directory = tempfile.mkdtemp(prefix="bench_revenue_")
+    path = os.path.join(directory, "billing.db")
+    try:
+        engine = create_engine(f"sqlite:///{path}")
+        started = time.perf_counter()
+        populate(engine, args.payments, start, (end - start).days + 1)
+        print(f"populated {args.payments:,} payments over {args.years} years "
+              f"in {time.perf_counter() - started:.1f}s")
+        with Session(engine) as db:
+            started = time.perf_counter()
+            built = rebuild_revenue(db)
+            print(f"rollup built: {built['rows']:,} rows for {built['payments']:,} payments "
+                  f"in {time.perf_counter() - started:.1f}s")
+            started = time.perf_counter()
+            report = revenue_report(db, start, end, "yearly")
+            ledger = time.perf_counter() - started
+            started = time.perf_counter()
+            total = direct_report(db, start, end)
+            direct = time.perf_counter() - started
+            assert abs(total - report["total_revenue"]) < 1, (total, report["total_revenue"])
+            print(f"yearly report from the rollup: {ledger * 1000:.0f} ms, "
+                  f"from the payments table: {direct * 1000:.0f} ms ({direct / ledger:.0f}x)")
+        engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payments", type=int, default=1000000)
+    parser.add_argument("--years", type=int, default=3)
+    main(parser.parse_args())
\ No newline at end of file
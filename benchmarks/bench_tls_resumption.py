@@ -0,0 +1,116 @@
+"""API-SSL reconnect benchmark: full TLS handshakes vs. resumed sessions
+
+Starts an emulated router behind TLS (self-signed certificate), then runs a
+reconnect storm of N concurrent connect+login rounds twice: once with a
+fresh client context per connection (full handshake every time) and once
+through one shared ResumingSSLContext.
+
+    python -m benchmarks.bench_tls_resumption --connections 200 --rounds 5
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import ssl
+import statistics
+import tempfile
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.services.mikrotik_async import AsyncMikroTikAPI, create_ssl_context
+from benchmarks.routeros_emulator import EmulatedRouter
+
+
+def write_self_signed(directory: str):
+    """Create a throwaway certificate/key pair for the stand-in server"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "routeros-standin")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+async def storm(port: int, connections: int, shared_context) -> dict:
+    """Connect, log in and run one command on ``connections`` sessions at once"""
+    async def one():
+        context = shared_context or create_ssl_context()
+        api = AsyncMikroTikAPI("127.0.0.1", port, timeout=30, ssl_context=context)
+        started = time.perf_counter()
+        if not await api.connect("admin", ""):
+            raise RuntimeError("login failed")
+        await api.command(["/system/identity/print"])
+        elapsed = time.perf_counter() - started
+        resumed = api.tls_resumed
+        await api.disconnect()
+        return elapsed, resumed
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one() for _ in range(connections)])
+    wall = time.perf_counter() - started
+    latencies = [elapsed for elapsed, _ in results]
+    return {
+        "wall": wall,
+        "median": statistics.median(latencies),
+        "resumed": sum(1 for _, resumed in results if resumed),
+    }
+
+
+async def main(connections: int, rounds: int):
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = write_self_signed(directory)
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(cert_path, key_path)
+        router = EmulatedRouter()
+        await router.start(ssl=server_context)
+        port = router.port
+
+        shared = create_ssl_context()
+        # Prime the shared context with one full handshake
+        await storm(port, 1, shared)
+
+        for label, context in (("full handshake", None), ("resumed", shared)):
+            walls, medians, resumed = [], [], 0
+            for _ in range(rounds):
+                result = await storm(port, connections, context)
+                walls.append(result["wall"])
+                medians.append(result["median"])
+                resumed += result["resumed"]
+            print(
+                f"{label:>15}: storm of {connections} reconnects "
+                f"{statistics.mean(walls) * 1000:8.1f} ms wall, "
+                f"{statistics.mean(medians) * 1000:6.2f} ms median connect+login, "
+                f"{resumed}/{connections * rounds} sessions resumed"
+            )
+
+        await router.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.connections, args.rounds))
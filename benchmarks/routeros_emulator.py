@@ -0,0 +1,502 @@
+"""Local RouterOS API emulator for tests and benchmarks
+
+Each emulated router listens on its own 127.0.0.1 port and speaks the
+binary API: new-style and challenge (pre-6.43) login, tagged commands,
+``print`` with ``=.proplist=`` and simple ``?`` queries, follow-mode
+``listen`` / ``monitor-traffic`` until ``/cancel``, and ``!trap`` for
+unknown commands or bad arguments. Latency is applied to every reply;
+packet loss is modelled as an extra retransmission timeout on the
+affected reply.
+
+    python -m benchmarks.routeros_emulator --devices 20 --sessions 2000 --latency 0.005
+"""
+import argparse
+import asyncio
+import binascii
+import hashlib
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from app.services.mikrotik_api import SentenceDecoder, encode_sentence
+
+TRAP_INTERRUPTED = "2"
+
+
+def format_uptime(seconds: float) -> str:
+    """RouterOS style uptime, e.g. "1d2h3m4s\""""
+    seconds = int(seconds)
+    parts = []
+    for unit, size in (("w", 604800), ("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    parts.append(f"{seconds}s")
+    return "".join(parts)
+
+
+class _Session:
+    __slots__ = ("id", "name", "caller_id", "address", "started", "rate_in", "rate_out")
+
+    def __init__(self, number: int, name: str, rng: random.Random):
+        self.id = f"*{number:X}"
+        self.name = name
+        self.caller_id = "4C:5E:0C:%02X:%02X:%02X" % (number >> 16 & 0xFF, number >> 8 & 0xFF, number & 0xFF)
+        self.address = f"10.{number >> 16 & 0xFF}.{number >> 8 & 0xFF}.{number & 0xFF}"
+        self.started = time.time() - rng.randint(60, 7 * 86400)
+        self.rate_in = rng.randint(1000, 2000000)
+        self.rate_out = rng.randint(10000, 20000000)
+
+    def row(self, now: float) -> Dict[str, str]:
+        elapsed = now - self.started
+        return {
+            ".id": self.id,
+            "name": self.name,
+            "service": "pppoe",
+            "caller-id": self.caller_id,
+            "address": self.address,
+            "uptime": format_uptime(elapsed),
+            "encoding": "",
+            "session-id": "0x8" + self.id[1:].rjust(7, "0"),
+            "limit-bytes-in": "0",
+            "limit-bytes-out": "0",
+            "radius": "false",
+            "bytes-in": str(int(self.rate_in * elapsed)),
+            "bytes-out": str(int(self.rate_out * elapsed)),
+        }
+
+
+class EmulatedRouter:
+    """One emulated RouterOS device"""
+
+    def __init__(self, name: str = "router", sessions: int = 100, interfaces: int = 4,
+                 username: str = "admin", password: str = "", latency: float = 0.0,
+                 loss: float = 0.0, retransmit_delay: float = 0.2, legacy_login: bool = False,
+                 churn: float = 0.0, monitor_interval: float = 1.0, seed: Optional[int] = None):
+        self.name = name
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.loss = loss
+        self.retransmit_delay = retransmit_delay
+        self.legacy_login = legacy_login
+        self.churn = churn
+        self.monitor_interval = monitor_interval
+        self.random = random.Random(seed)
+        self.booted = time.time() - self.random.randint(3600, 30 * 86400)
+        self.interfaces = [f"ether{i + 1}" for i in range(interfaces)]
+        self.sessions: Dict[str, _Session] = {}
+        self._next_session = 1
+        for _ in range(sessions):
+            self._add_session()
+        self.secret_profiles: Dict[str, str] = {}
+        self.queue_limits: Dict[str, str] = {}
+        self.address_list: Dict[str, Dict[str, str]] = {}
+        self._next_address_id = 1
+        self._listeners: Dict[str, List[asyncio.Queue]] = {"/ppp/active/listen": [], "/log/listen": []}
+        self.connections = 0
+        self.sentences_in = 0
+        self.sentences_out = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._writers = set()
+        self._handlers = set()
+        self.port: Optional[int] = None
+        self._churn_task: Optional[asyncio.Task] = None
+
+    def _add_session(self) -> _Session:
+        number = self._next_session
+        self._next_session += 1
+        session = _Session(number, f"user{number}", self.random)
+        self.sessions[session.name] = session
+        return session
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, ssl=None):
+        """Listen for API connections"""
+        self.server = await asyncio.start_server(self._handle, host, port, ssl=ssl)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.churn > 0:
+            self._churn_task = asyncio.ensure_future(self._churn_loop())
+
+    async def close(self):
+        if self._churn_task:
+            self._churn_task.cancel()
+            self._churn_task = None
+        if self.server:
+            self.server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    def device(self, device_id: int) -> Dict[str, Any]:
+        """Device dict in the shape used by the MikroTik endpoints"""
+        return {
+            "id": device_id,
+            "name": self.name,
+            "ip_address": "127.0.0.1",
+            "port": self.port,
+            "use_ssl": False,
+            "username": self.username,
+            "password": self.password,
+            "description": "RouterOS emulator",
+            "is_active": True,
+            "last_connected": None
+        }
+
+    # Session churn feeding the listen commands
+
+    def disconnect_session(self, name: str):
+        session = self.sessions.pop(name, None)
+        if session:
+            self._publish("/ppp/active/listen", {".id": session.id, ".dead": "yes"})
+            self._publish("/log/listen", self._log_row(f"<pppoe-{name}>: disconnected"))
+
+    def connect_session(self) -> Dict[str, str]:
+        session = self._add_session()
+        row = session.row(time.time())
+        self._publish("/ppp/active/listen", row)
+        self._publish("/log/listen", self._log_row(f"<pppoe-{session.name}>: connected"))
+        return row
+
+    def _log_row(self, message: str) -> Dict[str, str]:
+        return {
+            ".id": f"*{self.random.getrandbits(24):X}",
+            "time": time.strftime("%H:%M:%S"),
+            "topics": "pppoe,ppp,info",
+            "message": message
+        }
+
+    def _publish(self, command: str, row: Dict[str, str]):
+        for queue in self._listeners[command]:
+            queue.put_nowait(row)
+
+    async def _churn_loop(self):
+        while True:
+            await asyncio.sleep(1.0 / self.churn)
+            if self.sessions:
+                self.disconnect_session(self.random.choice(list(self.sessions)))
+            self.connect_session()
+
+    # Connection handling
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        connection = _Connection(self, writer)
+        decoder = SentenceDecoder()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                decoder.feed(data)
+                for sentence in decoder.sentences():
+                    self.sentences_in += 1
+                    if sentence and not connection.dispatch(sentence):
+                        return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            connection.close()
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+
+class _Connection:
+    """Per-connection login state, follow commands and reply ordering"""
+
+    def __init__(self, router: EmulatedRouter, writer: asyncio.StreamWriter):
+        self.router = router
+        self.writer = writer
+        self.logged_in = False
+        self.challenge: Optional[bytes] = None
+        self.follows: Dict[str, asyncio.Task] = {}
+        self.drain_lock = asyncio.Lock()
+        self.tasks = set()
+
+    def close(self):
+        for task in list(self.follows.values()) + list(self.tasks):
+            task.cancel()
+
+    def dispatch(self, sentence: List[str]) -> bool:
+        command = sentence[0]
+        attributes, queries, tag = {}, [], None
+        for word in sentence[1:]:
+            if word.startswith(".tag="):
+                tag = word[5:]
+            elif word.startswith("="):
+                key, _, value = word[1:].partition("=")
+                attributes[key] = value
+            elif word.startswith("?"):
+                queries.append(word[1:])
+
+        if command == "/quit":
+            self.reply([["!fatal", "session terminated on request"]], tag)
+            return False
+        if command == "/login":
+            self.reply(self.login(attributes), tag)
+        elif not self.logged_in:
+            self.reply([["!trap", "=message=not logged in"], ["!done"]], tag)
+        elif command == "/cancel":
+            self.cancel(attributes.get("tag"), tag)
+        elif command in ("/ppp/active/listen", "/log/listen", "/interface/monitor-traffic"):
+            self.follow(command, attributes, tag)
+        else:
+            self.reply(self.execute(command, attributes, queries), tag)
+        return True
+
+    def login(self, attributes: Dict[str, str]) -> List[List[str]]:
+        router = self.router
+        if "response" in attributes and self.challenge is not None:
+            md5 = hashlib.md5(b"\x00" + router.password.encode("utf-8") + self.challenge)
+            valid = attributes["response"] == "00" + md5.hexdigest()
+        elif "password" in attributes and not router.legacy_login:
+            valid = attributes["password"] == router.password
+        else:
+            # Pre-6.43 behaviour: hand out a challenge
+            self.challenge = os.urandom(16)
+            return [["!done", "=ret=" + binascii.hexlify(self.challenge).decode()]]
+
+        if not valid or attributes.get("name") != router.username:
+            return [["!trap", "=message=invalid user name or password (6)"], ["!done"]]
+        self.logged_in = True
+        return [["!done"]]
+
+    def execute(self, command: str, attributes: Dict[str, str], queries: List[str]) -> List[List[str]]:
+        router = self.router
+        path, _, action = command.rpartition("/")
+        if action == "print":
+            rows = self.rows(path)
+            if rows is None:
+                return [["!trap", "=message=no such command prefix"], ["!done"]]
+            return [["!re"] + [f"={k}={v}" for k, v in row.items()] for row in select(rows, attributes, queries)] + [["!done"]]
+
+        if command == "/ppp/secret/set":
+            router.secret_profiles[attributes.get("numbers", "")] = attributes.get("profile", "default")
+        elif command == "/queue/simple/set":
+            router.queue_limits[attributes.get("numbers", "")] = attributes.get("max-limit", "")
+        elif command == "/ip/firewall/address-list/add":
+            if "address" not in attributes or "list" not in attributes:
+                return [["!trap", "=message=missing value(s) of argument(s) address list"], ["!done"]]
+            entry_id = f"*{router._next_address_id:X}"
+            router._next_address_id += 1
+            router.address_list[entry_id] = {".id": entry_id, **attributes}
+            return [["!done", f"=ret={entry_id}"]]
+        elif command == "/ip/firewall/address-list/remove":
+            if router.address_list.pop(attributes.get(".id", ""), None) is None:
+                return [["!trap", "=message=no such item"], ["!done"]]
+        else:
+            return [["!trap", "=message=no such command prefix"], ["!done"]]
+        return [["!done"]]
+
+    def rows(self, path: str) -> Optional[List[Dict[str, str]]]:
+        router = self.router
+        now = time.time()
+        if path == "/ppp/active":
+            return [session.row(now) for session in router.sessions.values()]
+        if path == "/interface":
+            return [self.interface_row(i, name, now) for i, name in enumerate(router.interfaces)]
+        if path == "/ip/firewall/address-list":
+            return list(router.address_list.values())
+        if path == "/system/identity":
+            return [{"name": router.name}]
+        if path == "/system/resource":
+            return [{
+                "uptime": format_uptime(now - router.booted),
+                "version": "7.12 (stable)",
+                "free-memory": str(180 * 1024 * 1024 + router.random.randint(0, 8 * 1024 * 1024)),
+                "total-memory": str(256 * 1024 * 1024),
+                "cpu": "MIPS 1004Kc V2.15",
+                "cpu-count": "4",
+                "cpu-load": str(router.random.randint(1, 40)),
+                "architecture-name": "mmips",
+                "board-name": "hEX",
+                "platform": "MikroTik"
+            }]
+        return None
+
+    def interface_row(self, index: int, name: str, now: float) -> Dict[str, str]:
+        elapsed = now - self.router.booted
+        rate = 1000000 * (index + 1)
+        return {
+            ".id": f"*{index + 1:X}",
+            "name": name,
+            "type": "ether",
+            "mtu": "1500",
+            "rx-byte": str(int(rate * 10 * elapsed)),
+            "tx-byte": str(int(rate * elapsed)),
+            "rx-packet": str(int(rate * 10 * elapsed) // 1200),
+            "tx-packet": str(int(rate * elapsed) // 1200),
+            "running": "true",
+            "disabled": "false"
+        }
+
+    def follow(self, command: str, attributes: Dict[str, str], tag: Optional[str]):
+        if tag is None:
+            self.reply([["!trap", "=message=follow commands need a tag"], ["!done"]], None)
+            return
+        if command == "/interface/monitor-traffic":
+            name = attributes.get("interface")
+            if name not in self.router.interfaces:
+                self.reply([["!trap", "=message=no such item"], ["!done"]], tag)
+                return
+            task = asyncio.ensure_future(self.monitor(name, tag))
+        else:
+            task = asyncio.ensure_future(self.listen(command, tag))
+        self.follows[tag] = task
+
+    async def monitor(self, name: str, tag: str):
+        index = self.router.interfaces.index(name)
+        while True:
+            rate = 8000000 * (index + 1)
+            jitter = self.router.random.uniform(0.8, 1.2)
+            self.reply([[
+                "!re", f"=name={name}",
+                f"=rx-bits-per-second={int(rate * 10 * jitter)}",
+                f"=tx-bits-per-second={int(rate * jitter)}",
+                f"=rx-packets-per-second={int(rate * 10 * jitter / 9600)}",
+                f"=tx-packets-per-second={int(rate * jitter / 9600)}"
+            ]], tag)
+            await asyncio.sleep(self.router.monitor_interval)
+
+    async def listen(self, command: str, tag: str):
+        queue: asyncio.Queue = asyncio.Queue()
+        listeners = self.router._listeners[command]
+        listeners.append(queue)
+        try:
+            while True:
+                row = await queue.get()
+                self.reply([["!re"] + [f"={k}={v}" for k, v in row.items()]], tag)
+        finally:
+            listeners.remove(queue)
+
+    def cancel(self, target: Optional[str], tag: Optional[str]):
+        task = self.follows.pop(target, None) if target else None
+        if task is None:
+            self.reply([["!trap", "=message=no such command or command already finished"], ["!done"]], tag)
+            return
+        task.cancel()
+        self.reply([["!trap", f"=category={TRAP_INTERRUPTED}", "=message=interrupted"], ["!done"]], target)
+        self.reply([["!done"]], tag)
+
+    def reply(self, sentences: List[List[str]], tag: Optional[str]):
+        suffix = [f".tag={tag}"] if tag is not None else []
+        data = b"".join([encode_sentence(words + suffix) for words in sentences])
+        self.router.sentences_out += len(sentences)
+
+        delay = self.router.latency
+        if self.router.loss and self.router.random.random() < self.router.loss:
+            delay += self.router.retransmit_delay
+        if delay <= 0:
+            self.writer.write(data)
+            return
+        task = asyncio.ensure_future(self.send_later(data, delay))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send_later(self, data: bytes, delay: float):
+        await asyncio.sleep(delay)
+        if self.writer.is_closing():
+            return
+        self.writer.write(data)
+        async with self.drain_lock:
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+
+
+def select(rows: List[Dict[str, str]], attributes: Dict[str, str], queries: List[str]) -> List[Dict[str, str]]:
+    """Apply ANDed ``?key=value``, ``?>key=value``, ``?<key=value`` and ``=.proplist=``"""
+    for query in queries:
+        if query[:1] in "<>":
+            operator, (key, _, value) = query[0], query[1:].partition("=")
+            bound = int(value)
+            if operator == ">":
+                rows = [row for row in rows if int(row.get(key, "0")) > bound]
+            else:
+                rows = [row for row in rows if int(row.get(key, "0")) < bound]
+        elif "=" in query:
+            key, _, value = query.partition("=")
+            rows = [row for row in rows if row.get(key) == value]
+        elif query.startswith("-"):
+            rows = [row for row in rows if query[1:] not in row]
+        else:
+            rows = [row for row in rows if query in row]
+    proplist = attributes.get(".proplist")
+    if proplist:
+        keys = proplist.split(",")
+        rows = [{key: row[key] for key in keys if key in row} for row in rows]
+    return rows
+
+
+class RouterOSEmulator:
+    """A fleet of emulated routers on consecutive local ports"""
+
+    def __init__(self, devices: int = 1, **router_options: Any):
+        seed = router_options.pop("seed", None)
+        self.routers = [
+            EmulatedRouter(
+                name=f"router{i + 1}",
+                seed=None if seed is None else seed + i,
+                **router_options
+            )
+            for i in range(devices)
+        ]
+
+    async def start(self, ssl=None):
+        for router in self.routers:
+            await router.start(ssl=ssl)
+
+    async def close(self):
+        for router in self.routers:
+            await router.close()
+
+    async def __aenter__(self) -> "RouterOSEmulator":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def devices(self) -> List[Dict[str, Any]]:
+        """Device dicts for every emulated router"""
+        return [router.device(i + 1) for i, router in enumerate(self.routers)]
+
+
+async def main(args: argparse.Namespace):
+    emulator = RouterOSEmulator(
+        devices=args.devices,
+        sessions=args.sessions,
+        password=args.password,
+        latency=args.latency,
+        loss=args.loss,
+        legacy_login=args.legacy_login,
+        churn=args.churn,
+    )
+    await emulator.start()
+    for device in emulator.devices():
+        print(f"{device['name']}: 127.0.0.1:{device['port']}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await emulator.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=100, help="PPPoE sessions per device")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every reply")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of replies hit by a retransmit")
+    parser.add_argument("--legacy-login", action="store_true", help="only accept challenge login")
+    parser.add_argument("--churn", type=float, default=0.0, help="PPPoE re-dials per second")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
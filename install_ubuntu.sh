@@ -99,6 +99,7 @@ BillingBase.metadata.create_all(engine)
 RadiusBase.metadata.create_all(engine)
 print('Database tables created successfully')
 "
+alembic stamp head
 
 # Create systemd service
 echo "Creating systemd service..."
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.billing import Base as BillingBase, BillingAccount, BillingStatus
+from app.models.mikrotik import Base as MikroTikBase
+from app.models.radius import Base as RadiusBase
+from app.models.user import Base as UserBase
+
+
+@pytest.fixture
+def engine():
+    """In-memory SQLite with every table; the models' bases are merged so cross-module keys resolve"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    metadata = MetaData()
+    for base in (UserBase, MikroTikBase, BillingBase, RadiusBase):
+        for table in base.metadata.tables.values():
+            table.to_metadata(metadata)
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def add_account(db):
+    """Insert a BillingAccount; keyword arguments override the defaults"""
+    def add(username: str, **fields) -> BillingAccount:
+        values = {
+            "username": username,
+            "full_name": username.title(),
+            "email": f"{username}@example.com",
+            "package_name": "Basic 25Mbps",
+            "package_price": 200000.0,
+            "bandwidth_profile": "25M/25M",
+            "status": BillingStatus.ACTIVE,
+            "due_date": datetime(2024, 2, 1),
+        }
+        values.update(fields)
+        account = BillingAccount(**values)
+        db.add(account)
+        db.commit()
+        return account
+    return add
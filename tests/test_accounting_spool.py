@@ -0,0 +1,73 @@
+import asyncio
+import os
+from datetime import datetime
+
+from app.services.accounting_spool import RECORD_SIZE, AccountingSpool
+
+
+def row(index):
+    return {"username": f"user{index}", "nas_ip": "192.0.2.1", "mikrotik_device_id": None,
+            "rx_bytes": index, "tx_bytes": 2 * index, "session_time": 60,
+            "recorded_at": datetime(2024, 2, 1, 12, 0, index)}
+
+
+class Store:
+    def __init__(self):
+        self.rows = []
+        self.cursor = -1
+
+    def store(self, rows, name, sequence):
+        self.rows.extend(rows)
+        self.cursor = sequence
+
+    def load(self, name):
+        return self.cursor
+
+
+def spool(directory, store, **options):
+    return AccountingSpool(str(directory), segment_records=4, flush_interval=0.01, store=store.store,
+                           cursor_source=store.load, device_source=lambda: [{"id": 7, "ip_address": "192.0.2.1"}],
+                           **options)
+
+
+def test_recovery_drops_a_torn_record_and_keeps_appending(tmp_path):
+    first = spool(tmp_path, Store())
+    first.open()
+    assert first.append_many(row(i) for i in range(3)) == 3
+    head = first.head
+    segment = first._segments[-1]
+    # A host crash tore the last record
+    segment.map[2 * RECORD_SIZE + 20] ^= 0xFF
+    first.close()
+
+    second = spool(tmp_path, Store())
+    second.open()
+    assert second.head == head - 1
+    second.append(row(9))
+    rows, last = second.read(head - 1, 10)
+    second.close()
+
+    assert [entry["username"] for entry in rows] == ["user1", "user9"]
+    assert last == head
+    assert rows[0]["total_bytes"] == 3 and rows[0]["nas_ip"] == "192.0.2.1"
+
+
+def test_replay_is_exactly_once_across_restarts(tmp_path):
+    store = Store()
+
+    async def run(count, offset):
+        current = spool(tmp_path, store)
+        await current.start()
+        current.append_many(row(offset + i) for i in range(count))
+        await asyncio.sleep(0.05)
+        await current.stop()
+        return current
+
+    first = asyncio.run(run(10, 0))
+    second = asyncio.run(run(3, 10))
+
+    assert [entry["username"] for entry in store.rows] == [f"user{i}" for i in range(13)]
+    assert {entry["mikrotik_device_id"] for entry in store.rows} == {7}
+    assert (first.replayed, second.replayed) == (10, 3)
+    # Stored segments are released, only the active one is left
+    assert len(os.listdir(tmp_path)) == 1
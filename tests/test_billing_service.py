@@ -0,0 +1,129 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import billing as billing_endpoints
+from app.database import get_db
+from app.main import app
+from app.models.billing import BillingStatus, Payment, PaymentAllocation, PaymentStatus, RevenueDaily
+from app.services.billing_service import BillingService, invoice_amount
+
+
+def open_invoice(db, account, amount=200000.0, due_date=datetime(2024, 1, 31), status=PaymentStatus.OVERDUE):
+    invoice = Payment(billing_account_id=account.id, amount=amount, payment_method="invoice",
+                      status=status, due_date=due_date,
+                      invoice_key=f"{account.id}:{due_date:%Y-%m}", created_at=datetime(2024, 1, 1))
+    db.add(invoice)
+    db.commit()
+    return invoice
+
+
+def test_invoice_amount_adds_the_proration_recorded_for_the_previous_cycle():
+    march = datetime(2024, 3, 1)
+    assert invoice_amount(300000.0, 50000.0, datetime(2024, 2, 1), march) == (350000.0, 50000.0)
+    assert invoice_amount(200000.0, -50000.0, datetime(2024, 2, 1), march) == (150000.0, -50000.0)
+    # Recorded for an earlier cycle, or none at all: the plain price
+    assert invoice_amount(300000.0, 50000.0, datetime(2024, 1, 1), march) == (300000.0, 0.0)
+    assert invoice_amount(300000.0, None, None, march) == (300000.0, 0.0)
+
+
+def test_two_changes_in_one_cycle_bill_each_package_for_its_days(db, add_account):
+    account = add_account("alice", package_price=290000.0)
+    service = BillingService(db)
+    service.generate_monthly_invoices(datetime(2024, 2, 1, 1), workers=1)
+
+    # February has 29 days: 290000 for 4 days, 580000 for 15, 870000 for the last 10
+    service.change_package(account.id, "Premium", 580000.0, "50M/50M", changed_at=datetime(2024, 2, 5))
+    service.change_package(account.id, "Ultra", 870000.0, changed_at=datetime(2024, 2, 20))
+    service.generate_monthly_invoices(datetime(2024, 3, 1, 1), workers=1)
+
+    assert account.bandwidth_profile == "50M/50M"
+    march = db.query(Payment).filter(Payment.invoice_key == f"{account.id}:2024-03").one()
+    # 40000 + 300000 + 300000 for February beyond the 290000 invoiced, then March in full
+    assert march.amount == 870000.0 + 350000.0
+    with pytest.raises(ValueError):
+        service.change_package(999, "Basic", 1.0)
+
+
+def test_a_change_before_the_cycle_is_invoiced_is_not_prorated_again(db, add_account):
+    account = add_account("alice")
+    service = BillingService(db)
+    service.generate_monthly_invoices(datetime(2024, 2, 1, 1), workers=1)
+    service.change_package(account.id, "Premium", 350000.0, changed_at=datetime(2024, 2, 15, 12))
+
+    # On the 1st before the invoice run: March is invoiced at the new price already
+    service.change_package(account.id, "Ultra", 500000.0, changed_at=datetime(2024, 3, 1, 0, 30))
+    service.generate_monthly_invoices(datetime(2024, 3, 1, 1), workers=1)
+    service.generate_monthly_invoices(datetime(2024, 4, 1, 1), workers=1)
+
+    invoices = dict(db.query(Payment.invoice_key, Payment.amount).all())
+    assert invoices[f"{account.id}:2024-03"] == 500000.0 + 75000.0
+    assert invoices[f"{account.id}:2024-04"] == 500000.0
+
+
+def test_process_payment_settles_invoices_and_records_revenue(db, add_account):
+    account = add_account("alice", status=BillingStatus.SUSPENDED, due_date=datetime(2024, 1, 31))
+    invoice = open_invoice(db, account)
+
+    payment, report, allocated = BillingService(db).process_payment(account.id, 200000.0, "cash", notes="Counter")
+
+    db.refresh(invoice)
+    assert (payment.status, payment.notes, payment.package_name) == (PaymentStatus.PAID, "Counter", "Basic 25Mbps")
+    assert invoice.status == PaymentStatus.PAID
+    assert [entry["account_id"] for entry in report["reactivated"]] == [account.id]
+    assert allocated == {invoice.id: 200000.0}
+    assert db.query(RevenueDaily).one().amount == 200000.0
+    with pytest.raises(ValueError, match="not found"):
+        BillingService(db).process_payment(999, 10.0, "cash")
+
+
+def test_void_reopens_invoices_and_restores_the_due_date(db, add_account):
+    account = add_account("alice", status=BillingStatus.SUSPENDED, due_date=datetime(2024, 1, 31))
+    january = open_invoice(db, account)
+    february = open_invoice(db, account, due_date=datetime(2099, 2, 28), status=PaymentStatus.PENDING)
+    service = BillingService(db)
+    payment, _, _ = service.process_payment(account.id, 250000.0, "cash")
+    db.refresh(account)
+    assert account.status == BillingStatus.ACTIVE
+    assert db.query(PaymentAllocation).count() == 2
+    assert february.paid_amount == 50000.0
+
+    voided, invoices = service.void_payment(payment.id)
+
+    assert voided.status == PaymentStatus.CANCELLED
+    assert {invoice.id for invoice in invoices} == {january.id, february.id}
+    assert (january.status, january.paid_amount, january.payment_date) == (PaymentStatus.OVERDUE, 0.0, None)
+    assert (february.status, february.paid_amount) == (PaymentStatus.PENDING, 0.0)
+    assert account.due_date == datetime(2024, 1, 31)
+    assert db.query(PaymentAllocation).count() == 0
+    assert db.query(RevenueDaily).one().amount == 0.0
+
+    # The overdue run isolates the account again
+    isolated = service.process_overdue_accounts(now=datetime(2024, 3, 1))
+    assert [entry["account_id"] for entry in isolated] == [account.id]
+
+
+def test_package_change_endpoint_records_the_proration(db, add_account, monkeypatch):
+    account = add_account("alice")
+    BillingService(db).generate_monthly_invoices(workers=1)
+    changed = []
+    monkeypatch.setattr(billing_endpoints.coa_dispatcher, "account_changed",
+                        lambda username: changed.append(username) or 1)
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        client = TestClient(app)
+        response = client.patch(f"/api/v1/billing/accounts/{account.id}/package",
+                                json={"package_name": "Premium 50Mbps", "package_price": 350000,
+                                      "bandwidth_profile": "50M/50M"})
+        missing = client.patch("/api/v1/billing/accounts/999/package",
+                               json={"package_name": "Premium 50Mbps", "package_price": 350000})
+    finally:
+        app.dependency_overrides.pop(get_db)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["package_price"], body["coa_queued"]) == (350000.0, 1)
+    assert 0 < body["proration_amount"] <= 150000.0
+    assert changed == ["alice"]
+    assert missing.status_code == 404
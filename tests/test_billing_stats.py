@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+from app.models.billing import BillingStatus, Payment, PaymentStatus
+from app.services import billing_stats as billing_stats_module
+from app.services.billing_service import BillingService
+from app.services.billing_stats import BillingStatsAggregate, load_billing_rows
+
+
+def test_totals_come_from_the_database_and_follow_db_ids(monkeypatch, session_factory, db, add_account):
+    monkeypatch.setattr(billing_stats_module, "SessionLocal", session_factory)
+    active = add_account("alice")
+    suspended = add_account("bob", status=BillingStatus.SUSPENDED)
+    db.add_all([
+        Payment(billing_account_id=active.id, amount=200000.0, payment_method="cash",
+                status=PaymentStatus.PAID, due_date=datetime(2024, 2, 1)),
+        Payment(billing_account_id=suspended.id, amount=150000.0, payment_method="invoice",
+                status=PaymentStatus.OVERDUE, due_date=datetime(2024, 1, 1)),
+    ])
+    db.commit()
+    stats = BillingStatsAggregate()
+    stats.source = load_billing_rows
+
+    asyncio.run(stats.start())
+    assert stats.stats() == {
+        "total_accounts": 2, "active_accounts": 1, "suspended_accounts": 1, "paid_accounts": 1,
+        "overdue_accounts": 1, "total_revenue": 200000.0, "pending_revenue": 150000.0,
+    }
+
+    # An isolation applied to the database and to the totals with the same id
+    suspended_id = active.id
+    active.status = BillingStatus.SUSPENDED
+    db.commit()
+    stats.set_account_status(suspended_id, "suspended")
+
+    report = asyncio.run(stats.refresh())
+    assert report == {"consistent": True, "drift": {}, "repaired": False}
+    assert stats.stats()["suspended_accounts"] == 2
+
+
+def test_refresh_repairs_drift_from_the_source():
+    stats = BillingStatsAggregate()
+    stats.source = lambda: ([{"id": 1, "status": "active"}], [{"id": 1, "status": "paid", "amount": 10.0}])
+    stats.load([], [])
+
+    report = asyncio.run(stats.refresh())
+
+    assert report["repaired"] is True
+    assert report["drift"]["total_accounts"] == {"expected": 1, "actual": 0}
+    assert stats.stats()["total_revenue"] == 10.0
+    assert asyncio.run(stats.refresh())["consistent"] is True
+
+
+def test_start_without_a_database_keeps_empty_totals():
+    stats = BillingStatsAggregate()
+
+    def broken():
+        raise RuntimeError("no such table: billing_accounts")
+
+    stats.source = broken
+    asyncio.run(stats.start())
+
+    assert stats.stats()["total_accounts"] == 0
+
+
+def test_payments_and_voids_apply_as_deltas_and_count_revenue_once(monkeypatch, session_factory, db, add_account):
+    monkeypatch.setattr(billing_stats_module, "SessionLocal", session_factory)
+    account = add_account("alice")
+    db.add_all([
+        Payment(billing_account_id=account.id, amount=200000.0, payment_method="invoice",
+                status=PaymentStatus.OVERDUE, due_date=datetime(2024, 1, 31)),
+        Payment(billing_account_id=account.id, amount=200000.0, payment_method="invoice",
+                status=PaymentStatus.OVERDUE, due_date=datetime(2024, 2, 29)),
+    ])
+    db.commit()
+    stats = BillingStatsAggregate()
+    stats.load(*load_billing_rows())
+    service = BillingService(db)
+
+    # Settles January and pays half of February
+    payment, _, allocated = service.process_payment(account.id, 300000.0, "cash")
+    stats.record_payments("cash", 1, payment.amount, allocated)
+
+    assert stats.stats()["paid_accounts"] == 1
+    assert stats.stats()["overdue_accounts"] == 1
+    assert stats.stats()["total_revenue"] == 300000.0
+    assert stats.stats()["pending_revenue"] == 100000.0
+    assert len(stats._open) == 1
+    assert stats.check(*load_billing_rows())["consistent"] is True
+
+    voided, invoices = service.void_payment(payment.id)
+    stats.update_payment(voided, previous_status=PaymentStatus.PAID)
+    for invoice in invoices:
+        stats.update_payment(invoice, previous_status=PaymentStatus.PAID)
+
+    assert stats.stats()["total_revenue"] == 0.0
+    assert stats.stats()["pending_revenue"] == 400000.0
+    assert stats.check(*load_billing_rows())["consistent"] is True
@@ -0,0 +1,50 @@
+from app.services.mikrotik_api import (
+    SentenceDecoder, encode_sentence, parse_system_stats, parse_uptime, reply_attributes
+)
+
+
+def test_system_stats_keep_free_memory_and_add_percent_used():
+    stats = parse_system_stats({"cpu-load": "7", "free-memory": "268435456", "total-memory": "1073741824",
+                                "uptime": "1w2d3h4m5s", "version": "7.15", "board-name": "CCR2004",
+                                "architecture-name": "arm64"})
+
+    assert stats["memory_usage"] == 268435456.0
+    assert stats["memory_used_percent"] == 75.0
+    assert parse_system_stats({"free-memory": "1024"})["memory_used_percent"] is None
+
+
+def test_uptime_formats():
+    assert parse_uptime("1w2d3h4m5s") == 788645
+    assert parse_uptime("2d03:04:05") == 183845
+    assert parse_uptime("0s") == 0
+
+
+def test_sentence_decoder_reassembles_split_sentences():
+    long_word = "=comment=" + "x" * 20000
+    stream = encode_sentence(["!re", "=name=ether1", long_word]) + encode_sentence(["!done"])
+    decoder = SentenceDecoder(size=64)
+
+    sentences = []
+    # Fed a few bytes at a time, with length prefixes cut in half
+    for start in range(0, len(stream), 7):
+        decoder.feed(stream[start:start + 7])
+        sentences.extend(decoder.sentences())
+
+    assert sentences == [["!re", "=name=ether1", long_word], ["!done"]]
+    assert decoder.next_sentence() is None
+
+
+def test_sentence_decoder_fills_from_a_socket():
+    data = bytearray(encode_sentence(["!done", "=ret=*1"]))
+    decoder = SentenceDecoder(size=16)
+
+    def recv_into(view):
+        count = min(len(view), len(data), 5)
+        view[:count] = data[:count]
+        del data[:count]
+        return count
+
+    while decoder.fill(recv_into):
+        pass
+    assert list(decoder.sentences()) == [["!done", "=ret=*1"]]
+    assert reply_attributes(["!re", "=name=a=b", ".tag=3"]) == {"name": "a=b"}
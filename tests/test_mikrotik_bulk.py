@@ -0,0 +1,129 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.core.config import settings
+from app.services.mikrotik_api import MikroTikError
+from app.services.mikrotik_bulk import push_account_changes
+from app.services.mikrotik_poller import DeviceSnapshot
+
+
+class FakeRouter:
+    def __init__(self, secrets=None, address_list=None, down=False):
+        self.secrets = secrets or {}
+        self.address_list = address_list or []
+        self.down = down
+        self.commands = []
+
+    async def query(self, path, where=None, proplist=None, query=None):
+        if path == "/ppp/secret":
+            return [{"name": name, "profile": profile} for name, profile in self.secrets.items()]
+        return list(self.address_list)
+
+    async def pipeline(self, commands, window=256):
+        self.commands.extend(commands)
+        return [[] for _ in commands]
+
+
+class FakePool:
+    def __init__(self, routers):
+        self.routers = routers
+
+    @asynccontextmanager
+    async def session(self, device):
+        router = self.routers[device["id"]]
+        if router.down:
+            raise MikroTikError("connection refused")
+        yield router
+
+
+class FakePoller:
+    def __init__(self, online):
+        self.online = online
+
+    def snapshots(self):
+        result = []
+        for device_id, sessions in self.online.items():
+            snapshot = DeviceSnapshot(device_id)
+            snapshot.pppoe_sessions = [{"name": name, "address": address} for name, address in sessions]
+            result.append(snapshot)
+        return result
+
+
+def push(changes, routers, online=None):
+    devices = [{"id": device_id} for device_id in routers]
+    return asyncio.run(push_account_changes(
+        changes, devices, pool=FakePool(routers), poller=FakePoller(online or {})
+    ))
+
+
+def test_offline_isolation_changes_the_secret_where_it_lives():
+    routers = {1: FakeRouter(), 2: FakeRouter(secrets={"alice": "20M"})}
+
+    [outcome] = push([{"username": "alice", "action": "isolate"}], routers)
+
+    assert outcome["status"] == "ok"
+    assert outcome["device_id"] == 2
+    assert outcome["previous_profile"] == "20M"
+    assert routers[1].commands == []
+    assert [words[0] for words in routers[2].commands] == ["/ppp/secret/set"]
+
+
+def test_online_isolation_adds_address_list_entry_on_the_session_router():
+    routers = {1: FakeRouter(secrets={"alice": "20M"})}
+
+    [outcome] = push([{"username": "alice", "action": "isolate"}], routers, {1: [("alice", "10.0.0.2")]})
+
+    assert outcome["status"] == "ok"
+    assert ["/ip/firewall/address-list/add", f"=list={settings.MIKROTIK_ISOLATION_ADDRESS_LIST}",
+            "=address=10.0.0.2", "=comment=alice"] in routers[1].commands
+
+
+def test_reisolation_does_not_report_the_isolation_profile():
+    routers = {1: FakeRouter(secrets={"alice": settings.MIKROTIK_ISOLATION_PROFILE})}
+
+    [outcome] = push([{"username": "alice", "action": "isolate"}], routers)
+
+    assert outcome["previous_profile"] is None
+
+
+def test_reactivation_restores_the_recorded_profile():
+    routers = {1: FakeRouter(secrets={"alice": settings.MIKROTIK_ISOLATION_PROFILE})}
+
+    [outcome] = push([{"username": "alice", "action": "reactivate", "profile": "20M"}], routers)
+
+    assert outcome["status"] == "ok"
+    assert routers[1].commands == [["/ppp/secret/set", "=numbers=alice", "=profile=20M"]]
+
+
+def test_offline_reactivation_removes_the_isolation_entry_wherever_it_is():
+    # Isolated while online at router 1, since gone offline
+    routers = {
+        1: FakeRouter(address_list=[{".id": "*7", "comment": "alice"}, {".id": "*8", "comment": "bob"}]),
+        2: FakeRouter(secrets={"alice": settings.MIKROTIK_ISOLATION_PROFILE}),
+    }
+
+    [outcome] = push([{"username": "alice", "action": "reactivate", "profile": "20M"}], routers)
+
+    assert outcome["status"] == "ok"
+    assert routers[1].commands == [["/ip/firewall/address-list/remove", "=.id=*7"]]
+    assert routers[2].commands == [["/ppp/secret/set", "=numbers=alice", "=profile=20M"]]
+
+
+def test_reactivation_without_profile_leaves_the_secret_alone():
+    routers = {1: FakeRouter(secrets={"alice": settings.MIKROTIK_ISOLATION_PROFILE})}
+
+    [outcome] = push([{"username": "alice", "action": "reactivate", "profile": None}], routers)
+
+    assert outcome["status"] == "failed"
+    assert routers[1].commands == []
+
+
+def test_unknown_subscriber_is_unlocated_and_unreachable_router_fails():
+    routers = {1: FakeRouter()}
+    [outcome] = push([{"username": "bob", "action": "isolate"}], routers)
+    assert outcome["status"] == "unlocated"
+
+    routers = {1: FakeRouter(down=True)}
+    [outcome] = push([{"username": "bob", "action": "isolate"}], routers)
+    assert outcome["status"] == "failed"
+    assert outcome["errors"] == ["connection refused"]
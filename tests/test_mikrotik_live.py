@@ -0,0 +1,51 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.services.mikrotik_live import LiveStreamHub
+
+DEVICE = {"id": 1}
+
+
+class FlakyRouter:
+    """First traffic stream dies with an unexpected error, the second one yields a row"""
+
+    def __init__(self):
+        self.opened = 0
+
+    def monitor_traffic(self, interface):
+        self.opened += 1
+        opened = self.opened
+
+        async def rows():
+            if opened == 1:
+                raise KeyError("rx-bits-per-second")
+            yield {"interface": interface, "rx_bps": 1}
+            await asyncio.sleep(10)
+
+        return rows()
+
+
+class FakePool:
+    def __init__(self, router):
+        self.router = router
+
+    @asynccontextmanager
+    async def session(self, device):
+        yield self.router
+
+
+def test_stream_reports_unexpected_errors_and_reconnects():
+    router = FlakyRouter()
+    hub = LiveStreamHub(FakePool(router), retry_delay=0)
+
+    async def scenario():
+        async with hub.subscribe(DEVICE, "traffic", "ether1") as queue:
+            first = await asyncio.wait_for(queue.get(), 1)
+            second = await asyncio.wait_for(queue.get(), 1)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert "rx-bits-per-second" in first["error"]
+    assert second["data"] == {"interface": "ether1", "rx_bps": 1}
+    assert router.opened == 2
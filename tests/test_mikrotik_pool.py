@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.services.mikrotik_api import MikroTikError, MikroTikTrap
+from app.services.mikrotik_pool import MikroTikPool
+
+DEVICE = {"id": 1, "ip_address": "192.0.2.1", "port": 8728, "username": "admin", "password": "secret"}
+
+
+class FakeAPI:
+    connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+
+def lease(error):
+    """Borrow a pooled session, fail inside the lease, return the session and the device pool"""
+    async def scenario():
+        pool = MikroTikPool(ssl_context=object())
+        device_pool = pool._device_pool(DEVICE)
+        api = FakeAPI()
+        device_pool.idle.append(type("Idle", (), {"api": api})())
+
+        async def use():
+            async with pool.session(DEVICE):
+                if error is asyncio.CancelledError:
+                    await asyncio.sleep(10)
+                raise error
+
+        try:
+            if error is asyncio.CancelledError:
+                await asyncio.wait_for(use(), 0.01)
+            else:
+                await use()
+        except (asyncio.TimeoutError, Exception):
+            pass
+        return api, device_pool
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("error", [asyncio.CancelledError, MikroTikError("reset"), RuntimeError("bug")])
+def test_session_is_dropped_when_the_lease_fails(error):
+    api, device_pool = lease(error)
+
+    assert not api.connected
+    assert len(device_pool.idle) == 0
+    assert device_pool.evictions == 1
+    assert device_pool.leased == 0
+    assert not device_pool.slots.locked()
+
+
+def test_session_survives_a_trap():
+    api, device_pool = lease(MikroTikTrap("no such item"))
+
+    assert api.connected
+    assert len(device_pool.idle) == 1
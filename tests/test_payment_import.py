@@ -0,0 +1,112 @@
+from datetime import datetime
+
+import pytest
+
+from app.models.billing import BillingStatus, Payment, PaymentStatus
+from app.services.billing_service import BillingService
+from app.services.payment_import import PaymentImporter, parse_row
+
+NOW = datetime(2024, 2, 10)
+
+
+def invoice(account, amount, due_date, key, **fields):
+    values = {"status": PaymentStatus.OVERDUE, "created_at": datetime(2024, 1, 1)}
+    values.update(fields)
+    return Payment(billing_account_id=account.id, amount=amount, payment_method="invoice",
+                   due_date=due_date, invoice_key=key, **values)
+
+
+def run(db, *rows, source="bank"):
+    return PaymentImporter(db, source, now=NOW).run((line, row, None) for line, row in enumerate(rows, 1))
+
+
+def row(amount, reference, username="alice"):
+    return parse_row({"amount": str(amount), "reference": reference, "user": username})
+
+
+def test_parse_row_maps_aliases_and_normalizes_values():
+    parsed = parse_row({" VA_Number ": "8808123", "Amount": "1,250,000", "trx_id": "T1",
+                        "msisdn": "+62 812-3456", "transaction_date": "05/02/2024 10:30", "remark": ""})
+
+    assert parsed == {
+        "amount": 1250000.0, "reference": "T1", "payment_date": datetime(2024, 2, 5, 10, 30),
+        "virtual_account": "8808123", "username": None, "phone": "08123456", "notes": None,
+    }
+
+
+def test_parse_row_hashes_a_reference_and_rejects_bad_amounts():
+    first = parse_row({"amount": "100", "user": "alice"})
+    assert first["reference"].startswith("row:")
+    assert parse_row({"amount": "100", "user": "alice"})["reference"] == first["reference"]
+    for amount in ("0", "-5", "abc", None):
+        with pytest.raises(ValueError):
+            parse_row({"amount": amount, "user": "alice"})
+
+
+def test_part_payments_are_applied_to_the_oldest_open_invoice(db, add_account):
+    account = add_account("alice", status=BillingStatus.SUSPENDED, due_date=datetime(2024, 2, 1))
+    january = invoice(account, 200000.0, datetime(2024, 1, 31), f"{account.id}:2024-01")
+    february = invoice(account, 200000.0, datetime(2024, 2, 28), f"{account.id}:2024-02",
+                       status=PaymentStatus.PENDING)
+    db.add_all([january, february])
+    db.commit()
+
+    report = run(db, row(120000, "T1"))
+    db.refresh(january)
+    assert (january.status, january.paid_amount) == (PaymentStatus.OVERDUE, 120000.0)
+    assert (report["partial"], report["invoices_part_paid"], report["unapplied_amount"]) == (1, 1, 0.0)
+    assert report["reactivated"] == []
+
+    # The rest of January and part of February; the account is no longer overdue
+    report = run(db, row(100000, "T2"))
+    db.refresh(january)
+    db.refresh(february)
+    db.refresh(account)
+    assert (january.status, january.paid_amount) == (PaymentStatus.PAID, 200000.0)
+    assert (february.status, february.paid_amount) == (PaymentStatus.PENDING, 20000.0)
+    assert report["invoices_settled"] == 1
+    assert account.status == BillingStatus.ACTIVE
+    assert account.due_date == datetime(2024, 2, 28)
+    assert [entry["username"] for entry in report["reactivated"]] == ["alice"]
+
+
+def test_a_paid_up_account_is_due_with_the_next_cycles_invoice(db, add_account):
+    account = add_account("alice", due_date=datetime(2024, 3, 2))
+    db.add(invoice(account, 200000.0, datetime(2024, 3, 2), f"{account.id}:2024-02", status=PaymentStatus.PENDING))
+    db.commit()
+    service = BillingService(db)
+
+    run(db, row(200000, "T1"))
+    db.refresh(account)
+    assert account.due_date == datetime(2024, 3, 31)
+
+    # March is invoiced but not due yet at the next overdue run
+    service.generate_monthly_invoices(datetime(2024, 3, 1, 1), workers=1)
+    assert service.process_overdue_accounts(datetime(2024, 3, 2, 2)) == []
+    assert [entry["username"] for entry in service.process_overdue_accounts(datetime(2024, 4, 1, 2))] == ["alice"]
+
+
+def test_remainder_of_a_part_paid_invoice_matches_by_its_key(db, add_account):
+    account = add_account("alice", phone="0811")
+    key = f"{account.id}:2024-01"
+    db.add(invoice(account, 200000.0, datetime(2024, 1, 31), key, paid_amount=150000.0))
+    db.commit()
+
+    report = run(db, parse_row({"amount": "50000", "reference": key}))
+
+    assert report["matched"]["invoice"] == 1
+    assert report["invoices_settled"] == 1
+
+
+def test_money_beyond_open_invoices_is_reported_unapplied(db, add_account):
+    alice = add_account("alice")
+    add_account("bob")
+    db.add(invoice(alice, 200000.0, datetime(2024, 1, 31), f"{alice.id}:2024-01"))
+    db.commit()
+
+    report = run(db, row(250000, "T1"), row(50000, "T2", username="bob"))
+
+    assert report["unapplied_amount"] == 100000.0
+    assert report["partial"] == 1
+    assert report["accounts_paid"] == 1
+    assert db.query(Payment).filter(Payment.payment_method == "bank").count() == 2
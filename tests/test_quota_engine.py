@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.models.radius import RadiusUser
+from app.services import subscriber_index as subscriber_index_module
+from app.services.quota_engine import GB, QuotaEngine
+from app.services.subscriber_index import SubscriberIndex, load_subscriber_rows
+
+
+class Dispatcher:
+    def __init__(self):
+        self.changed = []
+
+    def account_changed(self, username):
+        self.changed.append(username)
+        return 1
+
+
+def engine(usage):
+    index = SubscriberIndex()
+    index.load([{"username": "alice", "billing_account_id": 1}, {"username": "bob", "billing_account_id": 2}],
+               [{"id": 1, "username": "alice", "status": "active", "bandwidth_profile": "10M/10M"},
+                {"id": 2, "username": "bob", "status": "active", "bandwidth_profile": "10M/10M"}])
+    dispatcher = Dispatcher()
+    quota = QuotaEngine({"10M/10M": {"quota_gb": 100, "rate_limit": "1M/1M"}}, index=index,
+                        dispatcher=dispatcher, usage_source=lambda since: usage)
+    return quota, dispatcher
+
+
+def test_subscribers_over_quota_at_start_are_restored_on_roll_over():
+    quota, dispatcher = engine([("alice", 150 * GB), ("bob", 10 * GB)])
+    asyncio.run(quota.start())
+
+    assert quota.usage("alice")["throttled"] is True
+    assert quota.throttle_rate("alice") == "1M/1M"
+    # Further traffic does not throttle again
+    quota.add("alice", GB, quota.cycle_start)
+    assert (quota.throttles, dispatcher.changed) == (0, [])
+
+    quota.add("bob", 95 * GB, quota.cycle_start)
+    assert dispatcher.changed == ["bob"]
+
+    assert quota.roll(quota.cycle_end) == 2
+    assert sorted(dispatcher.changed) == ["alice", "bob", "bob"]
+    assert quota.throttle_rate("alice") is None
+
+
+def test_late_deltas_are_not_counted():
+    quota, _ = engine([])
+    quota.add("alice", 200 * GB, datetime(2000, 1, 1))
+    assert (quota.late, quota.usage("alice")["monthly_usage"]) == (1, 0)
+
+
+def test_policies_resolve_subscribers_loaded_from_the_database(monkeypatch, session_factory, db, add_account):
+    monkeypatch.setattr(subscriber_index_module, "SessionLocal", session_factory)
+    account = add_account("alice", bandwidth_profile="10M/10M")
+    # Core insert: the RADIUS models' own metadata does not know billing_accounts
+    db.execute(insert(RadiusUser.__table__).values(username="alice", password="secret", group_name="pppoe",
+                                                   billing_account_id=account.id))
+    db.commit()
+    index = SubscriberIndex()
+    index.source = load_subscriber_rows
+    asyncio.run(index.start())
+    quota = QuotaEngine({"10M/10M": {"quota_gb": 100, "rate_limit": "1M/1M"}}, index=index,
+                        dispatcher=Dispatcher(), usage_source=lambda since: [("alice", 150 * GB)])
+
+    asyncio.run(quota.start())
+
+    assert quota.throttle_rate("alice") == "1M/1M"
+    # A package change through the database-backed endpoint moves the subscriber off the policy
+    index.update_account({"id": account.id, "username": "alice", "status": "active", "bandwidth_profile": "50M/50M"})
+    assert index.get("alice").bandwidth_profile == "50M/50M"
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services import radius_acct_server
+from app.services.radius_acct_server import RadiusAccountingServer
+from app.services.radius_codec import ACCT_INTERIM_UPDATE, ACCT_START, ACCT_STOP
+
+
+class MemoryCounters:
+    def __init__(self):
+        self.rows = {}
+
+    def load(self, max_age):
+        return {key: (row["input_octets"], row["output_octets"], row["session_time"])
+                for key, row in self.rows.items()}
+
+    def store(self, updated, closed):
+        for key in closed:
+            self.rows.pop(key, None)
+        for row in updated:
+            self.rows[(row["nas_ip"], row["session_id"])] = row
+
+
+def server(counters):
+    return RadiusAccountingServer(
+        "secret", host="127.0.0.1", port=0, store=lambda rows: None, sessions=None, quota=None,
+        checkpoint_interval=3600, counter_source=counters.load, counter_store=counters.store
+    )
+
+
+def record(status, input_octets=0, output_octets=0, session_time=0):
+    return SimpleNamespace(status=status, username="alice", session_id="s1", nas_ip="192.0.2.1",
+                           input_octets=input_octets, output_octets=output_octets,
+                           session_time=session_time, received_at=datetime.utcnow())
+
+
+def test_first_update_after_restart_counts_from_persisted_counters():
+    counters = MemoryCounters()
+
+    async def scenario():
+        first = server(counters)
+        await first.start()
+        first._traffic_row(record(ACCT_START))
+        first._traffic_row(record(ACCT_INTERIM_UPDATE, 100, 1000, 60))
+        await first.stop()
+
+        second = server(counters)
+        await second.start()
+        row = second._traffic_row(record(ACCT_INTERIM_UPDATE, 150, 1600, 120))
+        stop = second._traffic_row(record(ACCT_STOP, 170, 1700, 130))
+        await second.stop()
+        return row, stop
+
+    row, stop = asyncio.run(scenario())
+
+    assert (row["tx_bytes"], row["rx_bytes"], row["session_time"]) == (50, 600, 60)
+    assert (stop["tx_bytes"], stop["rx_bytes"]) == (20, 100)
+    assert counters.rows == {}
+
+
+def test_failed_checkpoint_is_retried():
+    counters = MemoryCounters()
+    failing = server(counters)
+
+    def broken(updated, closed):
+        raise OSError("database is down")
+
+    async def scenario():
+        failing.counter_store = broken
+        failing._traffic_row(record(ACCT_INTERIM_UPDATE, 10, 20, 5))
+        assert await failing.checkpoint() == 0
+        failing.counter_store = counters.store
+        return await failing.checkpoint()
+
+    assert asyncio.run(scenario()) == 1
+    assert counters.rows[("192.0.2.1", "s1")]["input_octets"] == 10
+
+
+def test_session_counters_round_trip_through_the_database(monkeypatch, session_factory):
+    monkeypatch.setattr(radius_acct_server, "SessionLocal", session_factory)
+    now = datetime.utcnow()
+
+    radius_acct_server.store_session_counters([
+        {"nas_ip": "192.0.2.1", "session_id": "s1", "input_octets": 1, "output_octets": 2,
+         "session_time": 3, "updated_at": now},
+        {"nas_ip": "192.0.2.1", "session_id": "old", "input_octets": 1, "output_octets": 1,
+         "session_time": 1, "updated_at": now - timedelta(days=2)},
+    ], [])
+    radius_acct_server.store_session_counters([
+        {"nas_ip": "192.0.2.1", "session_id": "s1", "input_octets": 5, "output_octets": 6,
+         "session_time": 7, "updated_at": now},
+    ], [("192.0.2.9", "gone")])
+
+    assert radius_acct_server.load_session_counters(86400) == {("192.0.2.1", "s1"): (5, 6, 7)}
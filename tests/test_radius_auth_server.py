@@ -0,0 +1,59 @@
+from app.services.radius_auth_server import RadiusAuthServer
+from app.services.radius_codec import (
+    ACCESS_ACCEPT, ACCESS_REQUEST, Packet, PacketEncoder, RadiusSecret, verify_message_authenticator, verify_response
+)
+from app.services.subscriber_index import SubscriberIndex
+
+SECRET = RadiusSecret("testing123")
+NAS = ("192.0.2.1", 40000)
+
+
+class Transport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+
+def server(**options):
+    index = SubscriberIndex()
+    index.load([{"username": "alice", "password": "wonderland", "billing_account_id": 1}],
+               [{"id": 1, "username": "alice", "status": "active", "bandwidth_profile": "10M/10M"}])
+    auth = RadiusAuthServer("testing123", port=0, index=index, **options)
+    auth.transport = Transport()
+    return auth
+
+
+def request(identifier, signed, authenticator=bytes(range(16))):
+    attributes = [("User-Name", "alice"), ("User-Password", "wonderland")]
+    return PacketEncoder(SECRET).encode(ACCESS_REQUEST, identifier, attributes, authenticator=authenticator,
+                                        message_authenticator=signed)
+
+
+def test_unsigned_requests_are_dropped_by_default():
+    auth = server()
+
+    auth.datagram_received(request(1, signed=False), NAS)
+    assert auth.transport.sent == []
+    assert auth.stats()["unsigned"] == 1
+
+    auth.datagram_received(request(2, signed=True), NAS)
+    reply = Packet(auth.transport.sent[0][0])
+    assert reply.code == ACCESS_ACCEPT
+    assert verify_response(reply.data, bytes(range(16)), SECRET)
+    # Blast-RADIUS: the reply signature is the first attribute
+    assert reply.data[20] == 80
+    assert verify_message_authenticator(reply, SECRET, bytes(range(16)))
+
+
+def test_forged_signature_and_opt_out():
+    auth = server()
+    forged = bytearray(request(1, signed=True))
+    forged[-1] ^= 0xFF
+    auth.datagram_received(bytes(forged), NAS)
+    assert (auth.transport.sent, auth.invalid) == ([], 1)
+
+    lenient = server(require_message_authenticator=False)
+    lenient.datagram_received(request(1, signed=False), NAS)
+    assert Packet(lenient.transport.sent[0][0]).code == ACCESS_ACCEPT
@@ -0,0 +1,63 @@
+import asyncio
+
+from app.services.radius_client import AsyncRadiusClient
+from app.services.radius_codec import ACCESS_ACCEPT, PacketEncoder, RadiusSecret
+
+
+class Endpoint(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.received = asyncio.Queue()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received.put_nowait((data, addr))
+
+
+async def endpoint():
+    loop = asyncio.get_event_loop()
+    _, protocol = await loop.create_datagram_endpoint(Endpoint, local_addr=("127.0.0.1", 0))
+    return protocol
+
+
+def test_replies_from_another_address_are_dropped():
+    async def scenario():
+        server = await endpoint()
+        spoofer = await endpoint()
+        port = server.transport.get_extra_info("sockname")[1]
+        client = AsyncRadiusClient("localhost", "testing123", auth_port=port, sockets=1, timeout=5)
+        async with client:
+            pending = asyncio.ensure_future(client.authenticate("alice", "wonderland"))
+            request, addr = await server.received.get()
+            reply = PacketEncoder(RadiusSecret("testing123")).encode(
+                ACCESS_ACCEPT, request[1], [], request_authenticator=request[4:20], message_authenticator=True
+            )
+            spoofer.transport.sendto(reply, addr)
+            await asyncio.sleep(0.05)
+            assert not pending.done()
+            server.transport.sendto(reply, addr)
+            accepted = await pending
+        server.transport.close()
+        spoofer.transport.close()
+        return accepted, client.invalid
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def test_batch_keeps_going_after_a_socket_error():
+    client = AsyncRadiusClient("127.0.0.1", "testing123", sockets=1)
+
+    async def send(item):
+        if item == "bad":
+            raise OSError("Network is unreachable")
+        return True
+
+    async def scenario():
+        async with client:
+            return await client._batch(["ok", "bad", "ok"], send)
+
+    first, error, last = asyncio.run(scenario())
+    assert (first, last) == (True, True)
+    assert isinstance(error, OSError)
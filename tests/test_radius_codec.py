@@ -0,0 +1,48 @@
+from app.services.radius_codec import (
+    ACCOUNTING_REQUEST, ACCOUNTING_RESPONSE, Packet, PacketEncoder, RadiusSecret, hide_password, unhide_password,
+    verify_message_authenticator, verify_request, verify_response
+)
+
+SECRET = RadiusSecret("testing123")
+
+
+def test_accounting_request_round_trip_with_gigawords_and_vendor_attributes():
+    octets = 5 * 2 ** 32 + 1234
+    data = PacketEncoder(SECRET).encode(ACCOUNTING_REQUEST, 7, [
+        ("User-Name", "alice"),
+        ("Acct-Session-Id", "81a00001"),
+        ("Framed-IP-Address", "10.0.0.9"),
+        ("Acct-Input-Octets", octets),
+        ("Acct-Session-Time", 3600),
+        ("Mikrotik-Rate-Limit", "10M/10M"),
+    ])
+
+    packet = Packet(data)
+    assert (packet.code, packet.identifier, packet.length) == (ACCOUNTING_REQUEST, 7, len(data))
+    assert verify_request(data, SECRET)
+    assert not verify_request(data, RadiusSecret("wrong"))
+    assert packet.get("User-Name") == "alice"
+    assert packet.get("Framed-IP-Address") == "10.0.0.9"
+    assert packet.counter("Acct-Input-Octets") == octets
+    assert packet.get("Acct-Session-Time") == 3600
+    assert packet.get("Mikrotik-Rate-Limit") == "10M/10M"
+    assert packet.get("Reply-Message", "none") == "none"
+
+
+def test_signed_response_verifies_against_its_request():
+    request_authenticator = bytes(range(16))
+    data = PacketEncoder(SECRET).encode(ACCOUNTING_RESPONSE, 7, [("Reply-Message", "ok")],
+                                        request_authenticator=request_authenticator, message_authenticator=True)
+
+    packet = Packet(data)
+    assert verify_response(data, request_authenticator, SECRET)
+    assert verify_message_authenticator(packet, SECRET, request_authenticator)
+    assert not verify_message_authenticator(packet, SECRET, bytes(16))
+
+
+def test_password_hiding_round_trips_long_passwords():
+    authenticator = bytes(range(16, 32))
+    for password in (b"a", b"exactly16bytes!!", b"a much longer password spanning three blocks"):
+        hidden = hide_password(password, SECRET, authenticator)
+        assert len(hidden) % 16 == 0 and hidden[:len(password)] != password
+        assert unhide_password(hidden, SECRET, authenticator) == password
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from app.api.api_v1.endpoints import mikrotik as mikrotik_endpoints
+from app.services.mikrotik_poller import DeviceSnapshot
+from app.services.response_cache import SingleFlightCache
+
+
+def test_fetch_started_before_invalidate_is_not_shared_or_stored():
+    cache = SingleFlightCache(ttl=60)
+
+    async def scenario():
+        release = asyncio.Event()
+        calls = []
+
+        async def old_fetch():
+            calls.append("old")
+            await release.wait()
+            return "before write"
+
+        async def new_fetch():
+            calls.append("new")
+            return "after write"
+
+        first = asyncio.ensure_future(cache.get(1, "pppoe", old_fetch))
+        await asyncio.sleep(0)
+        cache.invalidate(1, "pppoe")
+        second = await cache.get(1, "pppoe", new_fetch)
+        release.set()
+        return await first, second, await cache.get(1, "pppoe", new_fetch), calls
+
+    first, second, cached, calls = asyncio.run(scenario())
+
+    assert (first, second, cached) == ("before write", "after write", "after write")
+    assert calls == ["old", "new"]
+    assert cache.coalesced == 0
+
+
+def test_snapshot_polled_before_invalidate_is_bypassed(monkeypatch):
+    cache = SingleFlightCache()
+    snapshot = DeviceSnapshot(1)
+    snapshot.duration = 0.5
+    snapshot.updated = time.monotonic()
+    monkeypatch.setattr(mikrotik_endpoints, "device_cache", cache)
+    monkeypatch.setattr(mikrotik_endpoints.fleet_poller, "_snapshots", {1: snapshot})
+
+    assert mikrotik_endpoints._fresh_snapshot(1, "pppoe") is snapshot
+
+    cache.invalidate(1, "pppoe")
+    assert mikrotik_endpoints._fresh_snapshot(1, "pppoe") is None
+    assert mikrotik_endpoints._fresh_snapshot(1, "stats") is snapshot
+
+    snapshot.updated = time.monotonic() + 1
+    assert mikrotik_endpoints._fresh_snapshot(1, "pppoe") is snapshot
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.scheduler import CronTrigger, FileLease
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_next_after_in_a_timezone():
+    # 01:00 Asia/Jakarta on the 1st is 18:00 UTC the day before
+    trigger = CronTrigger("0 1 1 * *", "Asia/Jakarta")
+    assert trigger.next_after(utc(2024, 1, 15, 12)) == utc(2024, 1, 31, 18)
+    assert trigger.next_after(utc(2024, 1, 31, 18)) == utc(2024, 2, 29, 18)
+
+
+def test_steps_ranges_and_day_or_weekday():
+    every_quarter = CronTrigger("*/15 9-17 * * 1-5")
+    # Saturday evening -> Monday 09:00
+    assert every_quarter.next_after(utc(2024, 3, 2, 18, 7)) == utc(2024, 3, 4, 9, 0)
+    assert every_quarter.next_after(utc(2024, 3, 4, 9, 0)) == utc(2024, 3, 4, 9, 15)
+
+    # Day 13 or any Friday, whichever comes first; 7 is Sunday like 0
+    assert CronTrigger("0 0 13 * 5").next_after(utc(2024, 9, 1)) == utc(2024, 9, 6)
+    assert CronTrigger("0 0 * * 7").next_after(utc(2024, 9, 1)) == utc(2024, 9, 8)
+
+
+def test_invalid_expressions():
+    for expression in ("* * * *", "60 * * * *", "* * 0 * *", "*/0 * * * *", "5-1 * * * *"):
+        with pytest.raises(ValueError):
+            CronTrigger(expression)
+    with pytest.raises(ValueError, match="never matches"):
+        CronTrigger("0 0 31 2 *").next_after(utc(2024, 1, 1))
+
+
+def test_file_lease_is_exclusive(tmp_path):
+    path = str(tmp_path / "jobs.lock")
+    first, second = FileLease(path), FileLease(path)
+
+    assert first.acquire() and first.held
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
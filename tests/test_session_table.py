@@ -0,0 +1,39 @@
+import time
+
+from app.schemas.radius import RadiusSessionList
+from app.services.session_table import ActiveSession, ActiveSessionTable
+
+
+def poll_rows():
+    return [{"name": "alice", "address": "10.0.0.2", "uptime": "1h5m", "caller_id": "AA:BB",
+             "in_bps": 1234.5, "out_bps": 99.25, "bytes_in": 10, "bytes_out": 20}]
+
+
+def test_polled_float_rates_fit_the_session_schema():
+    table = ActiveSessionTable()
+    table.update_from_poll("192.0.2.1", 7, poll_rows(), time.monotonic())
+
+    sessions = [table.session_dict(s) for s in table.sessions(device_id=7)]
+    listing = RadiusSessionList(total=len(sessions), sessions=sessions)
+
+    assert listing.sessions[0].in_bps == 1234.5
+    assert listing.sessions[0].out_bps == 99.25
+    assert listing.sessions[0].device_id == 7
+
+
+def test_poll_closes_sessions_missing_from_the_router():
+    table = ActiveSessionTable()
+    table.update_from_poll("192.0.2.1", 7, poll_rows(), time.monotonic())
+    table.update_from_poll("192.0.2.1", 7, [], time.monotonic())
+
+    assert table.sessions() == []
+
+
+def test_clear_forgets_nas_devices():
+    table = ActiveSessionTable()
+    table.update_from_poll("192.0.2.1", 7, poll_rows(), time.monotonic())
+    table.clear()
+
+    assert len(table) == 0
+    assert table.sessions(device_id=7) == []
+    assert table.session_dict(ActiveSession("192.0.2.1", "s1", "alice"))["device_id"] is None